@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Admission Control for Bible Podcast
+Bounded per-type job queues, so bursts of requests wait in line or are turned away
+instead of starting unlimited background threads
+"""
+
+import math
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+class QueueFullError(Exception):
+    """A job type's queue is at its limit; retry_after is the expected wait in seconds for a free slot."""
+
+    def __init__(self, job_type: str, retry_after: int):
+        super().__init__(f"Too many {job_type} jobs waiting, try again in {retry_after} s")
+        self.job_type = job_type
+        self.retry_after = retry_after
+
+class JobLimiter:
+    """
+    Per-type FIFO queues in front of a fixed number of worker threads. Each type runs at most
+    "concurrency" jobs at once and holds at most "max_queue" waiting ones; submitting beyond
+    that raises QueueFullError. Job durations are learned per type to estimate waits.
+    """
+
+    def __init__(self, limits: Dict[str, Dict]):
+        self.limits = limits
+        self.pending = {job_type: deque() for job_type in limits}  # (job_id, target, args), oldest first
+        self.running = {job_type: {} for job_type in limits}  # job_id -> start time
+        self.durations = {job_type: float(config.get("estimate_seconds", 60)) for job_type, config in limits.items()}
+        self.rejected = {job_type: 0 for job_type in limits}
+        self.smoothing = 0.3
+        self.lock = threading.Lock()
+
+    def submit(self, job_type: str, job_id: str, target: Callable, *args) -> int:
+        """Queue target(job_id, *args) and return its position (0 means it started right away)."""
+        with self.lock:
+            config = self.limits[job_type]
+            running, pending = self.running[job_type], self.pending[job_type]
+            if len(running) >= config["concurrency"] and len(pending) >= config["max_queue"]:
+                self.rejected[job_type] += 1
+                raise QueueFullError(job_type, self._retry_after(job_type))
+            pending.append((job_id, target, args))
+            self._dispatch(job_type)
+            return self._position(job_type, job_id)
+
+    def _dispatch(self, job_type: str):
+        """Start waiting jobs while the type has free slots. Called with the lock held."""
+        running, pending = self.running[job_type], self.pending[job_type]
+        while pending and len(running) < self.limits[job_type]["concurrency"]:
+            job_id, target, args = pending.popleft()
+            running[job_id] = time.time()
+            thread = threading.Thread(target=self._run, args=(job_type, job_id, target, args))
+            thread.daemon = True
+            thread.start()
+
+    def _run(self, job_type: str, job_id: str, target: Callable, args: tuple):
+        try:
+            target(job_id, *args)
+        except Exception as e:
+            print(f"❌ {job_type} job {job_id} failed: {e}")
+        finally:
+            with self.lock:
+                started = self.running[job_type].pop(job_id, None)
+                if started is not None:
+                    # Learn the typical duration of this job type for wait estimates
+                    elapsed = time.time() - started
+                    self.durations[job_type] += self.smoothing * (elapsed - self.durations[job_type])
+                self._dispatch(job_type)
+
+    def _position(self, job_type: str, job_id: str) -> int:
+        """1-based position of a waiting job, or 0 if it is not waiting. Called with the lock held."""
+        for position, (pending_id, _, _) in enumerate(self.pending[job_type], 1):
+            if pending_id == job_id:
+                return position
+        return 0
+
+    def _slot_free_times(self, job_type: str) -> list:
+        """When each worker slot of a type is expected to be free, soonest first. Called with the lock held."""
+        now = time.time()
+        duration = self.durations[job_type]
+        free_at = sorted(max(now, started + duration) for started in self.running[job_type].values())
+        return free_at + [now] * (self.limits[job_type]["concurrency"] - len(free_at))
+
+    def _wait_seconds(self, job_type: str, ahead: int) -> int:
+        """Expected wait of a job with `ahead` jobs queued before it. Called with the lock held."""
+        free_at = self._slot_free_times(job_type)
+        for _ in range(ahead):
+            free_at[0] += self.durations[job_type]
+            free_at.sort()
+        return round(free_at[0] - time.time())
+
+    def _retry_after(self, job_type: str) -> int:
+        """Seconds until the queue is expected to have room again. Called with the lock held."""
+        free_at = self._slot_free_times(job_type)
+        return max(1, math.ceil(free_at[0] - time.time()))
+
+    def get_queue_status(self, job_id: str) -> Optional[Dict]:
+        """Queue position and estimated wait of a waiting job, or None once it has started."""
+        with self.lock:
+            for job_type in self.limits:
+                position = self._position(job_type, job_id)
+                if position:
+                    wait = self._wait_seconds(job_type, position - 1)
+                    return {
+                        "status": "queued",
+                        "progress": 0,
+                        "message": f"Waiting in {job_type} queue (position {position}, about {max(1, -(-wait // 60))} min)...",
+                        "queue_position": position,
+                        "estimated_wait": wait
+                    }
+        return None
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Live load of every job type."""
+        with self.lock:
+            return {
+                job_type: {
+                    "concurrency": config["concurrency"],
+                    "max_queue": config["max_queue"],
+                    "running": len(self.running[job_type]),
+                    "queued": len(self.pending[job_type]),
+                    "rejected": self.rejected[job_type],
+                    "average_seconds": round(self.durations[job_type], 1),
+                    "estimated_wait": self._wait_seconds(job_type, len(self.pending[job_type]))
+                }
+                for job_type, config in self.limits.items()
+            }
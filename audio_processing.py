@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Audio Post-Processing for Bible Podcast
+Normalizes loudness, trims edge silence and crossfades synthesized segments using NumPy
+"""
+
+import math
+import time
+from typing import Dict, Iterable, Iterator, Tuple
+
+# Numerical processing imports (optional)
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+class AudioPostProcessor:
+    """
+    Processes segments one at a time so memory stays bounded by the longest segment,
+    no matter how long the episode is. Loudness is measured the EBU R128 / ITU-R BS.1770
+    way (K-weighting, 400 ms blocks with 75% overlap, absolute and relative gating),
+    with the K-weighting applied to block spectra so no sample-by-sample filter loop is needed.
+    """
+
+    def __init__(self, sample_rate: int, channels: int = 1, target_lufs: float = -16.0,
+                 peak_limit_db: float = -1.0, silence_threshold_db: float = -50.0,
+                 crossfade_ms: int = 10, edge_padding_ms: int = 30, max_blocks: int = 256):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.target_lufs = target_lufs
+        self.peak_limit = 10 ** (peak_limit_db / 20)
+        self.silence_threshold = 10 ** (silence_threshold_db / 20)
+        self.crossfade_samples = int(sample_rate * crossfade_ms / 1000)
+        self.edge_padding_samples = int(sample_rate * edge_padding_ms / 1000)
+        self.max_blocks = max_blocks  # Blocks analysed per FFT batch, bounds the spectrum buffer
+
+        # Gating blocks from BS.1770: 400 ms windows every 100 ms
+        self.block_size = int(sample_rate * 0.4)
+        self.block_hop = int(sample_rate * 0.1)
+        self.k_weighting = self._k_weighting_power_response()
+
+        # Equal-power fade curves for crossfades
+        if self.crossfade_samples:
+            ramp = np.linspace(0.0, math.pi / 2, self.crossfade_samples, dtype=np.float32)
+            self.fade_in = np.sin(ramp)[:, None]
+            self.fade_out = np.cos(ramp)[:, None]
+
+    def _k_weighting_power_response(self) -> "np.ndarray":
+        """Squared magnitude response of the BS.1770 K-weighting filter at the block FFT bins."""
+        fs = self.sample_rate
+        freqs = np.fft.rfftfreq(self.block_size, d=1.0 / fs)
+        z = np.exp(-1j * 2 * math.pi * freqs / fs)
+
+        def biquad_response(b, a):
+            return (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+
+        # Stage 1: high shelf, +4 dB above ~1.5 kHz (models the head)
+        gain_db, q, fc = 4.0, 1 / math.sqrt(2), 1500.0
+        A = 10 ** (gain_db / 40)
+        w0 = 2 * math.pi * fc / fs
+        alpha = math.sin(w0) / (2 * q)
+        cos_w0 = math.cos(w0)
+        shelf = biquad_response(
+            (A * ((A + 1) + (A - 1) * cos_w0 + 2 * math.sqrt(A) * alpha),
+             -2 * A * ((A - 1) + (A + 1) * cos_w0),
+             A * ((A + 1) + (A - 1) * cos_w0 - 2 * math.sqrt(A) * alpha)),
+            ((A + 1) - (A - 1) * cos_w0 + 2 * math.sqrt(A) * alpha,
+             2 * ((A - 1) - (A + 1) * cos_w0),
+             (A + 1) - (A - 1) * cos_w0 - 2 * math.sqrt(A) * alpha)
+        )
+
+        # Stage 2: high pass at ~38 Hz (RLB weighting)
+        q, fc = 0.5, 38.0
+        w0 = 2 * math.pi * fc / fs
+        alpha = math.sin(w0) / (2 * q)
+        cos_w0 = math.cos(w0)
+        high_pass = biquad_response(
+            ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2),
+            (1 + alpha, -2 * cos_w0, 1 - alpha)
+        )
+
+        return (np.abs(shelf * high_pass) ** 2).astype(np.float32)
+
+    def to_float(self, samples: "np.ndarray", sample_width: int = 2) -> "np.ndarray":
+        """Convert interleaved integer PCM to a float32 (frames, channels) array in [-1, 1]."""
+        scale = float(1 << (8 * sample_width - 1))
+        return (samples.astype(np.float32) / scale).reshape(-1, self.channels)
+
+    def to_pcm16(self, samples: "np.ndarray") -> bytes:
+        """Convert float samples back to interleaved 16-bit PCM."""
+        return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+    def measure_loudness(self, samples: "np.ndarray") -> float:
+        """Integrated loudness (LUFS) of a (frames, channels) float array, or -inf if it is silent."""
+        if len(samples) < self.block_size:
+            return float('-inf')
+
+        # Overlapping 400 ms blocks as a strided view (no copy), analysed in bounded batches
+        windows = np.lib.stride_tricks.sliding_window_view(samples, self.block_size, axis=0)[::self.block_hop]
+        block_energy = []
+        for start in range(0, len(windows), self.max_blocks):
+            batch = windows[start:start + self.max_blocks]
+            spectrum = np.abs(np.fft.rfft(batch, axis=-1)) ** 2
+            # Parseval: mean square of the weighted signal from the weighted power spectrum
+            weighted = spectrum * self.k_weighting
+            energy = (2 * weighted.sum(axis=-1) - weighted[..., 0] - weighted[..., -1]) / self.block_size ** 2
+            block_energy.append(energy.sum(axis=-1))  # Sum over channels (all weighted 1.0)
+        block_energy = np.concatenate(block_energy)
+
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(block_energy)
+
+        # Absolute gate at -70 LUFS, then relative gate 10 LU below the ungated level
+        gated = block_energy[block_loudness > -70.0]
+        if not len(gated):
+            return float('-inf')
+        relative_threshold = -0.691 + 10 * math.log10(gated.mean()) - 10.0
+        gated = block_energy[block_loudness > max(relative_threshold, -70.0)]
+        if not len(gated):
+            return float('-inf')
+        return -0.691 + 10 * math.log10(gated.mean())
+
+    def normalize(self, samples: "np.ndarray") -> "np.ndarray":
+        """Apply gain towards the target loudness without exceeding the peak limit."""
+        loudness = self.measure_loudness(samples)
+        if math.isinf(loudness):
+            return samples
+
+        gain = 10 ** ((self.target_lufs - loudness) / 20)
+        peak = float(np.abs(samples).max()) if len(samples) else 0.0
+        if peak * gain > self.peak_limit:
+            gain = self.peak_limit / peak
+        return samples * np.float32(gain)
+
+    def trim_silence(self, samples: "np.ndarray", keep_tail_ms: int = 0) -> "np.ndarray":
+        """Trim leading silence and shorten trailing silence to the requested pause."""
+        window = max(1, self.sample_rate // 100)  # 10 ms analysis windows
+        frames = len(samples) // window
+        if not frames:
+            return samples
+
+        # Peak per window over all channels, using a reshape instead of a Python loop
+        peaks = np.abs(samples[:frames * window]).reshape(frames, -1).max(axis=1)
+        loud = np.flatnonzero(peaks > self.silence_threshold)
+        if not len(loud):
+            return samples[:0]
+
+        start = max(0, loud[0] * window - self.edge_padding_samples)
+        speech_end = (loud[-1] + 1) * window
+        keep_tail = max(self.edge_padding_samples, int(self.sample_rate * keep_tail_ms / 1000))
+        end = min(len(samples), speech_end + keep_tail)
+        return samples[start:end]
+
+    def process_segments(self, segments: Iterable[Tuple["np.ndarray", int]]) -> Iterator[bytes]:
+        """
+        Process (samples, pause_ms) pairs and yield 16-bit PCM ready for encoding.
+        Each segment is trimmed, normalized and crossfaded into the previous one; only the
+        crossfade tail of the previous segment is held back between iterations.
+        The output frame range of every input segment is recorded in segment_bounds.
+        """
+        self.segment_bounds = []
+        cursor = 0  # Output frame where the held tail (or the next segment) starts
+        tail = None
+        for samples, pause_ms in segments:
+            samples = self.normalize(self.trim_silence(samples, pause_ms))
+            if not len(samples):
+                self.segment_bounds.append((cursor, cursor))
+                continue
+
+            n = self.crossfade_samples
+            if tail is not None and n and len(samples) > 2 * n:
+                samples = samples.copy()
+                samples[:n] = tail * self.fade_out + samples[:n] * self.fade_in
+            elif tail is not None:
+                yield self.to_pcm16(tail)
+                cursor += len(tail)
+
+            start, end = cursor, cursor + len(samples)
+            self.segment_bounds.append((start, end))
+
+            if n and len(samples) > 2 * n:
+                tail = samples[-n:]
+                samples = samples[:-n]
+            else:
+                tail = None
+            yield self.to_pcm16(samples)
+            cursor += len(samples)
+
+        if tail is not None:
+            yield self.to_pcm16(tail)
+
+def benchmark(minutes: float = 60.0, sample_rate: int = 24000, segment_seconds: float = 20.0) -> Dict:
+    """Time the post-processing pass over a synthetic episode of the given length."""
+    if not HAS_NUMPY:
+        raise Exception("numpy library not available. Install with: pip install numpy")
+
+    rng = np.random.default_rng(0)
+    processor = AudioPostProcessor(sample_rate)
+    segment_frames = int(sample_rate * segment_seconds)
+    segment_count = int(minutes * 60 / segment_seconds)
+
+    def synthetic_segments():
+        # Speech-like noise bursts at uneven levels with silent edges, like TTS output
+        for i in range(segment_count):
+            level = 0.05 + 0.4 * rng.random()
+            envelope = np.abs(np.sin(np.linspace(0, 40 * math.pi, segment_frames, dtype=np.float32)))
+            samples = (rng.standard_normal(segment_frames, dtype=np.float32) * envelope * level)[:, None]
+            samples[:sample_rate // 2] = 0
+            samples[-sample_rate:] = 0
+            yield samples, 500
+
+    start = time.perf_counter()
+    total_bytes = sum(len(block) for block in processor.process_segments(synthetic_segments()))
+    elapsed = time.perf_counter() - start
+
+    audio_seconds = total_bytes / 2 / sample_rate
+    return {
+        "audio_minutes": round(audio_seconds / 60, 2),
+        "segments": segment_count,
+        "elapsed_seconds": round(elapsed, 3),
+        "realtime_factor": round(audio_seconds / elapsed, 1) if elapsed else None
+    }
+
+def main():
+    """Command line benchmark for the post-processing stage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark podcast audio post-processing")
+    parser.add_argument("--minutes", type=float, default=60.0, help="Length of the synthetic episode")
+    parser.add_argument("--sample-rate", type=int, default=24000, help="Sample rate of the synthetic episode")
+    args = parser.parse_args()
+
+    result = benchmark(args.minutes, args.sample_rate)
+    print(f"Processed {result['audio_minutes']} minutes ({result['segments']} segments) "
+          f"in {result['elapsed_seconds']}s - {result['realtime_factor']}x realtime")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for Bible Podcast
+Times the corpus, passage and script hot paths against a synthetic (or real) corpus and writes
+the results as JSON, optionally compared with a stored baseline run
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import timeit
+import platform
+import tempfile
+import itertools
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+from typing import Dict, List, Optional
+
+import bible
+from bible import PodcastScriptGenerator
+
+# The audio generator has its own script parser; it is benchmarked when it imports
+try:
+    from generate_audio import PodcastAudioGenerator
+    HAS_AUDIO_PARSER = True
+except ImportError:
+    HAS_AUDIO_PARSER = False
+
+BENCH_VERSION = "BENCH"
+
+# Books of the Protestant canon with their chapter counts, so the synthetic corpus has canon shape
+CANON_BOOKS = [
+    ("Genesis", 50), ("Exodus", 40), ("Leviticus", 27), ("Numbers", 36), ("Deuteronomy", 34),
+    ("Joshua", 24), ("Judges", 21), ("Ruth", 4), ("1 Samuel", 31), ("2 Samuel", 24), ("1 Kings", 22),
+    ("2 Kings", 25), ("1 Chronicles", 29), ("2 Chronicles", 36), ("Ezra", 10), ("Nehemiah", 13),
+    ("Esther", 10), ("Job", 42), ("Psalms", 150), ("Proverbs", 31), ("Ecclesiastes", 12),
+    ("Song of Solomon", 8), ("Isaiah", 66), ("Jeremiah", 52), ("Lamentations", 5), ("Ezekiel", 48),
+    ("Daniel", 12), ("Hosea", 14), ("Joel", 3), ("Amos", 9), ("Obadiah", 1), ("Jonah", 4), ("Micah", 7),
+    ("Nahum", 3), ("Habakkuk", 3), ("Zephaniah", 3), ("Haggai", 2), ("Zechariah", 14), ("Malachi", 4),
+    ("Matthew", 28), ("Mark", 16), ("Luke", 24), ("John", 21), ("Acts", 28), ("Romans", 16),
+    ("1 Corinthians", 16), ("2 Corinthians", 13), ("Galatians", 6), ("Ephesians", 6), ("Philippians", 4),
+    ("Colossians", 4), ("1 Thessalonians", 5), ("2 Thessalonians", 3), ("1 Timothy", 6), ("2 Timothy", 4),
+    ("Titus", 3), ("Philemon", 1), ("Hebrews", 13), ("James", 5), ("1 Peter", 5), ("2 Peter", 3),
+    ("1 John", 5), ("2 John", 1), ("3 John", 1), ("Jude", 1), ("Revelation", 22)
+]
+
+WORDS = ("the and of to in that he shall unto for his lord they be is him not them it with all thou "
+         "which was as but have their people from said king land house god day upon hand son one "
+         "children when this came heaven earth word covenant mercy righteous wicked praise glory").split()
+
+BENCHMARK_CONFIG = {
+    "repeats": 7,  # Timed repeats per case; the median is compared
+    "threshold": 0.10,  # Relative change in median counted as a regression/improvement
+    "verses_per_chapter": (10, 42),  # Uniform range; the canon averages about 26
+    "words_per_verse": (12, 38),
+    "commentary_sections": 40
+}
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + rng.choice((".", ".", ";", "!", "?"))
+
+def generate_corpus(scale: float = 1.0, seed: int = 0) -> Dict:
+    """
+    Synthetic Bible JSON ({book: {chapter: {verse: text}}}) with the books of the canon.
+    scale multiplies the chapters of every book, so scale 1 is canon-sized (about 31k verses).
+    """
+    rng = random.Random(seed)
+    low, high = BENCHMARK_CONFIG["verses_per_chapter"]
+    min_words, max_words = BENCHMARK_CONFIG["words_per_verse"]
+    corpus = {}
+    for book, chapters in CANON_BOOKS:
+        corpus[book] = {}
+        for chapter in range(1, max(1, round(chapters * scale)) + 1):
+            corpus[book][str(chapter)] = {
+                str(verse): _sentence(rng, rng.randint(min_words, max_words)).replace(" lord ", " “Lord” ")
+                for verse in range(1, rng.randint(low, high) + 1)
+            }
+    return corpus
+
+def generate_commentary(corpus: Dict, sections: int, theological: bool = False, seed: int = 0) -> str:
+    """
+    Synthetic commentary over random passages of a corpus, in the standard
+    ('Section X: Book C:V-V - Title') or theological ('### Section ...' under '## Chapter ...') format.
+    """
+    rng = random.Random(seed)
+    lines = ["# Theological Commentary" if theological else "Commentary", ""]
+    books = list(corpus)
+    for i in range(1, sections + 1):
+        book = rng.choice(books)
+        chapter = rng.choice(list(corpus[book]))
+        last_verse = len(corpus[book][chapter])
+        start = rng.randint(1, last_verse)
+        end = min(last_verse, start + rng.randint(0, 8))
+        title = _sentence(rng, 4).rstrip(".;!?")
+        if theological:
+            if i % 3 == 1:
+                lines += [f"## Chapter {i // 3 + 1}: {book} {chapter} - {title}", ""]
+            lines.append(f"### Section {i}: {book} {chapter}:{start}-{end} - {title}")
+            for label in ("Author's Intent", "Original Audience Understanding", "Universal Application"):
+                lines += [f"**{label}:** " + " ".join(_sentence(rng, rng.randint(15, 30)) for _ in range(4)), ""]
+        else:
+            lines.append(f"Section {i}: {book} {chapter}:{start}-{end} - {title}")
+            for _ in range(3):
+                lines.append(" ".join(_sentence(rng, rng.randint(15, 30)) for _ in range(4)))
+            lines.append("")
+    return "\n".join(lines)
+
+def time_case(func, repeats: int) -> Dict:
+    """Per-call timings of func: the loop count is calibrated to about 0.2 s per repeat."""
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    times = [total / loops for total in timer.repeat(repeats, loops)]
+    return {
+        "loops": loops,
+        "repeats": repeats,
+        "min_us": round(min(times) * 1e6, 3),
+        "median_us": round(statistics.median(times) * 1e6, 3),
+        "mean_us": round(statistics.mean(times) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(times) * 1e6, 3) if len(times) > 1 else 0.0
+    }
+
+def build_cases(work_dir: str, corpus: Dict) -> List:
+    """(name, callable) pairs to time. Expects the corpus at bibles/BENCH_bible.json under the current directory."""
+    generator = PodcastScriptGenerator()
+    generator.load_bible_version(BENCH_VERSION)
+
+    # Longest and first chapters, and a passage long enough to be split into segments
+    books = list(corpus)
+    longest_book, longest_chapter = max(((book, chapter) for book in books for chapter in corpus[book]),
+                                        key=lambda key: len(corpus[key[0]][key[1]]))
+    passage = f"{books[0]} 1-{min(10, len(corpus[books[0]]))}"
+    passages = itertools.cycle([passage, "Psalms 23", "Song of Solomon 1-3", "1 John 1", "Genesis 999",
+                                "Unknown 1", "Revelation 1-22"])
+    references = itertools.cycle([f"{longest_book} {longest_chapter}:1-{len(corpus[longest_book][longest_chapter])}",
+                                  f"{books[0]} 1:1-5", "1 Kings 2:3-9", "Song of Solomon 1:1-4"])
+
+    standard = generate_commentary(corpus, BENCHMARK_CONFIG["commentary_sections"], seed=1)
+    theological = generate_commentary(corpus, BENCHMARK_CONFIG["commentary_sections"], theological=True, seed=2)
+    section_text = generator.extract_theological_commentary_sections(theological)[0][2]
+
+    script_path = os.path.join(work_dir, "bench_script.txt")
+    generator.generate_podcast_script_from_passage(passage, script_path)
+
+    def load_cold():
+        bible._bible_cache.clear()
+        generator.load_bible_version(BENCH_VERSION)
+
+    cases = [
+        ("load_bible_version (cold)", load_cold),
+        ("load_bible_version (cached)", lambda: generator.load_bible_version(BENCH_VERSION)),
+        ("validate_passage", lambda: generator.validate_passage(next(passages))),
+        ("fetch_bible_verse", lambda: generator.fetch_bible_verse(next(references))),
+        ("get_chapter_text (first)", lambda: generator.get_chapter_text(books[0], 1)),
+        ("get_chapter_text (longest)", lambda: generator.get_chapter_text(longest_book, int(longest_chapter))),
+        ("extract_verse_references", lambda: generator.extract_verse_references(standard)),
+        ("extract_theological_commentary_sections", lambda: generator.extract_theological_commentary_sections(theological)),
+        ("clean_commentary", lambda: generator.clean_commentary(section_text)),
+        ("generate_podcast_script_from_passage",
+         lambda: generator.generate_podcast_script_from_passage(passage, os.path.join(work_dir, "bench_output.txt"))),
+        ("parse_podcast_script", lambda: generator.parse_podcast_script(script_path))
+    ]
+    if HAS_AUDIO_PARSER:
+        audio_generator = PodcastAudioGenerator()
+        cases.append(("parse_podcast_script (audio)", lambda: audio_generator.parse_podcast_script(script_path)))
+    return cases
+
+def get_git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+def run_benchmarks(corpus_path: Optional[str] = None, scale: float = 1.0, seed: int = 0,
+                   repeats: int = None, only: Optional[str] = None) -> Dict:
+    """
+    Run every case (or those whose name contains only) in a scratch directory and return
+    {"meta": {...}, "results": {name: timings}}. corpus_path benchmarks a real Bible JSON instead.
+    """
+    repeats = repeats or BENCHMARK_CONFIG["repeats"]
+    original_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bible_bench_")
+    try:
+        os.makedirs(os.path.join(work_dir, "bibles"))
+        bench_path = os.path.join(work_dir, "bibles", f"{BENCH_VERSION}_bible.json")
+        if corpus_path:
+            shutil.copyfile(corpus_path, bench_path)
+            with open(bench_path, 'r', encoding='utf-8') as f:
+                corpus = json.load(f)
+        else:
+            corpus = generate_corpus(scale, seed)
+            with open(bench_path, 'w', encoding='utf-8') as f:
+                json.dump(corpus, f, ensure_ascii=False)
+
+        os.chdir(work_dir)
+        bible._bible_cache.clear()
+        results = {}
+        # The code under test prints progress; keep it out of the timings and the report
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            cases = build_cases(work_dir, corpus)
+            for name, func in cases:
+                if only and only not in name:
+                    continue
+                results[name] = time_case(func, repeats)
+                print(f"{name}: {results[name]['median_us']:.1f} us", file=sys.stderr)
+
+        meta = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "filter": only,
+            "corpus": {
+                "source": os.path.basename(corpus_path) if corpus_path else "synthetic",
+                "scale": None if corpus_path else scale,
+                "seed": None if corpus_path else seed,
+                "books": len(corpus),
+                "chapters": sum(len(chapters) for chapters in corpus.values()),
+                "verses": sum(len(verses) for chapters in corpus.values() for verses in chapters.values()),
+                "bytes": os.path.getsize(bench_path)
+            }
+        }
+        return {"meta": meta, "results": results}
+    finally:
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = None) -> Dict:
+    """
+    Median-to-median comparison with a baseline run. Returns {name: {"baseline_us", "current_us",
+    "ratio", "status"}} with status "slower", "faster", "same", "new" or "missing".
+    """
+    threshold = BENCHMARK_CONFIG["threshold"] if threshold is None else threshold
+    comparison = {}
+    for name in list(baseline["results"]) + [n for n in current["results"] if n not in baseline["results"]]:
+        before = baseline["results"].get(name)
+        after = current["results"].get(name)
+        if before is None or after is None:
+            comparison[name] = {"baseline_us": before and before["median_us"], "current_us": after and after["median_us"],
+                                "ratio": None, "status": "new" if before is None else "missing"}
+            continue
+        ratio = after["median_us"] / before["median_us"] if before["median_us"] else 1.0
+        status = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "same"
+        comparison[name] = {"baseline_us": before["median_us"], "current_us": after["median_us"],
+                            "ratio": round(ratio, 3), "status": status}
+    return comparison
+
+def format_report(report: Dict, comparison: Optional[Dict] = None) -> str:
+    lines = []
+    corpus = report["meta"]["corpus"]
+    lines.append(f"Corpus: {corpus['source']} ({corpus['books']} books, {corpus['chapters']} chapters, "
+                 f"{corpus['verses']} verses, {corpus['bytes'] / (1024 * 1024):.1f} MB)")
+    lines.append(f"{'Benchmark':<42} {'median':>12} {'min':>12}" + (f" {'baseline':>12} {'change':>9}" if comparison else ""))
+    for name, timing in report["results"].items():
+        line = f"{name:<42} {timing['median_us']:>9.1f} us {timing['min_us']:>9.1f} us"
+        if comparison and name in comparison and comparison[name]["ratio"] is not None:
+            entry = comparison[name]
+            marker = {"slower": "  ❌", "faster": "  ✓"}.get(entry["status"], "")
+            line += f" {entry['baseline_us']:>9.1f} us {(entry['ratio'] - 1) * 100:>+8.1f}%{marker}"
+        lines.append(line)
+    if comparison and not report["meta"].get("filter"):
+        for name, entry in comparison.items():
+            if entry["status"] == "missing":
+                lines.append(f"{name:<42} missing from this run")
+    return "\n".join(lines)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark corpus, passage and script generation hot paths")
+    parser.add_argument("--output", help="Write the results JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_CONFIG["threshold"],
+                        help="Relative median change reported as a regression (default: 0.10)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Synthetic corpus size relative to the canon (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic corpus random seed")
+    parser.add_argument("--corpus", help="Benchmark a real Bible JSON file instead of the synthetic corpus")
+    parser.add_argument("--repeats", type=int, help="Timed repeats per benchmark (default: 7)")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--write-corpus", help="Only write the synthetic corpus to this path and exit")
+
+    args = parser.parse_args()
+
+    if args.write_corpus:
+        with open(args.write_corpus, 'w', encoding='utf-8') as f:
+            json.dump(generate_corpus(args.scale, args.seed), f, ensure_ascii=False)
+        print(f"Synthetic corpus written to: {args.write_corpus}")
+        return 0
+
+    report = run_benchmarks(args.corpus, args.scale, args.seed, args.repeats, args.filter)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline["meta"]["corpus"] != report["meta"]["corpus"]:
+            print("Warning: Baseline was run on a different corpus; timings are not comparable")
+        comparison = compare_results(report, baseline, args.threshold)
+        report["baseline"] = {"meta": baseline["meta"], "threshold": args.threshold, "comparison": comparison}
+
+    print(format_report(report, comparison))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to: {args.output}")
+
+    if comparison:
+        regressions = [name for name, entry in comparison.items() if entry["status"] == "slower"]
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\n✓ No regressions over {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
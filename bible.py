@@ -3,10 +3,49 @@ import re
 import time
 import os
 import json
+import threading
 from pathlib import Path
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 from tqdm import tqdm
 
+from canon import load_canon, check_passage
+from profiling import profile_job, PROFILE_MODES
+
+# Parsed Bible files by version, shared by every generator in the process. Loaded before a
+# server forks its workers, they are shared with the workers copy-on-write instead of re-parsed.
+_bible_cache = {}  # version -> (mtime_ns, data)
+_bible_cache_lock = threading.Lock()
+
+def load_bible_data(version: str) -> Optional[Dict]:
+    """Parsed Bible JSON for a version, read once per process (and again only if the file changes)."""
+    version_upper = version.upper()
+    json_file = f"bibles/{version_upper}_bible.json"
+    try:
+        mtime_ns = os.stat(json_file).st_mtime_ns
+    except OSError:
+        return None
+
+    with _bible_cache_lock:
+        cached = _bible_cache.get(version_upper)
+        if cached is None or cached[0] != mtime_ns:
+            print(f"Loading {version_upper} Bible data...")
+            with open(json_file, 'r', encoding='utf-8') as f:
+                cached = (mtime_ns, json.load(f))
+            _bible_cache[version_upper] = cached
+        return cached[1]
+
+def preload_bible_versions() -> List[str]:
+    """Parse every Bible file in bibles/ into the shared cache. Returns the versions loaded."""
+    loaded = []
+    for file in sorted(Path("bibles").glob("*_bible.json")):
+        version = file.stem.replace("_bible", "")
+        try:
+            if load_bible_data(version) is not None:
+                loaded.append(version)
+        except Exception as e:
+            print(f"Error loading Bible data for {version}: {e}")
+    return loaded
+
 class PodcastScriptGenerator:
     def __init__(self):
         # Bible data will be loaded dynamically
@@ -43,9 +82,7 @@ class PodcastScriptGenerator:
             return False
         
         try:
-            print(f"Loading {version_upper} Bible data...")
-            with open(json_file, 'r', encoding='utf-8') as f:
-                self.bible_data = json.load(f)
+            self.bible_data = load_bible_data(version_upper)
             
             self.bible_version = version_upper
             self.bible_books = list(self.bible_data.keys())
@@ -123,61 +160,16 @@ class PodcastScriptGenerator:
                 print("Invalid passage format. Please try again.")
 
     def validate_passage(self, passage: str) -> bool:
-        """Validate the passage format and check if it exists in the Bible data."""
-        try:
-            # Parse passage like "Genesis 1-3"
-            parts = passage.split()
-            if len(parts) < 2:
-                print("Error: Please include both book name and chapter range.")
-                return False
-            
-            # Handle multi-word book names
-            if len(parts) > 2:
-                book_name = " ".join(parts[:-1])
-                chapter_range = parts[-1]
-            else:
-                book_name, chapter_range = parts
-            
-            # Check if book exists
-            if book_name not in self.bible_data:
-                print(f"Error: Book '{book_name}' not found.")
-                print(f"Available books: {', '.join(self.bible_books[:10])}...")
-                return False
-            
-            # Parse chapter range
-            if '-' in chapter_range:
-                start_ch, end_ch = chapter_range.split('-')
-                start_chapter = int(start_ch)
-                end_chapter = int(end_ch)
-            else:
-                start_chapter = end_chapter = int(chapter_range)
-            
-            # Check if chapters exist
-            book_data = self.bible_data[book_name]
-            available_chapters = [int(ch) for ch in book_data.keys()]
-            
-            if start_chapter not in available_chapters:
-                print(f"Error: Chapter {start_chapter} not found in {book_name}.")
-                print(f"Available chapters: {min(available_chapters)}-{max(available_chapters)}")
-                return False
-            
-            if end_chapter not in available_chapters:
-                print(f"Error: Chapter {end_chapter} not found in {book_name}.")
-                print(f"Available chapters: {min(available_chapters)}-{max(available_chapters)}")
-                return False
-            
-            if start_chapter > end_chapter:
-                print("Error: Start chapter cannot be greater than end chapter.")
-                return False
-            
-            return True
-            
-        except ValueError:
-            print("Error: Invalid chapter number format.")
-            return False
-        except Exception as e:
-            print(f"Error validating passage: {e}")
+        """Validate the passage format and check it exists, using the version's canon table (no verse text needed)."""
+        canon = load_canon(self.bible_version) if self.bible_version else None
+        if canon is None:
+            print("Error: No Bible version loaded.")
             return False
+        
+        valid, message = check_passage(canon, passage)
+        if not valid:
+            print(f"Error: {message}")
+        return valid
 
     def parse_passage_input(self, passage: str) -> Dict:
         """Parse user passage input like 'Genesis 1-3' into components."""
@@ -413,13 +405,14 @@ class PodcastScriptGenerator:
         """
         return f"[MANUAL INSERT: {verse_reference} from {self.bible_version} - Replace this with the actual verse text]"
     
-    def generate_podcast_script_from_passage(self, passage: str, output_file: str = None) -> str:
+    def generate_podcast_script_from_passage(self, passage: str, output_file: str = None, section_callback=None) -> str:
         """
         Generate a podcast script directly from a Bible passage (no commentary needed).
         
         Args:
             passage: The passage to read (e.g., "Genesis 1-3")
             output_file: Output filename (optional)
+            section_callback: Called with the script text built so far after each chapter (optional)
         """
         if not self.bible_data:
             print("Error: No Bible data loaded.")
@@ -500,6 +493,9 @@ class PodcastScriptGenerator:
             
             script_lines.append("---")
             script_lines.append("")
+            
+            if section_callback:
+                section_callback('\n'.join(script_lines))
         
         # Write to file
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -528,8 +524,11 @@ class PodcastScriptGenerator:
             print("No commentary provided. This method requires either commentary text or use generate_podcast_script_from_passage() directly.")
             return None
 
-    def generate_commentary_based_script(self, commentary_text: str, output_file: str):
-        """Generate script from commentary text (original functionality)."""
+    def generate_commentary_based_script(self, commentary_text: str, output_file: str, section_callback=None):
+        """
+        Generate script from commentary text (original functionality).
+        section_callback, if given, is called with the script text built so far after each section.
+        """
         print("Extracting sections from commentary...")
         
         # Check if commentary text is meaningful
@@ -589,6 +588,9 @@ class PodcastScriptGenerator:
             script_lines.append("")
             script_lines.append("---")
             script_lines.append("")
+            
+            if section_callback:
+                section_callback('\n'.join(script_lines))
         
         try:
             # Write to file
@@ -640,6 +642,7 @@ def main():
     parser.add_argument("--commentary-file", help="Optional commentary file to use instead of direct Bible reading")
     parser.add_argument("--passage", help="Bible passage to read (e.g., 'Genesis 1-3') - overrides interactive mode")
     parser.add_argument("--version", help="Bible version (ESV or NKJV) - overrides interactive mode")
+    parser.add_argument("--profile", choices=PROFILE_MODES, help="Profile script generation (cpu, memory or all)")
     
     args = parser.parse_args()
     
@@ -703,15 +706,16 @@ def main():
     print("GENERATING PODCAST SCRIPT")
     print("="*50)
     
-    if commentary_text:
-        # Commentary-based generation
-        print("Generating commentary-based podcast script...")
-        script_filename = f"commentary_{selected_version}_podcast_script.txt"
-        output_file = generator.generate_commentary_based_script(commentary_text, script_filename)
-    else:
-        # Direct Bible reading
-        print("Generating direct Bible reading script...")
-        output_file = generator.generate_podcast_script_from_passage(selected_passage)
+    with profile_job(".", f"profile_script_{selected_version}", args.profile):
+        if commentary_text:
+            # Commentary-based generation
+            print("Generating commentary-based podcast script...")
+            script_filename = f"commentary_{selected_version}_podcast_script.txt"
+            output_file = generator.generate_commentary_based_script(commentary_text, script_filename)
+        else:
+            # Direct Bible reading
+            print("Generating direct Bible reading script...")
+            output_file = generator.generate_podcast_script_from_passage(selected_passage)
     
     if not output_file:
         print("Failed to generate podcast script.")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Canon Metadata for Bible Podcast
+Small per-version tables of books, chapters, verse counts and text sizes, so passages can be
+validated and autocompleted without loading verse text
+"""
+
+import os
+import json
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CANON_DIR = "cache/canon"
+
+# Canon tables by version, read once per process
+_canon_cache = {}
+_canon_lock = threading.Lock()
+
+def get_corpus_path(version: str) -> str:
+    return f"bibles/{version.upper()}_bible.json"
+
+def get_canon_path(version: str) -> str:
+    return os.path.join(CANON_DIR, f"{version.upper()}_canon.json")
+
+def build_canon(version: str) -> Dict:
+    """
+    Build the canon table of a version from its corpus:
+    {"version", "source": {"size", "mtime_ns"}, "books": {book: {"chapters": [numbers], "verses": [...], "chars": [...]}}}
+    with the verse and character counts of each chapter in chapter order. Books keep corpus order.
+    """
+    corpus_path = get_corpus_path(version)
+    stat = os.stat(corpus_path)
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    books = {}
+    for book, chapters in corpus.items():
+        numbers = sorted(int(chapter) for chapter in chapters)
+        books[book] = {
+            "chapters": numbers,
+            "verses": [len(chapters[str(number)]) for number in numbers],
+            "chars": [sum(len(text) for text in chapters[str(number)].values()) for number in numbers]
+        }
+    return {"version": version.upper(), "source": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}, "books": books}
+
+def save_canon(canon: Dict):
+    """Write a canon table atomically."""
+    os.makedirs(CANON_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=CANON_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(canon, f, separators=(',', ':'))
+        os.replace(temp_path, get_canon_path(canon["version"]))
+    except Exception as e:
+        print(f"Warning: Could not save canon table: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def load_canon(version: str) -> Optional[Dict]:
+    """
+    Canon table of a version, or None if there is no corpus for it. The table is built the first
+    time the corpus is seen (and again when it changes) and kept in cache/canon/.
+    """
+    version = version.upper()
+    try:
+        stat = os.stat(get_corpus_path(version))
+    except OSError:
+        return None
+    source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    with _canon_lock:
+        canon = _canon_cache.get(version)
+        if canon and canon["source"] == source:
+            return canon
+
+        try:
+            with open(get_canon_path(version), 'r', encoding='utf-8') as f:
+                canon = json.load(f)
+        except (OSError, ValueError):
+            canon = None
+        if not canon or canon.get("source") != source:
+            print(f"Building canon table for {version}...")
+            canon = build_canon(version)
+            save_canon(canon)
+
+        # Chapter lookups by number, not stored on disk
+        for info in canon["books"].values():
+            info["index"] = {number: i for i, number in enumerate(info["chapters"])}
+        _canon_cache[version] = canon
+        return canon
+
+def split_passage(passage: str) -> Tuple[str, str]:
+    """'Song of Solomon 1-3' -> ('Song of Solomon', '1-3'). Raises ValueError without a chapter part."""
+    parts = passage.split()
+    if len(parts) < 2:
+        raise ValueError("Please include both book name and chapter range.")
+    return " ".join(parts[:-1]), parts[-1]
+
+def check_passage(canon: Dict, passage: str) -> Tuple[bool, str]:
+    """Validate a passage ('Book 3' or 'Book 1-5') against a canon table. Returns (valid, message)."""
+    try:
+        book, chapter_range = split_passage(passage)
+    except ValueError as e:
+        return False, str(e)
+
+    info = canon["books"].get(book)
+    if info is None:
+        suggestions = [name for name in canon["books"] if name.lower() == book.lower()]
+        if suggestions:
+            return False, f"Book '{book}' not found. Did you mean '{suggestions[0]}'?"
+        return False, f"Book '{book}' not found. Available books: {', '.join(list(canon['books'])[:10])}..."
+
+    try:
+        if '-' in chapter_range:
+            start_ch, end_ch = chapter_range.split('-')
+            start_chapter, end_chapter = int(start_ch), int(end_ch)
+        else:
+            start_chapter = end_chapter = int(chapter_range)
+    except ValueError:
+        return False, "Invalid chapter number format."
+
+    available = f"{info['chapters'][0]}-{info['chapters'][-1]}" if info["chapters"] else "none"
+    for chapter in (start_chapter, end_chapter):
+        if chapter not in info["index"]:
+            return False, f"Chapter {chapter} not found in {book}. Available chapters: {available}"
+
+    if start_chapter > end_chapter:
+        return False, "Start chapter cannot be greater than end chapter."
+
+    return True, "Valid passage"
+
+def passage_stats(canon: Dict, passage: str) -> Dict:
+    """Verse and character counts of a valid passage, e.g. for length estimates."""
+    book, chapter_range = split_passage(passage)
+    info = canon["books"][book]
+    start_chapter, _, end_chapter = chapter_range.partition('-')
+    start = info["index"][int(start_chapter)]
+    end = info["index"][int(end_chapter or start_chapter)]
+    return {
+        "chapters": end - start + 1,
+        "verses": sum(info["verses"][start:end + 1]),
+        "chars": sum(info["chars"][start:end + 1])
+    }
+
+def list_books(canon: Dict, prefix: str = "") -> List[Dict]:
+    """Books of a version (optionally those starting with prefix) with their chapter and verse counts."""
+    needle = prefix.strip().lower()
+    return [
+        {"name": book, "chapters": len(info["chapters"]), "first_chapter": info["chapters"][0] if info["chapters"] else None,
+         "last_chapter": info["chapters"][-1] if info["chapters"] else None, "verses": sum(info["verses"])}
+        for book, info in canon["books"].items() if book.lower().startswith(needle)
+    ]
+
+def get_book(canon: Dict, book: str) -> Optional[Dict]:
+    """Per-chapter verse and character counts of one book."""
+    info = canon["books"].get(book)
+    if info is None:
+        return None
+    return {
+        "name": book,
+        "chapters": [{"chapter": number, "verses": verses, "chars": chars}
+                     for number, verses, chars in zip(info["chapters"], info["verses"], info["chars"])]
+    }
+
+def preload_canons() -> List[str]:
+    """Load (building where needed) the canon table of every corpus in bibles/. Returns the versions."""
+    versions = []
+    for file in sorted(Path("bibles").glob("*_bible.json")):
+        version = file.stem.replace("_bible", "")
+        try:
+            if load_canon(version):
+                versions.append(version)
+        except Exception as e:
+            print(f"Error building canon table for {version}: {e}")
+    return versions
@@ -5,12 +5,23 @@ Converts text-based podcast scripts to audio using Google Text-to-Speech
 """
 
 import os
+import json
+import hashlib
+import difflib
 import tempfile
 import re
+import subprocess
+import shutil
+import threading
 from pathlib import Path
-from typing import List, Dict
+from xml.sax.saxutils import escape
+from typing import List, Dict, Optional, Tuple
 from tqdm import tqdm
 
+from profiling import profile_job, PROFILE_MODES
+from retention import register_cli_outputs
+from media_info import scan_mp3_frames, mp3_sample_to_byte, get_manifest_path, load_audio_manifest
+
 # Google TTS imports (optional)
 try:
     from google.cloud import texttospeech
@@ -25,14 +36,24 @@ try:
 except ImportError:
     HAS_PYDUB = False
     # Fallback to using ffmpeg directly
-    import subprocess
-    import shutil
+
+# Post-processing imports (optional)
+try:
+    import numpy as np
+    from audio_processing import AudioPostProcessor, HAS_NUMPY
+except ImportError:
+    HAS_NUMPY = False
 
 class PodcastAudioGenerator:
     def __init__(self):
         self.temp_dir = None
         self.tts_client = None
         
+        # Chunks being synthesized right now (cache path -> Event), so a prefetch running next to
+        # generate_podcast_audio never sends the same request twice
+        self.inflight_chunks = {}
+        self.inflight_lock = threading.Lock()
+        
         # Voice configuration for HOST and GUEST
         self.voice_config = {
             "HOST": {
@@ -46,6 +67,33 @@ class PodcastAudioGenerator:
                 "gender": "FEMALE"
             }
         }
+        
+        # Synthesis settings shared by every TTS request
+        self.tts_audio_config = {
+            "speaking_rate": 0.95,  # Slightly slower for clarity
+            "pitch": 0.0,
+            "volume_gain_db": 0.0
+        }
+        
+        # Pauses (in ms) synthesized at the end of each segment, chosen from the script structure
+        self.pause_config = {
+            "same_speaker": 300,     # Another turn by the same speaker
+            "speaker_change": 500,   # Hand-off between HOST and GUEST
+            "section_break": 1200,   # End of a '---' delimited section
+            "scripture_intro": 400   # Between "Now let's turn to ...:" and the quoted verses
+        }
+        
+        # Scripture quotations are read slightly slower than commentary
+        self.scripture_rate = "92%"
+        
+        # Loudness normalization, edge silence trimming and crossfades before the final encode
+        self.postprocess_config = {
+            "enabled": True,
+            "target_lufs": -16.0,          # Common podcast loudness target
+            "peak_limit_db": -1.0,
+            "silence_threshold_db": -50.0,
+            "crossfade_ms": 10
+        }
 
     def initialize_tts_client(self) -> bool:
         """Initialize the TTS client after credentials are set up."""
@@ -69,15 +117,28 @@ class PodcastAudioGenerator:
         with open(script_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
+        return self.parse_podcast_text(content)
+
+    def parse_podcast_text(self, content: str) -> List[Dict]:
+        """Extract HOST and GUEST segments from script text (a whole script or the part built so far)."""
         segments = []
         
+        # Section headers ("## ...") tell us which section each segment belongs to
+        headers = [(m.start(), m.group(1).strip()) for m in re.finditer(r'^##\s+(.*)$', content, re.MULTILINE)]
+        
         # Split by **HOST:** and **GUEST:** markers
         pattern = r'\*\*(HOST|GUEST):\*\*\s*(.*?)(?=\*\*(HOST|GUEST):\*\*|\Z)'
-        matches = re.findall(pattern, content, re.DOTALL)
         
-        for match in matches:
-            speaker = match[0]
-            text = match[1].strip()
+        for match in re.finditer(pattern, content, re.DOTALL):
+            speaker = match.group(1)
+            text = match.group(2).strip()
+            
+            # The section is the last header that appears before this segment
+            section = None
+            for header_pos, header_title in headers:
+                if header_pos > match.start():
+                    break
+                section = header_title
             
             # Clean up text - remove markdown headers and extra whitespace
             text = re.sub(r'^#+\s.*$', '', text, flags=re.MULTILINE)  # Remove headers
@@ -88,20 +149,82 @@ class PodcastAudioGenerator:
             if text and len(text) > 10:  # Only include substantial content
                 segments.append({
                     "speaker": speaker,
-                    "text": text
+                    "text": text,
+                    "section": section
                 })
         
         return segments
 
-    def generate_audio_segment(self, text: str, voice_config: Dict, output_path: str) -> bool:
-        """Generate audio for a single text segment using Google TTS."""
+    def get_segment_pause(self, segments: List[Dict], index: int) -> int:
+        """Get the pause (ms) to synthesize after a segment, based on what follows it."""
+        if index >= len(segments) - 1:
+            return 0
+        
+        current, following = segments[index], segments[index + 1]
+        if current.get("section") != following.get("section"):
+            return self.pause_config["section_break"]
+        if current["speaker"] != following["speaker"]:
+            return self.pause_config["speaker_change"]
+        return self.pause_config["same_speaker"]
+
+    def split_text_chunks(self, text: str, fits) -> List[str]:
+        """
+        Split long text into chunks on sentence boundaries (word boundaries within an overlong
+        sentence), so that fits(chunk) holds for every chunk.
+        """
+        if fits(text):
+            return [text]
+        
+        sentences = re.split(r'(?<=[.!?])\s+', text)
+        chunks = []
+        current_chunk = ""
+        
+        for sentence in sentences:
+            for piece in ([sentence] if fits(sentence) else sentence.split()):
+                candidate = current_chunk + " " + piece if current_chunk else piece
+                if fits(candidate):
+                    current_chunk = candidate
+                else:
+                    if current_chunk:
+                        chunks.append(current_chunk)
+                    current_chunk = piece
+        
+        if current_chunk:
+            chunks.append(current_chunk)
+        
+        return chunks
+
+    def build_ssml(self, text: str, pause_ms: int = 0) -> str:
+        """Convert a chunk of script text to SSML with pacing derived from its structure."""
+        # Markdown emphasis is not meant to be read aloud
+        text = text.replace('**', '').strip()
+        ssml = escape(text)
+        
+        # Read quoted scripture at a slower rate, after a short pause following its introduction
+        scripture = re.match(r'^([^"]*:)?\s*(".*)$', ssml, re.DOTALL)
+        if scripture:
+            intro, quote = scripture.groups()
+            ssml = f'<prosody rate="{self.scripture_rate}">{quote}</prosody>'
+            if intro:
+                ssml = f'{intro}<break time="{self.pause_config["scripture_intro"]}ms"/>{ssml}'
+        
+        if pause_ms:
+            ssml += f'<break time="{pause_ms}ms"/>'
+        
+        return f"<speak>{ssml.strip()}</speak>"
+
+    def generate_audio_segment(self, text: str, voice_config: Dict, output_path: str, ssml: bool = False) -> bool:
+        """Generate audio for a single text (or SSML) segment using Google TTS."""
         if not self.tts_client:
             print("Error: Google TTS client not available")
             return False
         
         try:
             # Create synthesis input
-            synthesis_input = texttospeech.SynthesisInput(text=text)
+            if ssml:
+                synthesis_input = texttospeech.SynthesisInput(ssml=text)
+            else:
+                synthesis_input = texttospeech.SynthesisInput(text=text)
             
             # Create voice selection
             voice = texttospeech.VoiceSelectionParams(
@@ -112,9 +235,7 @@ class PodcastAudioGenerator:
             # Create audio config
             audio_config = texttospeech.AudioConfig(
                 audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=0.95,  # Slightly slower for clarity
-                pitch=0.0,
-                volume_gain_db=0.0
+                **self.tts_audio_config
             )
             
             # Perform TTS request
@@ -134,8 +255,132 @@ class PodcastAudioGenerator:
             print(f"Error generating audio: {e}")
             return False
 
-    def generate_podcast_audio(self, script_path: str, output_path: str) -> str:
-        """Generate audio podcast from the script file."""
+    def build_tts_requests(self, segments: List[Dict], complete: bool = True) -> tuple:
+        """
+        TTS requests as (segment index, voice config, ssml, chunk key, trailing pause) plus the chunk
+        keys of every segment. With complete=False the last segment is left out, because its pause
+        depends on a segment that does not exist yet.
+        """
+        max_bytes = 4900  # Google TTS limit: 5000 bytes of UTF-8 SSML per request
+        requests = []
+        segment_keys = []
+        
+        for i, segment in enumerate(segments if complete else segments[:-1]):
+            voice_config = self.voice_config.get(segment["speaker"])
+            if not voice_config:
+                print(f"Warning: No voice configured for speaker '{segment['speaker']}', skipping")
+                segment_keys.append([])
+                continue
+            
+            # Split long text into chunks; the pause after the segment is synthesized with its last chunk
+            # Sizes are measured on the finished SSML (escaped, with markup and the trailing pause)
+            pause_ms = self.get_segment_pause(segments, i)
+            chunks = self.split_text_chunks(
+                segment["text"], lambda chunk: len(self.build_ssml(chunk, pause_ms).encode('utf-8')) <= max_bytes
+            )
+            keys = []
+            for j, chunk in enumerate(chunks):
+                chunk_pause = pause_ms if j == len(chunks) - 1 else 0
+                ssml = self.build_ssml(chunk, chunk_pause)
+                key = self.get_chunk_key(ssml, voice_config)
+                requests.append((i, voice_config, ssml, key, chunk_pause))
+                keys.append(key)
+            segment_keys.append(keys)
+        
+        return requests, segment_keys
+
+    def synthesize_chunk(self, cache_dir: Path, key: str, ssml: str, voice_config: Dict, wait: bool = True) -> Path:
+        """
+        Synthesize one chunk into the segment cache. Returns its path, or None on failure. If another
+        thread is already synthesizing it, waits for that result (or with wait=False returns None at once).
+        """
+        output_file = cache_dir / f"{key}.mp3"
+        
+        with self.inflight_lock:
+            pending = self.inflight_chunks.get(str(output_file))
+            owner = pending is None
+            if owner:
+                pending = self.inflight_chunks[str(output_file)] = threading.Event()
+        if not owner:
+            if not wait:
+                return None
+            pending.wait()
+            return output_file if output_file.exists() and output_file.stat().st_size > 0 else None
+        
+        try:
+            # Write under a temporary name so an interrupted request never leaves a truncated chunk
+            partial_file = cache_dir / f"{key}.partial.mp3"
+            success = self.generate_audio_segment(ssml, voice_config, str(partial_file), ssml=True)
+            if not (success and partial_file.exists()):
+                return None
+            os.replace(partial_file, output_file)
+            return output_file
+        finally:
+            with self.inflight_lock:
+                del self.inflight_chunks[str(output_file)]
+            pending.set()
+
+    def prefetch_script_audio(self, content: str, output_path: str, stop: Optional[threading.Event] = None) -> int:
+        """
+        Synthesize the chunks of a script that is still being written into the podcast's segment cache,
+        so generate_podcast_audio finds them ready. Stops before the next chunk once stop is set.
+        Returns the number of chunks synthesized.
+        """
+        if not self.tts_client:
+            return 0
+        requests, _ = self.build_tts_requests(self.parse_podcast_text(content), complete=False)
+        cache_dir = self.get_segment_cache_dir(output_path)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        synthesized = 0
+        for _, voice_config, ssml, key, _ in requests:
+            if stop is not None and stop.is_set():
+                break
+            cached_file = cache_dir / f"{key}.mp3"
+            if not (cached_file.exists() and cached_file.stat().st_size > 0):
+                # Chunks another thread is already synthesizing are skipped, not waited for
+                synthesized += bool(self.synthesize_chunk(cache_dir, key, ssml, voice_config, wait=False))
+        return synthesized
+
+    def get_segment_cache_dir(self, output_path: str) -> Path:
+        """Directory holding the synthesized chunks of a podcast, reused when its script is edited."""
+        output = Path(output_path)
+        return output.parent / f".{output.stem}.segments"
+
+    def get_chunk_key(self, ssml: str, voice_config: Dict) -> str:
+        """Content key of a TTS request; identical requests always produce identical audio."""
+        request = [voice_config["name"], voice_config["language_code"], self.tts_audio_config, ssml]
+        return hashlib.sha1(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def diff_segments(self, previous_manifest: Dict, segment_keys: List[List[str]]) -> Dict:
+        """Compare the chunk keys of each new segment with the previous render's segment list."""
+        previous_keys = [tuple(segment.get("chunks", [])) for segment in previous_manifest.get("segments", [])]
+        current_keys = [tuple(keys) for keys in segment_keys]
+        
+        summary = {"unchanged": 0, "changed": 0, "added": 0, "removed": 0}
+        matcher = difflib.SequenceMatcher(a=previous_keys, b=current_keys, autojunk=False)
+        for tag, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+            if tag == 'equal':
+                summary["unchanged"] += b_end - b_start
+            elif tag == 'replace':
+                changed = min(a_end - a_start, b_end - b_start)
+                summary["changed"] += changed
+                summary["added"] += (b_end - b_start) - changed
+                summary["removed"] += (a_end - a_start) - changed
+            elif tag == 'insert':
+                summary["added"] += b_end - b_start
+            elif tag == 'delete':
+                summary["removed"] += a_end - a_start
+        
+        return summary
+
+    def generate_podcast_audio(self, script_path: str, output_path: str, progress_callback=None,
+                               encoded_audio_path: str = None, before_cleanup=None) -> str:
+        """
+        Generate audio podcast from the script file. With encoded_audio_path, the post-processing
+        encoder also writes an AAC copy there for video muxing, from the same PCM stream.
+        before_cleanup is called before unused cached chunks are deleted, e.g. to stop a running prefetch.
+        """
         if not HAS_GOOGLE_TTS:
             print("Error: google-cloud-texttospeech package not installed.")
             print("Please install: pip install google-cloud-texttospeech")
@@ -168,66 +413,78 @@ class PodcastAudioGenerator:
             print("No segments found in script!")
             return None
         
-        # Process each segment
+        # Build the TTS requests for every segment up front so they can be compared with the last render
+        requests, segment_keys = self.build_tts_requests(segments)
+        
+        # Synthesized chunks are kept per podcast, so after an edit only changed chunks go to TTS
+        cache_dir = self.get_segment_cache_dir(output_path)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        previous_manifest = load_audio_manifest(output_path)
+        if previous_manifest:
+            changes = self.diff_segments(previous_manifest, segment_keys)
+            print(f"Previous render found: {changes['unchanged']} segments unchanged, {changes['changed']} changed, "
+                  f"{changes['added']} added, {changes['removed']} removed")
+        
+        # Process each chunk
         temp_files = []
-        max_chars = 5000  # Google TTS limit
+        temp_info = []  # Script segment, chunk key and synthesized trailing pause of each temp file
+        reused = 0
         
-        for i, segment in enumerate(tqdm(segments, desc="Generating audio")):
-            speaker = segment["speaker"]
-            text = segment["text"]
-            
-            voice_config = self.voice_config.get(speaker)
-            if not voice_config:
-                print(f"Warning: No voice configured for speaker '{speaker}', skipping")
-                continue
+        for done, (i, voice_config, ssml, key, chunk_pause) in enumerate(tqdm(requests, desc="Generating audio")):
+            if progress_callback:
+                progress_callback(int(80 * done / len(requests)), f"Synthesizing speech ({done}/{len(requests)})...")
             
-            print(f"\nProcessing {speaker}: {len(text)} characters")
-            
-            # Split long text into chunks
-            if len(text) > max_chars:
-                sentences = re.split(r'(?<=[.!?])\s+', text)
-                chunks = []
-                current_chunk = ""
-                
-                for sentence in sentences:
-                    if len(current_chunk) + len(sentence) < max_chars:
-                        current_chunk += " " + sentence if current_chunk else sentence
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk)
-                        current_chunk = sentence
-                
-                if current_chunk:
-                    chunks.append(current_chunk)
+            cached_file = cache_dir / f"{key}.mp3"
+            if cached_file.exists() and cached_file.stat().st_size > 0:
+                reused += 1
+                output_file = cached_file
             else:
-                chunks = [text]
+                print(f"\nProcessing {segments[i]['speaker']} (segment {i + 1}): {len(ssml)} characters")
+                output_file = self.synthesize_chunk(cache_dir, key, ssml, voice_config)
+                if not output_file:
+                    print(f"  Failed to generate chunk for segment {i + 1}")
+                    continue
             
-            # Generate audio for each chunk
-            for j, chunk in enumerate(chunks):
-                output_file = self.temp_dir / f"segment_{i:04d}_{j:02d}.mp3"
-                
-                success = self.generate_audio_segment(chunk, voice_config, str(output_file))
-                if success and output_file.exists():
-                    temp_files.append(output_file)
-                    print(f"  Generated chunk {j+1}/{len(chunks)}")
-                else:
-                    print(f"  Failed to generate chunk {j+1}/{len(chunks)}")
+            temp_files.append(output_file)
+            temp_info.append({"segment": i, "key": key, "pause_ms": chunk_pause})
+        
+        print(f"Synthesized {len(temp_files) - reused} chunks, reused {reused} from the previous render")
         
         # Combine all audio files
         print(f"\nCombining {len(temp_files)} audio segments...")
+        if progress_callback:
+            progress_callback(80, "Post-processing and encoding audio...")
         
-        if HAS_PYDUB:
-            # Use pydub if available
-            combined = AudioSegment.empty()
+        if HAS_PYDUB and HAS_NUMPY and self.postprocess_config["enabled"] and temp_files:
+            # Normalize, trim and crossfade segments while streaming them into a single encode
+            print(f"Post-processing and exporting podcast to {output_path}...")
+            result = self.export_postprocessed(temp_files, [info["pause_ms"] for info in temp_info], output_path,
+                                               encoded_audio_path)
+            if result is None:
+                return None
+            sample_rate, chunk_bounds = result
+            duration_seconds = chunk_bounds[-1][1] / sample_rate if chunk_bounds else 0
+        elif HAS_PYDUB:
+            # Use pydub if available - pauses are already part of the synthesized audio
+            decoded = []
+            chunk_bounds = []
+            position = 0
             
             for temp_file in tqdm(temp_files, desc="Combining segments"):
                 try:
-                    segment = AudioSegment.from_mp3(str(temp_file))
-                    combined += segment
-                    # Add pause between segments
-                    combined += AudioSegment.silent(duration=500)  # 0.5 second pause
+                    decoded.append(AudioSegment.from_mp3(str(temp_file)))
                 except Exception as e:
                     print(f"Error combining file {temp_file}: {e}")
+                    chunk_bounds.append((position, position))
+                    continue
+                # Frame counts at the first segment's rate, which join_audio_segments converts to
+                frames = int(round(decoded[-1].frame_count() * decoded[0].frame_rate / decoded[-1].frame_rate))
+                chunk_bounds.append((position, position + frames))
+                position += frames
+            
+            combined = self.join_audio_segments(decoded)
+            sample_rate = combined.frame_rate
             
             # Export final podcast
             print(f"Exporting podcast to {output_path}...")
@@ -252,6 +509,17 @@ class PodcastAudioGenerator:
                 ]
                 subprocess.run(cmd, check=True, capture_output=True)
                 
+                # Stream-copied frames keep their sample counts, so boundaries come from the frame headers
+                chunk_bounds = []
+                sample_rate = None
+                position = 0
+                for temp_file in temp_files:
+                    frames = scan_mp3_frames(str(temp_file))
+                    samples = frames["total_samples"] if frames else 0
+                    sample_rate = sample_rate or (frames and frames["sample_rate"])
+                    chunk_bounds.append((position, position + samples))
+                    position += samples
+                
                 # Get duration using ffprobe
                 duration_cmd = ['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'csv=p=0', output_path]
                 result = subprocess.run(duration_cmd, capture_output=True, text=True)
@@ -263,27 +531,173 @@ class PodcastAudioGenerator:
             except Exception as e:
                 print(f"Error getting audio duration: {e}")
                 duration_seconds = 0
+                sample_rate = None
         
-        # Clean up temp files
-        for temp_file in temp_files:
+        # Record segment timing next to the audio so nothing has to decode it later
+        if sample_rate:
             try:
-                temp_file.unlink()
-            except:
-                pass
+                manifest_path = self.write_manifest(script_path, output_path, segments, temp_info, chunk_bounds, sample_rate)
+                print(f"Timing manifest: {manifest_path}")
+            except Exception as e:
+                print(f"Warning: Could not write timing manifest: {e}")
+        
+        # Drop cached chunks the current script no longer uses; chunks still being written
+        # (<key>.partial.mp3) belong to another synthesis and are left alone
+        if before_cleanup:
+            before_cleanup()
+        current_keys = {info["key"] for info in temp_info}
+        for cached_file in cache_dir.glob("*.mp3"):
+            if cached_file.name.endswith(".partial.mp3"):
+                continue
+            if cached_file.stem not in current_keys:
+                try:
+                    cached_file.unlink()
+                except:
+                    pass
         
         # Remove temp directory
-        try:
-            self.temp_dir.rmdir()
-        except:
-            pass
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
         
         duration_minutes = duration_seconds / 60
         print(f"\nPodcast generated successfully!")
         print(f"File: {output_path}")
         print(f"Duration: {duration_minutes:.1f} minutes")
         
+        if progress_callback:
+            progress_callback(100, "Audio generated")
         return output_path
 
+    def join_audio_segments(self, audio_segments: List) -> "AudioSegment":
+        """Join decoded segments in a single pass instead of repeated concatenation."""
+        if not audio_segments:
+            return AudioSegment.empty()
+        
+        # Match every segment to the format of the first one, then join the raw sample data once
+        first = audio_segments[0]
+        raw_data = []
+        for segment in audio_segments:
+            segment = segment.set_frame_rate(first.frame_rate).set_channels(first.channels).set_sample_width(first.sample_width)
+            raw_data.append(segment.raw_data)
+        
+        return first._spawn(b''.join(raw_data))
+
+    def export_postprocessed(self, temp_files: List[Path], pauses: List[int], output_path: str,
+                             encoded_audio_path: str = None) -> Optional[Tuple[int, List[Tuple[int, int]]]]:
+        """
+        Post-process segments one at a time and pipe them to ffmpeg. Returns (sample_rate, chunk_bounds),
+        with the (start, end) sample frames of each temp file in the output, or None if encoding failed.
+        """
+        first = AudioSegment.from_mp3(str(temp_files[0]))
+        sample_rate, channels = first.frame_rate, first.channels
+        
+        settings = {key: value for key, value in self.postprocess_config.items() if key != "enabled"}
+        processor = AudioPostProcessor(sample_rate, channels, **settings)
+        
+        def decoded_segments():
+            for index, (temp_file, pause_ms) in enumerate(zip(temp_files, pauses)):
+                try:
+                    segment = first if index == 0 else AudioSegment.from_mp3(str(temp_file))
+                    segment = segment.set_frame_rate(sample_rate).set_channels(channels).set_sample_width(2)
+                except Exception as e:
+                    # An empty placeholder keeps segment_bounds in step with temp_files
+                    print(f"Error decoding file {temp_file}: {e}")
+                    yield np.zeros((0, channels), dtype=np.float32), pause_ms
+                    continue
+                yield processor.to_float(np.frombuffer(segment.raw_data, dtype='<i2')), pause_ms
+        
+        cmd = [
+            AudioSegment.converter, '-loglevel', 'error',
+            '-f', 's16le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0',
+            '-b:a', '192k', '-y', output_path
+        ]
+        if encoded_audio_path:
+            # Second output of the same encode: AAC the video stage can stream-copy
+            cmd += ['-c:a', 'aac', '-b:a', '128k', encoded_audio_path]
+        encoder = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        
+        try:
+            for block in tqdm(processor.process_segments(decoded_segments()), desc="Post-processing", unit="block"):
+                encoder.stdin.write(block)
+        except BrokenPipeError:
+            pass
+        finally:
+            _, errors = encoder.communicate()
+        
+        if encoder.returncode != 0:
+            print(f"Error encoding podcast with ffmpeg: {errors.decode(errors='replace').strip()}")
+            return None
+        
+        return sample_rate, list(processor.segment_bounds)
+
+    def get_verse_span(self, section: str) -> str:
+        """Extract the scripture reference from a section header, e.g. 'Psalm 1:1-3' or 'Genesis 1'."""
+        if not section:
+            return None
+        
+        match = re.match(r'Section \d+: (.+?) - ', section)
+        if match:
+            return match.group(1)
+        
+        match = re.match(r'(.+) Chapter (\d+)$', section)
+        if match:
+            return f"{match.group(1)} {match.group(2)}"
+        
+        return None
+
+    def write_manifest(self, script_path: str, output_path: str, segments: List[Dict], temp_info: List[Dict],
+                       chunk_bounds: List[tuple], sample_rate: int) -> str:
+        """Write the JSON timing manifest for a generated podcast and return its path."""
+        frames = scan_mp3_frames(output_path)
+        
+        # A script segment spans all of its synthesized chunks
+        segment_bounds = {}
+        for info, (start, end) in zip(temp_info, chunk_bounds):
+            if info["segment"] in segment_bounds:
+                start = min(start, segment_bounds[info["segment"]][0])
+                end = max(end, segment_bounds[info["segment"]][1])
+            segment_bounds[info["segment"]] = (start, end)
+        
+        manifest_segments = []
+        for index, (start, end) in sorted(segment_bounds.items()):
+            segment = segments[index]
+            entry = {
+                "index": index,
+                "speaker": segment["speaker"],
+                "section": segment.get("section"),
+                "verse_span": self.get_verse_span(segment.get("section")),
+                "text": segment["text"],
+                "chunks": [info["key"] for info in temp_info if info["segment"] == index],
+                "start": round(start / sample_rate, 3),
+                "end": round(end / sample_rate, 3),
+                "start_sample": start,
+                "end_sample": end,
+                "byte_start": None,
+                "byte_end": None
+            }
+            if frames:
+                entry["byte_start"] = mp3_sample_to_byte(frames, start)
+                entry["byte_end"] = mp3_sample_to_byte(frames, end, end=True)
+            manifest_segments.append(entry)
+        
+        total_samples = frames["total_samples"] if frames else (chunk_bounds[-1][1] if chunk_bounds else 0)
+        manifest = {
+            "audio_file": os.path.basename(output_path),
+            "script_file": os.path.basename(script_path),
+            "sample_rate": sample_rate,
+            "channels": frames["channels"] if frames else None,
+            "bitrate": frames["bitrate"] if frames else None,
+            "total_samples": total_samples,
+            "duration": round(total_samples / sample_rate, 3),
+            "size": os.path.getsize(output_path),
+            "segments": manifest_segments
+        }
+        
+        manifest_path = get_manifest_path(output_path)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        
+        return manifest_path
+
 def setup_google_credentials(credentials_path: str = None):
     """Set up Google Cloud credentials for TTS."""
     if credentials_path and os.path.exists(credentials_path):
@@ -304,6 +718,12 @@ def get_script_files():
     return script_files
 
 def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate podcast audio from a script")
+    parser.add_argument("--profile", choices=PROFILE_MODES, help="Profile audio generation (cpu, memory or all)")
+    args = parser.parse_args()
+    
     print("="*60)
     print("PODCAST AUDIO GENERATOR")
     print("="*60)
@@ -377,7 +797,10 @@ def main():
     generator = PodcastAudioGenerator()
     
     try:
-        audio_file = generator.generate_podcast_audio(script_path, output_path)
+        with profile_job(os.path.dirname(output_path) or ".", f"profile_{Path(output_path).stem}", args.profile) as profile_reports:
+            audio_file = generator.generate_podcast_audio(script_path, output_path)
+        # Files under output/ join the retention index like the web app's outputs
+        register_cli_outputs([audio_file, *profile_reports.values()])
         if audio_file:
             print(f"\n🎉 Audio podcast generated successfully: {audio_file}")
         else:
@@ -5,11 +5,27 @@ Converts MP3 audio files to MP4 videos with static background images for YouTube
 """
 
 import os
+import glob
+import json
+import fnmatch
+import hashlib
+import shutil
+import subprocess
 import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Dict, Optional
 from tqdm import tqdm
 
+from media_info import get_audio_duration, get_media_info, hash_file
+from media_library import AudioLibraryIndex
+from subtitles import write_subtitles
+from profiling import profile_job, PROFILE_MODES
+from retention import register_cli_outputs
+
 # Video processing imports (optional)
 try:
     from moviepy import AudioFileClip, ImageClip, CompositeVideoClip
@@ -19,100 +35,85 @@ except ImportError:
 
 # Image processing imports (optional)
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
     HAS_PIL = True
 except ImportError:
     HAS_PIL = False
 
+# Audio codecs that can be stream-copied into MP4, by file extension
+MP4_AUDIO_EXTENSIONS = {".m4a": "aac", ".aac": "aac", ".mp4": "aac", ".mp3": "mp3"}
+
+def find_ffmpeg() -> Optional[str]:
+    """Locate an ffmpeg binary: PATH first, then the one bundled with moviepy's imageio-ffmpeg."""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        return ffmpeg
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
 class PodcastVideoGenerator:
-    def __init__(self):
+    def __init__(self, cache_dir: str = "cache"):
         self.temp_dir = None
+        self.cache_dir = cache_dir  # Shared, content-addressed render caches
+        self.audio_indexes = {}
+        
+        # Prepared background images in use by renders of this process; these are never evicted
+        self.image_refs = Counter()
+        self.image_lock = threading.Lock()
+        self.image_cache_config = {
+            "max_bytes": 200 * 1024 * 1024,  # Evict least recently used images beyond this
+            "min_age_seconds": 600  # Images used this recently may belong to renders in other processes
+        }
+        # Encoded background loops (cache/backgrounds), evicted the same way
+        self.loop_cache_config = {
+            "max_bytes": 500 * 1024 * 1024,
+            "min_age_seconds": 600  # Loops reused this recently may be muxed by renders in other processes
+        }
         
         # Video configuration for YouTube optimization
         self.video_config = {
             "resolution": (1280, 720),  # 720p for faster processing
             "fps": 24,  # Lower FPS for faster rendering
+            "fit": "contain",  # "contain" letterboxes the background, "cover" crops it to fill the frame
             "audio_bitrate": "128k",  # Good quality audio
             "video_codec": "libx264",
-            "audio_codec": "aac",
+            "audio_codec": "aac",  # "mp3" keeps MP3 podcasts as-is (stream copy, no transcode)
             "preset": "ultrafast",  # Fastest encoding preset
-            "crf": 28  # Higher CRF for smaller file size
+            "crf": 28,  # Higher CRF for smaller file size
+            "video_bitrate": None,  # Optional cap (e.g. "1500k"), CRF alone when None
+            "engine": "ffmpeg",  # "ffmpeg" still-image fast path, or "moviepy"
+            "still_fps": 2,  # Frame rate for static backgrounds, nothing moves between frames
+            "gop_seconds": 10,  # Keyframe interval; long GOPs cost almost nothing for a still picture
+            "threads": 0,  # x264 threads, 0 lets the encoder decide
+            "loop_cache": True,  # Encode each background once and stream-copy it under every episode
+            "loop_seconds": 60,  # Length of the cached background loop, rounded to whole GOPs
+            "subtitles": True,  # Write SRT/WebVTT captions from the script and mux them as a soft track
+            "subtitle_language": "eng"
         }
-
-    def get_available_audio_files(self, directory: str = "output") -> List[Dict]:
-        """Get list of available MP3 files for video conversion."""
-        audio_files = []
-        
-        if not os.path.exists(directory):
-            return audio_files
         
-        # Recursively search for MP3 files in output directory
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if file.lower().endswith('.mp3'):
-                    full_path = os.path.join(root, file)
-                    try:
-                        # Get file info
-                        stat = os.stat(full_path)
-                        file_size = stat.st_size
-                        
-                        # Try to get audio duration
-                        duration = None
-                        if HAS_MOVIEPY:
-                            try:
-                                with AudioFileClip(full_path) as audio:
-                                    duration = audio.duration
-                            except:
-                                pass
-                        
-                        audio_files.append({
-                            "filename": file,
-                            "path": full_path,
-                            "relative_path": os.path.relpath(full_path, directory),
-                            "size": file_size,
-                            "size_mb": round(file_size / (1024 * 1024), 2),
-                            "duration": duration,
-                            "duration_str": f"{int(duration // 60)}:{int(duration % 60):02d}" if duration else "Unknown"
-                        })
-                    except Exception as e:
-                        print(f"Error processing {full_path}: {e}")
-        
-        # Also search in current directory for any MP3 files
-        try:
-            for file in os.listdir('.'):
-                if file.lower().endswith('.mp3'):
-                    full_path = os.path.abspath(file)
-                    try:
-                        stat = os.stat(full_path)
-                        file_size = stat.st_size
-                        
-                        duration = None
-                        if HAS_MOVIEPY:
-                            try:
-                                with AudioFileClip(full_path) as audio:
-                                    duration = audio.duration
-                            except:
-                                pass
-                        
-                        # Avoid duplicates
-                        if not any(af["path"] == full_path for af in audio_files):
-                            audio_files.append({
-                                "filename": file,
-                                "path": full_path,
-                                "relative_path": file,
-                                "size": file_size,
-                                "size_mb": round(file_size / (1024 * 1024), 2),
-                                "duration": duration,
-                                "duration_str": f"{int(duration // 60)}:{int(duration % 60):02d}" if duration else "Unknown"
-                            })
-                    except Exception as e:
-                        print(f"Error processing {full_path}: {e}")
-        except Exception as e:
-            print(f"Error scanning current directory: {e}")
-        
-        # Sort by creation time (newest first)
-        audio_files.sort(key=lambda x: os.path.getctime(x["path"]), reverse=True)
-        return audio_files
+        # Rendition ladder: video_config overrides for each published format
+        self.rendition_ladder = {
+            "1080p": {"resolution": (1920, 1080)},
+            "720p": {"resolution": (1280, 720)},
+            "vertical": {"resolution": (1080, 1920), "fit": "cover"}  # 9:16 clip, background cropped to fill
+        }
+
+    def get_audio_index(self, directory: str = "output") -> AudioLibraryIndex:
+        """Persistent metadata index of the MP3s under a directory."""
+        if directory not in self.audio_indexes:
+            index_name = "audio_index.json" if directory == "output" else f"audio_index_{hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()[:12]}.json"
+            self.audio_indexes[directory] = AudioLibraryIndex(
+                os.path.join(self.cache_dir, index_name), directory
+            )
+        return self.audio_indexes[directory]
+
+    def get_available_audio_files(self, directory: str = "output", page: int = 1, per_page: Optional[int] = None,
+                                  search: str = "", sort: str = "created", order: str = "desc") -> Dict:
+        """Get a page of available MP3 files for video conversion (newest first by default)."""
+        return self.get_audio_index(directory).query(page, per_page, search, sort, order)
 
     def validate_image(self, image_path: str) -> tuple:
         """Validate background image file."""
@@ -122,107 +123,524 @@ class PodcastVideoGenerator:
         if not HAS_PIL:
             return False, "PIL (Pillow) library not available for image processing"
         
+        # Check file size (limit to 50MB)
+        if os.path.getsize(image_path) > 50 * 1024 * 1024:
+            return False, "Image file too large (max 50MB)"
+        
         try:
+            # One pass: format and size come from the header, verify() checks the rest of the file
             with Image.open(image_path) as img:
-                # Check if it's a valid image
+                width, height = img.size
+                format_name = img.format
                 img.verify()
-                
-                # Reopen for getting info (verify() closes the file)
-                with Image.open(image_path) as img:
-                    width, height = img.size
-                    format_name = img.format
-                    
-                    # Check file size (limit to 50MB)
-                    file_size = os.path.getsize(image_path)
-                    if file_size > 50 * 1024 * 1024:
-                        return False, "Image file too large (max 50MB)"
-                    
-                    return True, f"Valid image: {width}x{height}, {format_name} format"
+            return True, f"Valid image: {width}x{height}, {format_name} format"
                     
         except Exception as e:
             return False, f"Invalid image file: {str(e)}"
 
-    def prepare_background_image(self, image_path: str, target_resolution: tuple) -> str:
-        """Prepare background image by resizing and optimizing for video."""
+    def prepare_background_image(self, image_path: str, target_resolution: tuple, fit: str = None) -> str:
+        """
+        Prepare background image by resizing and optimizing for video. Prepared images are cached
+        by source content, resolution and fit mode; the caller must pass the returned path to
+        release_background_image when done with it.
+        """
+        return self.prepare_background_images(image_path, [(target_resolution, fit)])[0]
+
+    def prepare_background_images(self, image_path: str, targets: List[tuple]) -> List[str]:
+        """
+        Prepare one background per (resolution, fit) target, decoding the source image at most once.
+        Every returned path holds a reference that must be released with release_background_image.
+        """
         if not HAS_PIL:
-            return image_path  # Return original if PIL not available
+            return [image_path] * len(targets)  # Return original if PIL not available
         
+        prepared_paths = []
+        missing = []
         try:
-            with Image.open(image_path) as img:
-                # Convert to RGB if necessary
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Resize to target resolution while maintaining aspect ratio
-                img.thumbnail(target_resolution, Image.Resampling.LANCZOS)
-                
-                # Create new image with exact target dimensions and center the resized image
-                background = Image.new('RGB', target_resolution, (0, 0, 0))  # Black background
-                
-                # Calculate position to center the image
-                x = (target_resolution[0] - img.size[0]) // 2
-                y = (target_resolution[1] - img.size[1]) // 2
-                
-                background.paste(img, (x, y))
+            image_dir = Path(self.cache_dir) / "images"
+            source_hash = hash_file(image_path)[:32]
+            for target_resolution, fit in targets:
+                fit = fit or self.video_config["fit"]
+                prepared_path = image_dir / f"{source_hash}_{target_resolution[0]}x{target_resolution[1]}_{fit}.jpg"
+                prepared_paths.append(str(prepared_path))
                 
-                # Save optimized image
-                optimized_path = image_path.replace(Path(image_path).suffix, '_optimized.jpg')
-                background.save(optimized_path, 'JPEG', quality=85, optimize=True)
+                with self.image_lock:
+                    self.image_refs[str(prepared_path)] += 1
                 
-                return optimized_path
+                if prepared_path.exists():
+                    os.utime(prepared_path)  # Mark as recently used
+                elif (prepared_path, target_resolution, fit) not in missing:
+                    missing.append((prepared_path, target_resolution, fit))
+            
+            if not missing:
+                return prepared_paths
+            
+            image_dir.mkdir(parents=True, exist_ok=True)
+            with Image.open(image_path) as img:
+                source = img.convert('RGB') if img.mode != 'RGB' else img  # Decoded once for all targets
+                for prepared_path, target_resolution, fit in missing:
+                    background = self.fit_image(source, target_resolution, fit)
+                    
+                    # Write to a private temporary file and publish it atomically; parallel renders of the
+                    # same background may both get here, and either result is the same picture
+                    fd, temp_path = tempfile.mkstemp(dir=image_dir, suffix='.partial.jpg')
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            background.save(f, 'JPEG', quality=85, optimize=True)
+                        os.replace(temp_path, prepared_path)
+                    finally:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+            
+            self.evict_image_cache()
+            return prepared_paths
                 
         except Exception as e:
             print(f"Error optimizing image: {e}")
-            return image_path  # Return original on error
+            for prepared_path in prepared_paths:
+                self.release_background_image(prepared_path)
+            return [image_path] * len(targets)  # Return original on error
+
+    def fit_image(self, img, target_resolution: tuple, fit: str):
+        """Fit an image into the target resolution, letterboxed ("contain") or cropped ("cover")."""
+        # Convert to RGB if necessary
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        if fit == "cover":
+            return ImageOps.fit(img, target_resolution, Image.Resampling.LANCZOS)
+        
+        # Resize to target resolution while maintaining aspect ratio
+        img = img.copy()
+        img.thumbnail(target_resolution, Image.Resampling.LANCZOS)
+        
+        # Create new image with exact target dimensions and center the resized image
+        background = Image.new('RGB', target_resolution, (0, 0, 0))  # Black background
+        
+        # Calculate position to center the image
+        x = (target_resolution[0] - img.size[0]) // 2
+        y = (target_resolution[1] - img.size[1]) // 2
+        
+        background.paste(img, (x, y))
+        return background
+
+    def release_background_image(self, prepared_path: str):
+        """Drop a render's reference to a prepared background image."""
+        with self.image_lock:
+            if self.image_refs.get(prepared_path, 0) > 0:
+                self.image_refs[prepared_path] -= 1
+                if not self.image_refs[prepared_path]:
+                    del self.image_refs[prepared_path]
+
+    def evict_image_cache(self):
+        """Remove least recently used prepared images until the cache fits its size limit."""
+        def in_use(path):
+            with self.image_lock:
+                return self.image_refs.get(path, 0) > 0
+        
+        self.evict_cache_dir(Path(self.cache_dir) / "images", ".jpg", self.image_cache_config, in_use)
+
+    def evict_loop_cache(self):
+        """Remove least recently used background loops until the cache fits its size limit."""
+        self.evict_cache_dir(Path(self.cache_dir) / "backgrounds", ".mp4", self.loop_cache_config)
+
+    def evict_cache_dir(self, directory: Path, suffix: str, limits: Dict, in_use=None):
+        """
+        Delete the least recently used files (by mtime, which reuse refreshes) of a cache directory while
+        it is over limits["max_bytes"], skipping files newer than limits["min_age_seconds"] or in use.
+        """
+        try:
+            entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in os.scandir(directory) if entry.name.endswith(suffix) and '.partial' not in entry.name]
+        except OSError:
+            return
+        
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - limits["min_age_seconds"]
+        for mtime, size, path in sorted(entries):
+            if total <= limits["max_bytes"]:
+                break
+            if mtime > cutoff or (in_use and in_use(path)):
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
 
     def generate_video(self, audio_path: str, image_path: str, output_path: str, 
-                      title: str = "", progress_callback=None) -> bool:
-        """Generate MP4 video from MP3 audio and background image."""
+                      title: str = "", progress_callback=None, script_path: Optional[str] = None,
+                      encoded_audio_path: Optional[str] = None) -> bool:
+        """
+        Generate MP4 video from MP3 audio and background image. encoded_audio_path is an optional
+        copy of the audio already in the video's codec (e.g. written by the audio stage) to mux as-is.
+        """
         
-        if not HAS_MOVIEPY:
+        if not HAS_PIL:
+            raise Exception("PIL library not available. Install with: pip install Pillow")
+        
+        ffmpeg = find_ffmpeg() if self.video_config["engine"] == "ffmpeg" else None
+        if not ffmpeg and not HAS_MOVIEPY:
             raise Exception("moviepy library not available. Install with: pip install moviepy")
         
+        optimized_image_path = image_path
+        mux_audio_path = audio_path
+        if encoded_audio_path and os.path.exists(encoded_audio_path):
+            mux_audio_path = encoded_audio_path
+        try:
+            subtitle_path = self.prepare_subtitles(audio_path, output_path, script_path)
+            
+            if ffmpeg and self.video_config["loop_cache"]:
+                # Reuse (or build once) the encoded background, then only mux the audio under it
+                loop_path = self.get_background_loop(ffmpeg, image_path, progress_callback)
+                self.render_looped_video(ffmpeg, mux_audio_path, loop_path, output_path, progress_callback,
+                                         subtitle_path)
+            else:
+                if progress_callback:
+                    progress_callback(20, "Preparing background image...")
+                
+                # Prepare and optimize background image
+                optimized_image_path = self.prepare_background_image(image_path, self.video_config["resolution"])
+                
+                if ffmpeg:
+                    self.render_still_video(ffmpeg, mux_audio_path, optimized_image_path, output_path,
+                                            progress_callback, subtitle_path)
+                else:
+                    self.render_moviepy_video(audio_path, optimized_image_path, output_path, progress_callback)
+            
+            if progress_callback:
+                progress_callback(100, "Video generation completed!")
+            
+            return True
+            
+        except Exception as e:
+            print(f"Error generating video: {e}")
+            if progress_callback:
+                progress_callback(0, f"Error: {str(e)}")
+            return False
+            
+        finally:
+            # The prepared image stays cached for later renders
+            if optimized_image_path != image_path:
+                self.release_background_image(optimized_image_path)
+
+    def get_rendition_config(self, name: str) -> Dict:
+        """video_config with the overrides of one rendition of the ladder."""
+        if name not in self.rendition_ladder:
+            raise ValueError(f"Unknown rendition: {name} (available: {', '.join(self.rendition_ladder)})")
+        return {**self.video_config, **self.rendition_ladder[name]}
+
+    def get_rendition_path(self, output_path: str, name: str) -> str:
+        """Output file of one rendition, e.g. episode_720p.mp4 for episode.mp4."""
+        output = Path(output_path)
+        return str(output.with_name(f"{output.stem}_{name}.mp4"))
+
+    def generate_renditions(self, audio_path: str, image_path: str, output_path: str,
+                            renditions: Optional[List[str]] = None, title: str = "",
+                            progress_callback=None, script_path: Optional[str] = None) -> Dict[str, str]:
+        """
+        Render several formats of one episode in a single pass: all backgrounds are prepared from one
+        decode of the image, the audio is encoded once and shared, and one ffmpeg process writes
+        every output. Returns {rendition: output path}, or an empty dict on failure.
+        """
+        names = renditions or list(self.rendition_ladder)
+        configs = [self.get_rendition_config(name) for name in names]
+        outputs = {name: self.get_rendition_path(output_path, name) for name in names}
+        
+        ffmpeg = find_ffmpeg() if self.video_config["engine"] == "ffmpeg" else None
+        if not ffmpeg:
+            # The moviepy fallback has no multi-output mode, render the formats one after another
+            for name, config in zip(names, configs):
+                saved_config = self.video_config
+                self.video_config = config
+                try:
+                    if not self.generate_video(audio_path, image_path, outputs[name], title, progress_callback,
+                                               script_path):
+                        return {}
+                finally:
+                    self.video_config = saved_config
+            return outputs
+        
         if not HAS_PIL:
             raise Exception("PIL library not available. Install with: pip install Pillow")
         
+        prepared_paths = []
+        temp_dir = tempfile.mkdtemp(prefix="renditions_")
         try:
-            # Update progress
             if progress_callback:
-                progress_callback(10, "Loading audio file...")
+                progress_callback(10, f"Preparing {len(names)} backgrounds...")
             
-            # Load audio
-            audio_clip = AudioFileClip(audio_path)
-            duration = audio_clip.duration
+            # One PIL pass for every resolution and aspect ratio
+            prepared_paths = self.prepare_background_images(
+                image_path, [(config["resolution"], config["fit"]) for config in configs]
+            )
             
-            if progress_callback:
-                progress_callback(20, "Preparing background image...")
+            duration = get_audio_duration(audio_path)
+            audio_input = self.prepare_shared_audio(ffmpeg, audio_path, temp_dir, duration, progress_callback)
+            subtitle_path = self.prepare_subtitles(audio_path, output_path, script_path, duration)
             
-            # Prepare and optimize background image
-            optimized_image_path = self.prepare_background_image(image_path, self.video_config["resolution"])
+            cmd = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1']
+            for config, prepared_path in zip(configs, prepared_paths):
+                if self.video_config["loop_cache"]:
+                    loop_path = self.get_background_loop(ffmpeg, image_path, None, config)
+                    cmd += ['-stream_loop', '-1', '-i', loop_path]
+                else:
+                    cmd += ['-loop', '1', '-framerate', str(config["still_fps"]), '-i', prepared_path]
+            cmd += ['-i', audio_input]
+            if subtitle_path:
+                cmd += ['-i', subtitle_path]
             
-            if progress_callback:
-                progress_callback(30, "Creating video clip...")
+            # One output per rendition; every output copies the same encoded audio stream
+            audio_index = len(configs)
+            for index, (name, config) in enumerate(zip(names, configs)):
+                cmd += ['-map', f'{index}:v:0', '-map', f'{audio_index}:a:0']
+                cmd += ['-c:v', 'copy'] if self.video_config["loop_cache"] else self.video_encoder_args(config)
+                cmd += self.audio_encoder_args(audio_input)
+                if subtitle_path:
+                    cmd += self.subtitle_args(audio_index + 1)
+                cmd += ['-t', f"{duration:.3f}"] if duration else ['-shortest']
+                cmd += ['-movflags', '+faststart', outputs[name]]
             
-            # Create image clip with duration matching audio
-            image_clip = ImageClip(optimized_image_path, duration=duration)
+            self.run_ffmpeg(cmd, duration, progress_callback, start=50, end=95,
+                            message=f"Writing {len(names)} renditions...")
             
             if progress_callback:
-                progress_callback(40, "Combining audio and video...")
+                progress_callback(100, "Video generation completed!")
+            return outputs
+            
+        except Exception as e:
+            print(f"Error generating renditions: {e}")
+            if progress_callback:
+                progress_callback(0, f"Error: {str(e)}")
+            return {}
+            
+        finally:
+            for prepared_path in prepared_paths:
+                if prepared_path != image_path:
+                    self.release_background_image(prepared_path)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def prepare_shared_audio(self, ffmpeg: str, audio_path: str, temp_dir: str, duration: Optional[float],
+                             progress_callback=None) -> str:
+        """Audio track in the target codec, transcoded once so every rendition can stream-copy it."""
+        if self.audio_encoder_args(audio_path) == ['-c:a', 'copy']:
+            return audio_path
+        
+        extension = next(ext for ext, codec in MP4_AUDIO_EXTENSIONS.items() if codec == self.video_config["audio_codec"])
+        shared_path = os.path.join(temp_dir, f"audio{extension}")
+        cmd = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-nostats', '-i', audio_path, '-vn']
+        cmd += self.audio_encoder_args(audio_path)
+        cmd += ['-progress', 'pipe:1', shared_path]
+        self.run_ffmpeg(cmd, duration, progress_callback, start=20, end=50, message="Encoding audio...")
+        return shared_path
+
+    def prepare_subtitles(self, audio_path: str, output_path: str, script_path: Optional[str] = None,
+                          duration: Optional[float] = None) -> Optional[str]:
+        """Write SRT/WebVTT captions next to the video and return the SRT to mux, if there is a script."""
+        if not self.video_config["subtitles"]:
+            return None
+        try:
+            paths = write_subtitles(audio_path, output_path, script_path, duration)
+        except Exception as e:
+            print(f"Warning: Could not build subtitles: {e}")
+            return None
+        return paths.get("srt")
+
+    def subtitle_args(self, input_index: int) -> List[str]:
+        """Map a caption input into the MP4 as a soft mov_text track (text only, no re-render)."""
+        return [
+            '-map', f'{input_index}:s:0', '-c:s', 'mov_text',
+            '-metadata:s:s:0', f'language={self.video_config["subtitle_language"]}'
+        ]
+
+    def get_keyframe_interval(self, config: Dict = None) -> int:
+        """Frames per GOP for still-image encodes."""
+        config = config or self.video_config
+        return max(1, int(config["still_fps"] * config["gop_seconds"]))
+
+    def video_encoder_args(self, config: Dict = None) -> List[str]:
+        """x264 arguments for a still picture: low frame rate, fixed long GOPs, video_config quality."""
+        config = config or self.video_config
+        keyint = self.get_keyframe_interval(config)
+        
+        args = [
+            '-c:v', config["video_codec"], '-preset', config["preset"], '-crf', str(config["crf"]),
+            '-tune', 'stillimage', '-pix_fmt', 'yuv420p', '-r', str(config["still_fps"]),
+            '-g', str(keyint), '-keyint_min', str(keyint), '-sc_threshold', '0',
+            '-threads', str(config["threads"])
+        ]
+        if config["video_bitrate"]:
+            args += ['-maxrate', config["video_bitrate"], '-bufsize', config["video_bitrate"]]
+        return args
+
+    def audio_encoder_args(self, audio_path: str) -> List[str]:
+        """Copy the audio when it is already in the target codec, otherwise transcode it exactly once."""
+        config = self.video_config
+        if MP4_AUDIO_EXTENSIONS.get(Path(audio_path).suffix.lower()) == config["audio_codec"]:
+            return ['-c:a', 'copy']
+        return ['-c:a', config["audio_codec"], '-b:a', config["audio_bitrate"]]
+
+    def build_still_video_command(self, ffmpeg: str, audio_path: str, image_path: str, output_path: str,
+                                  duration: Optional[float], subtitle_path: Optional[str] = None) -> List[str]:
+        """Build the ffmpeg command that loops one picture under the audio track."""
+        cmd = [
+            ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-nostats',
+            '-loop', '1', '-framerate', str(self.video_config["still_fps"]), '-i', image_path,
+            '-i', audio_path
+        ]
+        cmd += ['-i', subtitle_path] if subtitle_path else []
+        cmd += ['-map', '0:v:0', '-map', '1:a:0']
+        cmd += self.video_encoder_args() + self.audio_encoder_args(audio_path)
+        cmd += self.subtitle_args(2) if subtitle_path else []
+        
+        # A looped image never ends, so stop at the audio's end
+        cmd += ['-t', f"{duration:.3f}"] if duration else ['-shortest']
+        cmd += ['-movflags', '+faststart', '-progress', 'pipe:1', output_path]
+        return cmd
+
+    def run_ffmpeg(self, cmd: List[str], duration: Optional[float] = None, progress_callback=None,
+                   start: int = 30, end: int = 90, message: str = "Encoding video..."):
+        """Run ffmpeg with -progress output, mapping its position onto the start..end progress range."""
+        if progress_callback:
+            progress_callback(start, message)
+        
+        with tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors, text=True)
             
-            # Combine audio and video using with_audio method
-            video_clip = image_clip.with_audio(audio_clip)
+            # -progress writes key=value blocks; out_time_us is the encoded position
+            for line in process.stdout:
+                key, _, value = line.strip().partition('=')
+                if key == 'out_time_us' and duration and progress_callback and value.isdigit():
+                    done = min(1.0, int(value) / 1e6 / duration)
+                    progress_callback(start + int(done * (end - start)), f"{message} {done * 100:.0f}%")
             
+            process.wait()
+            if process.returncode != 0:
+                errors.seek(0)
+                details = errors.read().decode(errors='replace').strip()
+                raise Exception(f"ffmpeg failed: {details or process.returncode}")
+        
+        if progress_callback:
+            progress_callback(end, "Cleaning up temporary files...")
+
+    def render_still_video(self, ffmpeg: str, audio_path: str, image_path: str, output_path: str,
+                           progress_callback=None, subtitle_path: Optional[str] = None):
+        """Encode a static-background video with one ffmpeg process, reporting its progress."""
+        duration = get_audio_duration(audio_path)
+        cmd = self.build_still_video_command(ffmpeg, audio_path, image_path, output_path, duration, subtitle_path)
+        self.run_ffmpeg(cmd, duration, progress_callback)
+
+    def get_background_loop(self, ffmpeg: str, image_path: str, progress_callback=None, config: Dict = None) -> str:
+        """
+        Path of an encoded, loopable video track for a background image. It is built once per
+        (image content, resolution, codec settings) and reused by every later episode.
+        """
+        config = config or self.video_config
+        keyint = self.get_keyframe_interval(config)
+        
+        # Whole GOPs only, so every repetition of the loop starts on a keyframe
+        gops = max(1, round(config["loop_seconds"] / config["gop_seconds"]))
+        loop_frames = gops * keyint
+        
+        settings = [config[name] for name in ("resolution", "fit", "video_codec", "preset", "crf", "video_bitrate",
+                                              "still_fps", "gop_seconds")]
+        key = hashlib.sha256(json.dumps([hash_file(image_path), settings, loop_frames]).encode()).hexdigest()[:32]
+        
+        loop_dir = Path(self.cache_dir) / "backgrounds"
+        loop_path = loop_dir / f"{key}.mp4"
+        if loop_path.exists():
             if progress_callback:
-                progress_callback(50, "Starting video export (this may take a while)...")
+                progress_callback(30, "Reusing encoded background...")
+            os.utime(loop_path)  # Mark as recently used
+            return str(loop_path)
+        
+        if progress_callback:
+            progress_callback(20, "Preparing background image...")
+        
+        loop_dir.mkdir(parents=True, exist_ok=True)
+        optimized_image_path = self.prepare_background_image(image_path, config["resolution"], config["fit"])
+        if optimized_image_path == image_path:
+            # Preparation failed and handed back the raw image; a loop encoded from it would have the
+            # wrong size and be cached for every later episode with this background
+            print(f"Error: Could not prepare background image {image_path}, not encoding a background loop")
+            raise Exception("Could not prepare the background image")
+        partial_path = loop_dir / f"{key}.{os.getpid()}.partial.mp4"
+        try:
+            cmd = [
+                ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-nostats',
+                '-loop', '1', '-framerate', str(config["still_fps"]), '-i', optimized_image_path,
+                '-frames:v', str(loop_frames)
+            ]
+            cmd += self.video_encoder_args(config)
+            cmd += ['-an', '-movflags', '+faststart', '-progress', 'pipe:1', str(partial_path)]
+            self.run_ffmpeg(cmd, loop_frames / config["still_fps"], progress_callback,
+                            start=20, end=30, message="Encoding background loop...")
             
-            # Export video with simplified settings for better compatibility
+            # Publish atomically so concurrent renders never see a half-written loop
+            os.replace(partial_path, loop_path)
+            self.evict_loop_cache()
+        finally:
+            if partial_path.exists():
+                partial_path.unlink()
+            self.release_background_image(optimized_image_path)
+        
+        return str(loop_path)
+
+    def render_looped_video(self, ffmpeg: str, audio_path: str, loop_path: str, output_path: str,
+                            progress_callback=None, subtitle_path: Optional[str] = None):
+        """Stream-copy the cached background loop out to the audio's length and mux the audio."""
+        duration = get_audio_duration(audio_path)
+        cmd = [
+            ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-nostats',
+            '-stream_loop', '-1', '-i', loop_path,
+            '-i', audio_path
+        ]
+        cmd += ['-i', subtitle_path] if subtitle_path else []
+        cmd += ['-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy']
+        cmd += self.audio_encoder_args(audio_path)
+        cmd += self.subtitle_args(2) if subtitle_path else []
+        cmd += ['-t', f"{duration:.3f}"] if duration else ['-shortest']
+        cmd += ['-movflags', '+faststart', '-progress', 'pipe:1', output_path]
+        self.run_ffmpeg(cmd, duration, progress_callback, message="Muxing audio with background...")
+
+    def render_moviepy_video(self, audio_path: str, image_path: str, output_path: str, progress_callback=None):
+        """Render the video frame by frame with moviepy (fallback when ffmpeg is not usable directly)."""
+        if progress_callback:
+            progress_callback(25, "Loading audio file...")
+        
+        # Load audio
+        audio_clip = AudioFileClip(audio_path)
+        duration = audio_clip.duration
+        
+        if progress_callback:
+            progress_callback(30, "Creating video clip...")
+        
+        # Create image clip with duration matching audio
+        image_clip = ImageClip(image_path, duration=duration)
+        
+        if progress_callback:
+            progress_callback(40, "Combining audio and video...")
+        
+        # Combine audio and video using with_audio method
+        video_clip = image_clip.with_audio(audio_clip)
+        
+        if progress_callback:
+            progress_callback(50, "Starting video export (this may take a while)...")
+        
+        try:
+            ffmpeg_params = ['-crf', str(self.video_config["crf"]), '-tune', 'stillimage']
             video_clip.write_videofile(
                 output_path,
                 fps=self.video_config["fps"],
-                codec='libx264',
-                audio_codec='aac'
+                codec=self.video_config["video_codec"],
+                audio_codec=self.video_config["audio_codec"],
+                audio_bitrate=self.video_config["audio_bitrate"],
+                bitrate=self.video_config["video_bitrate"],
+                preset=self.video_config["preset"],
+                threads=self.video_config["threads"] or None,
+                ffmpeg_params=ffmpeg_params
             )
-            
+        finally:
             if progress_callback:
                 progress_callback(90, "Cleaning up temporary files...")
             
@@ -230,27 +648,9 @@ class PodcastVideoGenerator:
             audio_clip.close()
             image_clip.close()
             video_clip.close()
-            
-            # Remove optimized image if it was created
-            if optimized_image_path != image_path and os.path.exists(optimized_image_path):
-                try:
-                    os.remove(optimized_image_path)
-                except:
-                    pass
-            
-            if progress_callback:
-                progress_callback(100, "Video generation completed!")
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error generating video: {e}")
-            if progress_callback:
-                progress_callback(0, f"Error: {str(e)}")
-            return False
 
     def get_video_info(self, video_path: str) -> Dict:
-        """Get information about generated video file."""
+        """Get information about generated video file, read from its MP4 headers."""
         if not os.path.exists(video_path):
             return {}
         
@@ -267,15 +667,17 @@ class PodcastVideoGenerator:
                 "duration_str": "Unknown"
             }
             
-            # Try to get video duration
-            if HAS_MOVIEPY:
-                try:
-                    with AudioFileClip(video_path) as audio:
-                        duration = audio.duration
-                        info["duration"] = duration
-                        info["duration_str"] = f"{int(duration // 60)}:{int(duration % 60):02d}"
-                except:
-                    pass
+            media = get_media_info(video_path)
+            if media:
+                duration = media["duration"]
+                if duration:
+                    info["duration"] = duration
+                    info["duration_str"] = f"{int(duration // 60)}:{int(duration % 60):02d}"
+                info["bitrate"] = media["bitrate"]
+                video = next((stream for stream in media["streams"] if stream["type"] == "video"), None)
+                if video and "width" in video:
+                    info["resolution"] = f"{video['width']}x{video['height']}"
+                info["subtitles"] = any(stream["type"] == "subtitle" for stream in media["streams"])
             
             return info
             
@@ -283,18 +685,203 @@ class PodcastVideoGenerator:
             print(f"Error getting video info: {e}")
             return {}
 
+# Generator of a batch worker process, created once and reused for every file it renders
+_batch_generator = None
+
+def render_batch_item(item: Dict, threads: int) -> Dict:
+    """Render one file of a batch inside a worker process."""
+    global _batch_generator
+    if _batch_generator is None:
+        _batch_generator = PodcastVideoGenerator()
+    _batch_generator.video_config["threads"] = threads
+    
+    start = time.perf_counter()
+    try:
+        if item["renditions"]:
+            success = bool(_batch_generator.generate_renditions(item["audio"], item["image"], item["output"],
+                                                                item["renditions"], item["title"]))
+        else:
+            success = _batch_generator.generate_video(item["audio"], item["image"], item["output"], item["title"])
+    except Exception as e:
+        print(f"Error rendering {item['audio']}: {e}")
+        success = False
+    return {"success": success, "elapsed": time.perf_counter() - start}
+
+def collect_batch_items(source: str, default_image: Optional[str], output_dir: Optional[str],
+                        overrides: Dict, renditions: Optional[List[str]]) -> List[Dict]:
+    """
+    Expand a directory or glob of MP3s into render items. Overrides map a file name, stem or glob
+    pattern to a background image path or to a dict with "image", "title" and/or "renditions".
+    """
+    if os.path.isdir(source):
+        audio_files = sorted(str(path) for path in Path(source).rglob('*.mp3') if not any(
+            part.startswith('.') for part in path.relative_to(source).parts))
+    else:
+        audio_files = sorted(glob.glob(source, recursive=True))
+    
+    items = []
+    for audio_path in audio_files:
+        audio = Path(audio_path)
+        item = {"audio": audio_path, "image": default_image, "title": "", "renditions": renditions}
+        for pattern, override in overrides.items():
+            if pattern in (audio.name, audio.stem) or fnmatch.fnmatch(audio_path, pattern) or fnmatch.fnmatch(audio.name, pattern):
+                item.update({"image": override} if isinstance(override, str) else override)
+                break
+        
+        target_dir = Path(output_dir) if output_dir else audio.parent
+        item["output"] = str(target_dir / f"{audio.stem}_video.mp4")
+        items.append(item)
+    return items
+
+def get_batch_render_key(generator: "PodcastVideoGenerator", item: Dict) -> str:
+    """Fingerprint of everything a batch output depends on: audio, background, captions and settings."""
+    audio_stat = os.stat(item["audio"])
+    manifest_path = Path(item["audio"]).with_suffix('.json')
+    manifest_mtime = os.stat(manifest_path).st_mtime_ns if manifest_path.exists() else None
+    settings = {key: value for key, value in generator.video_config.items() if key != "threads"}
+    return hashlib.sha256(json.dumps([
+        os.path.abspath(item["audio"]), audio_stat.st_size, audio_stat.st_mtime_ns, manifest_mtime,
+        hash_file(item["image"]), item["title"], item["renditions"], settings
+    ], default=str).encode()).hexdigest()
+
+def get_batch_outputs(generator: "PodcastVideoGenerator", item: Dict) -> List[str]:
+    """Files a batch item produces."""
+    if item["renditions"]:
+        return [generator.get_rendition_path(item["output"], name) for name in item["renditions"]]
+    return [item["output"]]
+
+def run_batch(items: List[Dict], jobs: Optional[int] = None, force: bool = False,
+              state_path: str = "cache/batch_state.json") -> Dict:
+    """
+    Render a batch on a process pool, skipping items whose outputs are up to date, and return
+    a throughput report. Render keys of finished outputs are kept in state_path between runs.
+    """
+    from render_queue import available_cores
+    
+    generator = PodcastVideoGenerator()
+    cores = available_cores()
+    jobs = max(1, min(jobs or cores, len(items) or 1))
+    threads = max(1, cores // jobs)  # Workers x encoder threads stay within the cores
+    
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    
+    pending = []
+    report = {"total": len(items), "rendered": 0, "skipped": 0, "failed": 0, "audio_seconds": 0.0,
+              "render_seconds": 0.0, "wall_seconds": 0.0, "jobs": jobs, "threads_per_job": threads}
+    for item in items:
+        if not item["image"] or not os.path.exists(item["image"]):
+            print(f"❌ {item['audio']}: background image not found ({item['image']})")
+            report["failed"] += 1
+            continue
+        
+        item["key"] = get_batch_render_key(generator, item)
+        outputs = get_batch_outputs(generator, item)
+        if not force and state.get(item["output"]) == item["key"] and all(os.path.exists(path) for path in outputs):
+            report["skipped"] += 1
+            continue
+        os.makedirs(os.path.dirname(item["output"]) or '.', exist_ok=True)
+        pending.append(item)
+    
+    print(f"Rendering {len(pending)} of {len(items)} files with {jobs} workers x {threads} encoder threads "
+          f"({report['skipped']} up to date)")
+    
+    start = time.perf_counter()
+    rendered_outputs = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(render_batch_item, item, threads): item for item in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "elapsed": 0.0}
+                print(f"Error rendering {item['audio']}: {e}")
+            
+            if result["success"]:
+                report["rendered"] += 1
+                report["render_seconds"] += result["elapsed"]
+                report["audio_seconds"] += get_audio_duration(item["audio"]) or 0
+                state[item["output"]] = item["key"]
+                rendered_outputs += get_batch_outputs(generator, item)
+                print(f"[{done}/{len(pending)}] ✓ {item['output']} ({result['elapsed']:.1f}s)")
+            else:
+                report["failed"] += 1
+                print(f"[{done}/{len(pending)}] ❌ {item['audio']}")
+    report["wall_seconds"] = time.perf_counter() - start
+    register_cli_outputs(rendered_outputs)
+    
+    # Persist progress so an interrupted or repeated batch only renders what is left
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(state_path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1)
+    os.replace(temp_path, state_path)
+    
+    wall = report["wall_seconds"]
+    report["files_per_minute"] = round(report["rendered"] * 60 / wall, 2) if wall else None
+    report["realtime_factor"] = round(report["audio_seconds"] / wall, 1) if wall else None
+    return report
+
+def run_batch_cli(args):
+    """Batch mode of the command line interface."""
+    overrides = {}
+    if args.overrides:
+        with open(args.overrides, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+    
+    renditions = None
+    if args.renditions:
+        renditions = list(PodcastVideoGenerator().rendition_ladder) if args.renditions == "all" else args.renditions.split(',')
+    
+    items = collect_batch_items(args.batch, args.image, args.output_dir, overrides, renditions)
+    if not items:
+        print(f"No MP3 files found for '{args.batch}'")
+        return
+    
+    print("="*60)
+    print("BIBLE PODCAST VIDEO GENERATOR - BATCH")
+    print("="*60)
+    report = run_batch(items, args.jobs, args.force)
+    
+    print("="*60)
+    print(f"Rendered: {report['rendered']}  Up to date: {report['skipped']}  Failed: {report['failed']}")
+    print(f"Wall time: {report['wall_seconds']:.1f}s  Render time: {report['render_seconds']:.1f}s "
+          f"({report['jobs']} workers x {report['threads_per_job']} threads)")
+    if report["rendered"]:
+        print(f"Throughput: {report['files_per_minute']} files/min, "
+              f"{report['audio_seconds'] / 3600:.2f} hours of audio at {report['realtime_factor']}x realtime")
+
 def main():
     """Command line interface for video generation."""
     import argparse
     
     parser = argparse.ArgumentParser(description="Generate MP4 video from podcast audio")
-    parser.add_argument("--audio", required=True, help="Path to MP3 audio file")
-    parser.add_argument("--image", required=True, help="Path to background image")
+    parser.add_argument("--audio", help="Path to MP3 audio file")
+    parser.add_argument("--image", help="Path to background image (the default background in batch mode)")
     parser.add_argument("--output", help="Output MP4 file path")
     parser.add_argument("--title", help="Video title")
+    parser.add_argument("--renditions", help="Comma-separated formats to render in one pass (1080p,720p,vertical or 'all')")
+    parser.add_argument("--batch", help="Directory or glob of MP3 files to render in parallel")
+    parser.add_argument("--overrides", help="JSON file mapping file names, stems or globs to a background image "
+                                            "or to {\"image\", \"title\", \"renditions\"}")
+    parser.add_argument("--output-dir", help="Batch output directory (default: next to each MP3)")
+    parser.add_argument("--jobs", type=int, help="Parallel renders in batch mode (default: CPU cores)")
+    parser.add_argument("--force", action="store_true", help="Re-render batch outputs that are up to date")
+    parser.add_argument("--profile", choices=PROFILE_MODES, help="Profile the render (cpu, memory or all)")
     
     args = parser.parse_args()
     
+    if args.batch:
+        run_batch_cli(args)
+        return
+    
+    if not args.audio or not args.image:
+        parser.error("--audio and --image are required (or use --batch)")
+    
     if not os.path.exists(args.audio):
         print(f"Error: Audio file '{args.audio}' not found")
         return
@@ -330,25 +917,43 @@ def main():
     def progress_callback(progress, message):
         print(f"[{progress:3d}%] {message}")
     
-    # Generate video
-    success = generator.generate_video(
-        args.audio, 
-        args.image, 
-        args.output,
-        args.title or "",
-        progress_callback
-    )
+    # Optional profiling of the render (reports are written next to the output)
+    outputs = {}
+    with profile_job(os.path.dirname(args.output) or ".", f"profile_{Path(args.output).stem}", args.profile) as profile_reports:
+        if args.renditions:
+            names = list(generator.rendition_ladder) if args.renditions == "all" else args.renditions.split(',')
+            outputs = generator.generate_renditions(args.audio, args.image, args.output, names,
+                                                    args.title or "", progress_callback)
+            if outputs:
+                print(f"\n🎉 {len(outputs)} renditions generated:")
+                for name, path in outputs.items():
+                    print(f"  {name}: {path}")
+            else:
+                print("\n❌ Video generation failed")
+        else:
+            # Generate video
+            success = generator.generate_video(
+                args.audio, 
+                args.image, 
+                args.output,
+                args.title or "",
+                progress_callback
+            )
+        
+            if success:
+                outputs = {"video": args.output}
+                print(f"\n🎉 Video generated successfully: {args.output}")
+            
+                # Show video info
+                info = generator.get_video_info(args.output)
+                if info:
+                    print(f"Duration: {info['duration_str']}")
+                    print(f"File size: {info['size_mb']} MB")
+            else:
+                print("\n❌ Video generation failed")
     
-    if success:
-        print(f"\n🎉 Video generated successfully: {args.output}")
-        
-        # Show video info
-        info = generator.get_video_info(args.output)
-        if info:
-            print(f"Duration: {info['duration_str']}")
-            print(f"File size: {info['size_mb']} MB")
-    else:
-        print("\n❌ Video generation failed")
+    # Files under output/ join the retention index like the web app's outputs
+    register_cli_outputs([*outputs.values(), *profile_reports.values()])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""
+Production server settings for Bible Podcast Generator
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master process and its read-only data (Bible corpora, audio
+index) is loaded there before the workers are forked, so workers share it copy-on-write and
+start warm. Job state lives in SQLite (cache/jobs.db) and is shared by all workers.
+"""
+
+import gc
+import os
+
+from render_queue import available_cores
+
+bind = os.environ.get("BIND", "0.0.0.0:5001")
+
+# Web workers handle requests; video encodes run in each worker's render pool, so the cores are
+# split between the render pools instead of every worker starting one encode per core
+workers = int(os.environ.get("WEB_CONCURRENCY", min(4, available_cores())))
+os.environ.setdefault("RENDER_WORKERS", str(max(1, available_cores() // workers)))
+
+# Admission control (JOB_LIMITS in main.py) and the render queue live in each worker process, so
+# main.py divides the limits by the worker count; queue positions are per worker
+os.environ["WEB_WORKERS"] = str(workers)
+
+# Threaded workers: progress streams and long polls each hold a thread while they wait (streams
+# are capped at half the threads per worker, see MAX_SSE_STREAMS in main.py)
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 8))
+timeout = 120
+graceful_timeout = 30
+
+preload_app = True
+
+accesslog = "-"
+errorlog = "-"
+
+def when_ready(server):
+    """Master, before forking: load the shared data once."""
+    import main
+    main.preload_shared_data()
+    # Move the preloaded objects out of the collector's reach; its passes write to every tracked
+    # object and would otherwise copy the shared pages into each worker
+    gc.freeze()
+
+def post_fork(server, worker):
+    """Each worker, after forking: create its own clients."""
+    import main
+    main.init_worker()
+    server.log.info(f"Worker {worker.pid} ready")
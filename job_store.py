@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Job Store for Bible Podcast
+Persists job state in SQLite (WAL mode) so it survives restarts and is shared by every worker process
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Statuses after which a job never changes again
+FINISHED_STATUSES = ("completed", "error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    passage TEXT,
+    inputs TEXT,
+    result TEXT,
+    error TEXT,
+    fingerprint TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS jobs_passage ON jobs (passage, created_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at) WHERE finished_at IS NOT NULL;
+"""
+
+# Created after the column migration, so older databases get the column first
+INFLIGHT_INDEX = "CREATE INDEX IF NOT EXISTS jobs_inflight ON jobs (fingerprint, updated_at) WHERE finished_at IS NULL"
+
+def request_fingerprint(job_type: str, inputs: Dict) -> str:
+    """Key of a job request: the same type with the same inputs (whitespace-normalized) gives the same key."""
+    def normalize(value):
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        return value
+
+    payload = json.dumps({"type": job_type, "inputs": normalize(inputs)}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class JobStore:
+    """
+    Dict-like job state (job_store[job_id] = {"status", "progress", "message", ...}) backed by SQLite.
+    Progress updates are buffered and written in batches every flush_interval seconds; creating,
+    finishing or failing a job is written immediately. Finished jobs are pruned after ttl_seconds.
+    Unfinished jobs not updated for stale_seconds (e.g. lost in a crash) no longer absorb duplicates.
+    """
+
+    def __init__(self, db_path: str = "cache/jobs.db", ttl_seconds: float = 7 * 24 * 3600,
+                 flush_interval: float = 0.5, prune_interval: float = 600, stale_seconds: float = 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+
+        self.local = threading.local()
+        self.pending = {}  # job_id -> latest unsaved state, newest wins
+        self.pending_lock = threading.Lock()
+        self.flusher = None
+        self.flusher_pid = None
+        self.last_prune = 0.0
+        # Signalled on every state change in this process, so waiting progress streams wake at once
+        self.changed = threading.Condition()
+        self.change_count = 0
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "fingerprint" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN fingerprint TEXT")
+            conn.execute(INFLIGHT_INDEX)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for the current thread (and process; connections must not cross a fork)."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL; a crash can only lose the last commits
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def _ensure_flusher(self):
+        """Start the background flush thread in this process if it is not running."""
+        if self.flusher_pid == os.getpid() and self.flusher.is_alive():
+            return
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher_pid = os.getpid()
+        self.flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if time.time() - self.last_prune > self.prune_interval:
+                    self.prune()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not write job state: {e}")
+
+    def create(self, job_id: str, job_type: str, inputs: Optional[Dict] = None, passage: Optional[str] = None,
+               status: str = "queued", message: str = "Queued...") -> Dict:
+        """Register a new job with its inputs."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, type, status, progress, message, passage, inputs, result, "
+                "version, created_at, updated_at) VALUES (?, ?, ?, 0, ?, ?, ?, '{}', 1, ?, ?)",
+                (job_id, job_type, status, message, passage, json.dumps(inputs or {}), now, now)
+            )
+        return {"status": status, "progress": 0, "message": message}
+
+    def claim(self, job_id: str, job_type: str, fingerprint: str, inputs: Optional[Dict] = None,
+              passage: Optional[str] = None, status: str = "queued", message: str = "Queued...") -> Tuple[str, bool]:
+        """
+        Single-flight job creation: if an unfinished job with the same fingerprint exists, return its id
+        instead of creating a new one. The check and the insert are one write transaction, so two
+        concurrent identical requests (in any thread or worker process) can never both create a job.
+        Returns (job_id, created).
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE fingerprint = ? AND finished_at IS NULL AND updated_at > ? "
+                "ORDER BY created_at DESC LIMIT 1", (fingerprint, now - self.stale_seconds)
+            ).fetchone()
+            if row:
+                conn.execute("COMMIT")
+                return row["id"], False
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, type, status, progress, message, passage, inputs, result, "
+                "fingerprint, version, created_at, updated_at) VALUES (?, ?, ?, 0, ?, ?, ?, '{}', ?, 1, ?, ?)",
+                (job_id, job_type, status, message, passage, json.dumps(inputs or {}), fingerprint, now, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id, True
+
+    def __setitem__(self, job_id: str, state: Dict):
+        """Record a job's new state; only the latest state per flush interval reaches the database."""
+        with self.pending_lock:
+            self.pending[job_id] = (dict(state), time.time())
+        if state.get("status") in FINISHED_STATUSES:
+            self.flush()  # Final states are never delayed
+        else:
+            self._ensure_flusher()
+        with self.changed:
+            self.change_count += 1
+            self.changed.notify_all()
+
+    def wait_for_change(self, seen: int, timeout: float) -> int:
+        """
+        Block until a job changes in this process after change number `seen` (read change_count
+        before reading the state), or for at most timeout seconds. Returns the current change number.
+        Changes made by other worker processes do not wake the wait; callers re-check on the timeout.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.change_count != seen, timeout)
+            return self.change_count
+
+    def flush(self):
+        """Write all buffered states in one transaction."""
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        rows = []
+        for job_id, (state, updated_at) in pending.items():
+            extra = {key: value for key, value in state.items() if key not in ("status", "progress", "message")}
+            status = state.get("status", "processing")
+            rows.append((
+                job_id, status, int(state.get("progress") or 0), state.get("message"), json.dumps(extra, default=str),
+                state.get("message") if status == "error" else None,
+                updated_at, updated_at, updated_at if status in FINISHED_STATUSES else None
+            ))
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO jobs (id, status, progress, message, result, error, version, created_at, updated_at, "
+                "finished_at) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET status = excluded.status, progress = excluded.progress, "
+                "message = excluded.message, result = excluded.result, error = excluded.error, "
+                "version = jobs.version + 1, updated_at = excluded.updated_at, finished_at = excluded.finished_at "
+                "WHERE excluded.updated_at >= jobs.updated_at",  # A late batch never overwrites a newer state
+                rows
+            )
+            conn.execute("COMMIT")
+
+    def _row_to_state(self, row: sqlite3.Row) -> Dict:
+        state = {"status": row["status"], "progress": row["progress"], "message": row["message"]}
+        state.update(json.loads(row["result"] or "{}"))
+        return state
+
+    def get(self, job_id: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        """Current state of a job: unsaved updates from this process first, then the database."""
+        with self.pending_lock:
+            if job_id in self.pending:
+                return dict(self.pending[job_id][0])
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_state(row) if row else default
+
+    def get_with_cursor(self, job_id: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Current state of a job and its change cursor (the update time, which only ever grows for a job).
+        Two reads with the same cursor saw the same state.
+        """
+        with self.pending_lock:
+            if job_id in self.pending:
+                state, updated_at = self.pending[job_id]
+                return dict(state), f"{updated_at:.6f}"
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None, None
+        return self._row_to_state(row), f"{row['updated_at']:.6f}"
+
+    def __getitem__(self, job_id: str) -> Dict:
+        state = self.get(job_id)
+        if state is None:
+            raise KeyError(job_id)
+        return state
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict:
+        """Full job record for listings."""
+        return {
+            "job_id": row["id"],
+            "type": row["type"],
+            "passage": row["passage"],
+            "inputs": json.loads(row["inputs"] or "{}"),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "finished_at": row["finished_at"],
+            "version": row["version"],
+            "error": row["error"],
+            **self._row_to_state(row)
+        }
+
+    def recent(self, limit: int = 50, job_type: Optional[str] = None) -> List[Dict]:
+        """Most recently created jobs, newest first."""
+        self.flush()
+        query, params = "SELECT * FROM jobs", []
+        if job_type:
+            query, params = query + " WHERE type = ?", [job_type]
+        rows = self._connect().execute(query + " ORDER BY created_at DESC LIMIT ?", params + [limit]).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def by_passage(self, passage: str, limit: int = 50) -> List[Dict]:
+        """Jobs for a passage, newest first."""
+        self.flush()
+        rows = self._connect().execute(
+            "SELECT * FROM jobs WHERE passage = ? ORDER BY created_at DESC LIMIT ?", (passage, limit)
+        ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def prune(self) -> int:
+        """Delete finished jobs older than the TTL. Returns the number of jobs removed."""
+        self.last_prune = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                                  (time.time() - self.ttl_seconds,))
+        return cursor.rowcount
@@ -10,12 +10,21 @@ import tempfile
 import threading
 import time
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, send_file, session
+from flask import Flask, Request, render_template, request, jsonify, send_file, session, Response
 from werkzeug.utils import secure_filename
 import uuid
 
 # Import your existing classes
-from bible import PodcastScriptGenerator
+from bible import PodcastScriptGenerator, preload_bible_versions
+from canon import load_canon, check_passage, list_books, get_book, passage_stats, preload_canons
+from media_info import load_audio_manifest, get_manifest_path
+from render_queue import RenderScheduler
+from admission import JobLimiter, QueueFullError
+from job_store import JobStore, request_fingerprint
+from pipeline import PodcastPipeline
+from retention import ArtifactRetention
+from upload_store import UploadStore, IncomingUpload
+from profiling import profile_job, normalize_profile_mode
 try:
     from generate_audio import PodcastAudioGenerator
     HAS_AUDIO_GENERATION = True
@@ -28,15 +37,63 @@ try:
 except ImportError:
     HAS_VIDEO_GENERATION = False
 
+# Uploaded images, stored once per distinct content
+upload_store = UploadStore('uploads', max_bytes=50 * 1024 * 1024)
+
+class UploadRequest(Request):
+    """Streams uploaded files straight into the upload store, hashing and size-checking as they arrive."""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_store.open_incoming()
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = 'bible-podcast-generator-secret-key-change-this'  # Change this to a random secret key
 
 # Configure upload settings
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['UPLOAD_FOLDER'] = upload_store.root
+
+# Behind Apache/lighttpd (mod_xsendfile) or a compatible proxy, let the front server send downloads
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+# Only files under these directories can be downloaded
+DOWNLOAD_ROOTS = ('output', 'uploads')
+
+# Job state shared by every worker process, persisted in SQLite
+job_progress = JobStore()
+
+# Index of generated files and uploads; the sweeper deletes them by TTL, quota and last access
+artifact_retention = ArtifactRetention(roots=("output", "uploads"))
+
+# Progress pushes: open streams and long polls wake as soon as a job changes in this worker and
+# re-check the job store every PROGRESS_RECHECK_INTERVAL seconds for changes made by other workers.
+# Each stream holds a request thread, so at most MAX_SSE_STREAMS (half the threads) are open per
+# worker; beyond that clients get 503 and fall back to long polling.
+PROGRESS_RECHECK_INTERVAL = 2.0
+MAX_SSE_STREAMS = max(1, int(os.environ.get("WEB_THREADS", 8)) // 2)
+FINAL_STATUSES = ("completed", "error", "not_found")
+sse_streams = {"open": 0}
+sse_lock = threading.Lock()
 
-# Global dictionary to track job progress
-job_progress = {}
+# Admission control: jobs of each type run at most `concurrency` at a time and at most `max_queue` wait;
+# beyond that submissions get 429 with Retry-After. estimate_seconds seeds the wait estimates.
+# Video concurrency is the render pool size (one encode per core).
+JOB_LIMITS = {
+    "script": {"concurrency": 4, "max_queue": 20, "estimate_seconds": 5},
+    "audio": {"concurrency": 2, "max_queue": 10, "estimate_seconds": 180},  # Bounded by TTS quota
+    "episode": {"concurrency": 1, "max_queue": 5, "estimate_seconds": 300},
+    "video": {"max_queue": 20}
+}
+
+# Every gunicorn worker process has its own limiter and render queue, so the limits above are
+# server-wide totals split between the workers (gunicorn.conf.py sets WEB_WORKERS), at least 1 each.
+# Queue positions and waits are those of the worker that took the job.
+WEB_WORKERS = max(1, int(os.environ.get('WEB_WORKERS', 1)))
+for limits in JOB_LIMITS.values():
+    for key in ("concurrency", "max_queue"):
+        if key in limits:
+            limits[key] = max(1, limits[key] // WEB_WORKERS)
 
 # Default Google Cloud credentials path
 DEFAULT_CREDENTIALS_PATH = 'majestic-bounty-455918-f1-fb3e5e5fef3d.json'
@@ -47,41 +104,80 @@ ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
 def allowed_image_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
+def file_identity(path):
+    """A file input as seen by request fingerprints: the same file, unless it was rewritten since."""
+    try:
+        stat = os.stat(path)
+        return [os.path.realpath(path), stat.st_size, stat.st_mtime_ns]
+    except (OSError, TypeError):
+        return path
+
+def run_profiled(job_id, target, profile, output_dir, *args):
+    """Run a job function; with profile set, profile it and add the report paths to the job's final state."""
+    try:
+        with profile_job(output_dir, f"profile_{job_id[:8]}", profile) as reports:
+            target(job_id, *args)
+    except Exception as e:
+        # Never leave the job queued: that would block identical submissions until it goes stale
+        print(f"❌ Job {job_id} failed: {e}")
+        if (job_progress.get(job_id) or {}).get("status") not in FINAL_STATUSES:
+            job_progress[job_id] = {"status": "error", "progress": 0, "message": f"Error: {str(e)}"}
+        return
+    if reports:
+        artifact_retention.register_outputs(reports.values(), job_id)
+        job_progress[job_id] = {**(job_progress.get(job_id) or {}), "profile_reports": reports}
+
+def claim_job(job_type, inputs, request_inputs, passage=None):
+    """
+    Create a job unless an identical one is already running. Returns (job_id, created); a duplicate
+    gets the running job's id, so it follows the same progress and shares its result.
+    """
+    fingerprint = request_fingerprint(job_type, request_inputs)
+    return job_progress.claim(str(uuid.uuid4()), job_type, fingerprint, inputs, passage)
+
 class WebPodcastGenerator:
     def __init__(self):
         self.generator = PodcastScriptGenerator()
-        self.audio_generator = PodcastAudioGenerator() if HAS_AUDIO_GENERATION else None
         self.video_generator = PodcastVideoGenerator() if HAS_VIDEO_GENERATION else None
+        # Video renders run on a bounded process pool, one encode per core
+        # (RENDER_WORKERS splits the cores between web worker processes in production)
+        self.render_scheduler = RenderScheduler(self.video_progress, self.video_completed, self.video_failed,
+                                                workers=int(os.environ.get('RENDER_WORKERS', 0)) or None,
+                                                max_queue=JOB_LIMITS["video"]["max_queue"])
+        # Script, audio and episode jobs run on bounded per-type worker threads
+        self.job_limiter = JobLimiter({job_type: limits for job_type, limits in JOB_LIMITS.items() if job_type != "video"})
         
     def get_available_versions(self):
         """Get list of available Bible versions."""
         return self.generator.get_available_versions()
     
     def validate_passage(self, version, passage):
-        """Validate Bible passage."""
-        if not self.generator.load_bible_version(version):
+        """Validate Bible passage against the version's canon table (verse text is not loaded)."""
+        canon = load_canon(version) if version else None
+        if canon is None:
             return False, f"Could not load Bible version: {version}"
         
-        if not self.generator.validate_passage(passage):
-            return False, f"Invalid passage: {passage}"
-        
-        return True, "Valid passage"
+        return check_passage(canon, passage or "")
     
     def generate_script(self, job_id, version, passage, commentary_text=None, output_dir="output"):
         """Generate podcast script with progress tracking."""
         try:
+            # A generator per job: load_bible_version sets its version, and concurrent jobs may ask for
+            # different ones. The corpus itself is shared through the per-process cache.
+            generator = PodcastScriptGenerator()
+            
             # Update progress
             job_progress[job_id] = {"status": "processing", "progress": 0, "message": "Loading Bible version..."}
             
             # Load Bible version
-            if not self.generator.load_bible_version(version):
+            if not generator.load_bible_version(version):
                 job_progress[job_id] = {"status": "error", "progress": 0, "message": f"Failed to load Bible version: {version}"}
                 return
             
             job_progress[job_id] = {"status": "processing", "progress": 20, "message": "Validating passage..."}
             
             # Validate passage
-            if not self.generator.validate_passage(passage):
+            if not generator.validate_passage(passage):
                 job_progress[job_id] = {"status": "error", "progress": 0, "message": f"Invalid passage: {passage}"}
                 return
             
@@ -104,31 +200,32 @@ class WebPodcastGenerator:
                 job_progress[job_id] = {"status": "processing", "progress": 60, "message": "Generating commentary-based script..."}
                 
                 try:
-                    output_file = self.generator.generate_commentary_based_script(commentary_text, script_filename)
+                    output_file = generator.generate_commentary_based_script(commentary_text, script_filename)
                     
                     # If commentary parsing failed, fall back to direct Bible reading
                     if not output_file:
                         print("📝 Commentary parsing failed, falling back to direct Bible reading...")
                         job_progress[job_id] = {"status": "processing", "progress": 70, "message": "Commentary parsing failed, switching to direct Bible reading..."}
                         script_filename = os.path.join(output_dir, f"{safe_passage}_{version}_{timestamp}_script.txt")
-                        output_file = self.generator.generate_podcast_script_from_passage(passage, script_filename)
+                        output_file = generator.generate_podcast_script_from_passage(passage, script_filename)
                         
                 except Exception as e:
                     print(f"❌ Commentary generation failed: {e}")
                     print("📝 Falling back to direct Bible reading...")
                     job_progress[job_id] = {"status": "processing", "progress": 70, "message": "Commentary processing failed, switching to direct Bible reading..."}
                     script_filename = os.path.join(output_dir, f"{safe_passage}_{version}_{timestamp}_script.txt")
-                    output_file = self.generator.generate_podcast_script_from_passage(passage, script_filename)
+                    output_file = generator.generate_podcast_script_from_passage(passage, script_filename)
             else:
                 # Direct Bible reading
                 script_filename = os.path.join(output_dir, f"{safe_passage}_{version}_{timestamp}_script.txt")
                 job_progress[job_id] = {"status": "processing", "progress": 60, "message": "Generating direct Bible reading script..."}
-                output_file = self.generator.generate_podcast_script_from_passage(passage, script_filename)
+                output_file = generator.generate_podcast_script_from_passage(passage, script_filename)
             
             job_progress[job_id] = {"status": "processing", "progress": 95, "message": "Finalizing script..."}
             
             if output_file and os.path.exists(output_file):
                 print(f"✓ Script generation completed: {output_file}")  # Debug log
+                artifact_retention.register_outputs([output_file], job_id)
                 job_progress[job_id] = {
                     "status": "completed", 
                     "progress": 100, 
@@ -161,8 +258,11 @@ class WebPodcastGenerator:
             
             job_progress[job_id] = {"status": "processing", "progress": 20, "message": "Setting up TTS client..."}
             
+            # A generator per job: it keeps per-run state (working directory, TTS client)
+            audio_generator = PodcastAudioGenerator()
+            
             # Initialize TTS client
-            if not self.audio_generator.initialize_tts_client():
+            if not audio_generator.initialize_tts_client():
                 job_progress[job_id] = {"status": "error", "progress": 0, "message": "Failed to initialize TTS client"}
                 return
             
@@ -175,15 +275,19 @@ class WebPodcastGenerator:
             job_progress[job_id] = {"status": "processing", "progress": 40, "message": "Generating audio (this may take several minutes)..."}
             
             # Generate audio
-            output_file = self.audio_generator.generate_podcast_audio(script_path, audio_filename)
+            output_file = audio_generator.generate_podcast_audio(script_path, audio_filename)
             
             if output_file and os.path.exists(output_file):
+                artifact_retention.register_outputs([output_file], job_id)
+                manifest = load_audio_manifest(output_file)
                 job_progress[job_id] = {
                     "status": "completed", 
                     "progress": 100, 
                     "message": "Audio generated successfully!",
                     "output_file": output_file,
-                    "filename": os.path.basename(output_file)
+                    "filename": os.path.basename(output_file),
+                    "manifest_file": get_manifest_path(output_file) if manifest else None,
+                    "duration": manifest["duration"] if manifest else None
                 }
             else:
                 job_progress[job_id] = {"status": "error", "progress": 0, "message": "Failed to generate audio"}
@@ -191,51 +295,112 @@ class WebPodcastGenerator:
         except Exception as e:
             job_progress[job_id] = {"status": "error", "progress": 0, "message": f"Error: {str(e)}"}
 
-    def generate_video(self, job_id, audio_path, image_path, output_dir="output", title=""):
-        """Generate video from audio and image with progress tracking."""
+    def generate_video(self, job_id, audio_path, image_path, output_dir="output", title="", renditions=None, profile=None):
+        """Queue a video render; the render scheduler runs it when a worker is free."""
         try:
             if not HAS_VIDEO_GENERATION:
                 job_progress[job_id] = {"status": "error", "progress": 0, "message": "Video generation not available - missing dependencies"}
                 return
             
-            def progress_callback(progress, message):
-                job_progress[job_id] = {"status": "processing", "progress": progress, "message": message}
-            
             # Generate output filename
             audio_name = Path(audio_path).stem
             timestamp = int(time.time())
             video_filename = os.path.join(output_dir, f"{audio_name}_video_{timestamp}.mp4")
             
-            # Generate video
-            success = self.video_generator.generate_video(
-                audio_path, 
-                image_path, 
-                video_filename,
-                title,
-                progress_callback
-            )
-            
-            if success and os.path.exists(video_filename):
-                # Get video info
-                video_info = self.video_generator.get_video_info(video_filename)
-                
-                job_progress[job_id] = {
-                    "status": "completed", 
-                    "progress": 100, 
-                    "message": "Video generated successfully!",
-                    "output_file": video_filename,
-                    "filename": os.path.basename(video_filename),
-                    "video_info": video_info
-                }
-            else:
-                job_progress[job_id] = {"status": "error", "progress": 0, "message": "Failed to generate video"}
+            job_progress[job_id] = {"status": "queued", "progress": 0, "message": "Waiting in render queue..."}
+            self.render_scheduler.submit(job_id, audio_path, image_path, video_filename, title, renditions, profile)
                 
+        except QueueFullError:
+            raise
         except Exception as e:
             job_progress[job_id] = {"status": "error", "progress": 0, "message": f"Error: {str(e)}"}
 
+    def generate_episode(self, job_id, version, passage, commentary_text=None, image_path=None,
+                         output_dir="output", title=""):
+        """Script, audio and video as one job, with the stages overlapping where they can."""
+        try:
+            if not HAS_AUDIO_GENERATION or not HAS_VIDEO_GENERATION:
+                job_progress[job_id] = {"status": "error", "progress": 0, "message": "Episode generation not available - missing dependencies"}
+                return
+            
+            if not os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
+                job_progress[job_id] = {"status": "error", "progress": 0, "message": "Google Cloud credentials not configured"}
+                return
+            
+            def progress_callback(progress, message, stages):
+                job_progress[job_id] = {"status": "processing", "progress": progress, "message": message, "stages": stages}
+            
+            # Fresh script and audio generators, since both keep per-job state
+            pipeline = PodcastPipeline(PodcastScriptGenerator(), PodcastAudioGenerator(), self.video_generator,
+                                       progress_callback, self.render_scheduler)
+            result = pipeline.run(version, passage, commentary_text, image_path, output_dir, title)
+            artifact_retention.register_outputs([result["script_file"], result["audio_file"], result["output_file"]], job_id)
+            job_progress[job_id] = {
+                "status": "completed",
+                "progress": 100,
+                "message": "Episode generated successfully!",
+                **result
+            }
+        except Exception as e:
+            print(f"❌ Episode generation error: {e}")
+            job_progress[job_id] = {"status": "error", "progress": 0, "message": f"Error: {str(e)}"}
+
+    def video_progress(self, job_id, progress, message):
+        """Progress reported by a render worker."""
+        job_progress[job_id] = {"status": "processing", "progress": progress, "message": message}
+
+    def video_completed(self, job_id, result):
+        """Record the outcome of a finished render."""
+        # Profile reports are written for failed renders too
+        artifact_retention.register_outputs(result.get("profile_reports", {}).values(), job_id)
+        if result.get("success"):
+            video_filename = result["output_file"]
+            artifact_retention.register_outputs([video_filename, *result.get("renditions", {}).values()], job_id,
+                                                result.get("etags"))
+            job_progress[job_id] = {
+                "status": "completed", 
+                "progress": 100, 
+                "message": "Video generated successfully!",
+                "output_file": video_filename,
+                "filename": os.path.basename(video_filename),
+                "video_info": result.get("video_info", {}),
+                "renditions": result.get("renditions", {}),
+                "profile_reports": result.get("profile_reports", {})
+            }
+        else:
+            job_progress[job_id] = {"status": "error", "progress": 0, "message": "Failed to generate video"}
+
+    def video_failed(self, job_id, error):
+        """A render worker raised or died."""
+        job_progress[job_id] = {"status": "error", "progress": 0, "message": f"Error: {str(error)}"}
+
 # Initialize the generator
 web_generator = WebPodcastGenerator()
 
+# Startup state reported by /api/ready
+server_state = {"preloaded_versions": None, "worker_pid": None, "tts_ready": False}
+
+def preload_shared_data():
+    """
+    Load everything read-only that workers share: Bible corpora, canon tables and the audio library index.
+    The production server calls this in the master process before forking (see gunicorn.conf.py),
+    so every worker starts with the data already in memory, shared copy-on-write.
+    """
+    preload_canons()
+    server_state["preloaded_versions"] = preload_bible_versions()
+    if HAS_VIDEO_GENERATION:
+        web_generator.video_generator.get_available_audio_files(per_page=1)
+    print(f"Preloaded Bible versions: {server_state['preloaded_versions']}")
+
+def init_worker():
+    """Per-process setup that must not be shared across a fork: network clients such as TTS, background threads."""
+    server_state["worker_pid"] = os.getpid()
+    artifact_retention.start_sweeper()
+    upload_store.cleanup_incoming()
+    if HAS_AUDIO_GENERATION and os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
+        # Jobs create their own audio generators; this one only checks the credentials for /api/ready
+        server_state["tts_ready"] = PodcastAudioGenerator().initialize_tts_client()
+
 @app.route('/')
 def index():
     """Main page."""
@@ -255,7 +420,27 @@ def validate_passage():
     passage = data.get('passage')
     
     is_valid, message = web_generator.validate_passage(version, passage)
-    return jsonify({"valid": is_valid, "message": message})
+    result = {"valid": is_valid, "message": message}
+    if is_valid:
+        result.update(passage_stats(load_canon(version), passage))
+    return jsonify(result)
+
+@app.route('/api/books')
+def get_books():
+    """Books of a version for autocomplete (?version=&q=<prefix>), or one book's chapters (?version=&book=)."""
+    version = request.args.get('version', '')
+    canon = load_canon(version) if version else None
+    if canon is None:
+        return jsonify({"error": f"Unknown Bible version: {version}"}), 404
+    
+    book = request.args.get('book')
+    if book:
+        info = get_book(canon, book)
+        if info is None:
+            return jsonify({"error": f"Book not found: {book}"}), 404
+        return jsonify({"version": canon["version"], **info})
+    
+    return jsonify({"version": canon["version"], "books": list_books(canon, request.args.get('q', ''))})
 
 @app.route('/api/generate', methods=['POST'])
 def generate_script():
@@ -265,20 +450,28 @@ def generate_script():
     passage = data.get('passage')
     commentary = data.get('commentary', '')
     
-    # Generate unique job ID
-    job_id = str(uuid.uuid4())
+    try:
+        profile = normalize_profile_mode(data.get('profile'))  # Optional: "cpu", "memory" or "all"
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Identical in-flight requests share one job
+    job_id, created = claim_job("script", {"version": version, "passage": passage, "has_commentary": bool(commentary),
+                                           "profile": profile},
+                                {"version": (version or "").upper(), "passage": (passage or "").casefold(),
+                                 "commentary": commentary, "profile": profile}, passage=passage)
+    if not created:
+        return jsonify({"job_id": job_id, "deduplicated": True})
     
-    # Create output directory
+    # Output directory (created when the job starts)
     output_dir = os.path.join("output", job_id)
-    os.makedirs(output_dir, exist_ok=True)
     
-    # Start generation in background thread
-    thread = threading.Thread(
-        target=web_generator.generate_script, 
-        args=(job_id, version, passage, commentary, output_dir)
-    )
-    thread.daemon = True
-    thread.start()
+    # Queue generation; it starts when a script worker is free
+    try:
+        web_generator.job_limiter.submit("script", job_id, run_profiled, web_generator.generate_script, profile,
+                                         output_dir, version, passage, commentary, output_dir)
+    except QueueFullError as e:
+        return reject_job(job_id, e)
     
     return jsonify({"job_id": job_id})
 
@@ -291,30 +484,49 @@ def generate_audio():
     if not script_path or not os.path.exists(script_path):
         return jsonify({"error": "Script file not found"}), 400
     
-    # Generate unique job ID
-    job_id = str(uuid.uuid4())
+    try:
+        profile = normalize_profile_mode(data.get('profile'))  # Optional: "cpu", "memory" or "all"
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Identical in-flight requests share one job
+    job_id, created = claim_job("audio", {"script_path": script_path, "profile": profile},
+                                {"script": file_identity(script_path), "profile": profile})
+    if not created:
+        return jsonify({"job_id": job_id, "deduplicated": True})
     
     # Get output directory from script path
     output_dir = os.path.dirname(script_path)
     
-    # Start audio generation in background thread
-    thread = threading.Thread(
-        target=web_generator.generate_audio, 
-        args=(job_id, script_path, output_dir)
-    )
-    thread.daemon = True
-    thread.start()
+    # Queue audio generation; it starts when an audio worker is free
+    try:
+        web_generator.job_limiter.submit("audio", job_id, run_profiled, web_generator.generate_audio, profile,
+                                         output_dir, script_path, output_dir)
+    except QueueFullError as e:
+        return reject_job(job_id, e)
     
     return jsonify({"job_id": job_id})
 
 @app.route('/api/audio-files')
 def get_audio_files():
-    """Get list of available MP3 files for video generation."""
+    """Get a page of available MP3 files for video generation (?page=&per_page=&q=&sort=&order=)."""
     if not HAS_VIDEO_GENERATION:
         return jsonify({"error": "Video generation not available"}), 400
     
-    audio_files = web_generator.video_generator.get_available_audio_files()
-    return jsonify({"audio_files": audio_files})
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args['per_page']) if request.args.get('per_page') else None
+    except ValueError:
+        return jsonify({"error": "page and per_page must be integers"}), 400
+    
+    result = web_generator.video_generator.get_available_audio_files(
+        page=page,
+        per_page=per_page,
+        search=request.args.get('q', ''),
+        sort=request.args.get('sort', 'created'),
+        order=request.args.get('order', 'desc')
+    )
+    return jsonify(result)
 
 @app.route('/api/upload-image', methods=['POST'])
 def upload_image():
@@ -329,38 +541,34 @@ def upload_image():
     if not allowed_image_file(file.filename):
         return jsonify({"error": "Invalid image file type"}), 400
     
-    # Create uploads directory
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    
-    # Secure filename and save
-    filename = secure_filename(file.filename)
-    timestamp = int(time.time())
-    filename = f"{timestamp}_{filename}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    
     try:
-        file.save(filepath)
-        
-        # Validate image if video generation is available
-        if HAS_VIDEO_GENERATION:
-            is_valid, message = web_generator.video_generator.validate_image(filepath)
-            if not is_valid:
-                # Remove invalid file
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
-                return jsonify({"error": message}), 400
-        
-        return jsonify({
-            "success": True,
-            "filename": filename,
-            "filepath": filepath,
-            "message": "Image uploaded successfully"
-        })
-        
+        # The file was hashed while it streamed in; identical images are stored once
+        stored = upload_store.commit(file.stream)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid image file: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to upload image: {str(e)}"}), 500
+    
+    artifact_retention.register(stored["path"], etag=stored["sha256"])
+    return jsonify({
+        "success": True,
+        "filename": secure_filename(file.filename),
+        "filepath": stored["path"],
+        "sha256": stored["sha256"],
+        "deduplicated": stored["deduplicated"],
+        "message": f"Image uploaded successfully: {stored['width']}x{stored['height']}, {stored['format']} format"
+    })
+
+@app.teardown_request
+def discard_uploads(error=None):
+    """Delete streamed uploads a request did not store (errors, or files sent to other endpoints)."""
+    for file in request.__dict__.get('files', {}).values():
+        if isinstance(file.stream, IncomingUpload) and os.path.exists(file.stream.path):
+            file.stream.discard()
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    return jsonify({"error": error.description or "Upload too large"}), 413
 
 @app.route('/api/generate-video', methods=['POST'])
 def generate_video():
@@ -370,6 +578,7 @@ def generate_video():
     image_path = data.get('image_path')
     title = data.get('title', '')
     folder_name = data.get('folder_name', '')  # New parameter for custom folder name
+    renditions = data.get('renditions')  # Optional ladder, e.g. ["1080p", "720p", "vertical"]
     
     if not audio_path or not os.path.exists(audio_path):
         return jsonify({"error": "Audio file not found"}), 400
@@ -380,8 +589,23 @@ def generate_video():
     if not HAS_VIDEO_GENERATION:
         return jsonify({"error": "Video generation not available - missing dependencies"}), 400
     
-    # Generate unique job ID
-    job_id = str(uuid.uuid4())
+    if renditions:
+        ladder = web_generator.video_generator.rendition_ladder
+        if not isinstance(renditions, list) or any(name not in ladder for name in renditions):
+            return jsonify({"error": f"Unknown rendition, available: {', '.join(ladder)}"}), 400
+    
+    try:
+        profile = normalize_profile_mode(data.get('profile'))  # Optional: "cpu", "memory" or "all"
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Identical in-flight requests share one job
+    job_id, created = claim_job("video", {"audio_path": audio_path, "image_path": image_path, "title": title,
+                                          "folder_name": folder_name, "renditions": renditions, "profile": profile},
+                                {"audio": file_identity(audio_path), "image": file_identity(image_path), "title": title,
+                                 "folder_name": folder_name, "renditions": renditions, "profile": profile})
+    if not created:
+        return jsonify({"job_id": job_id, "status": job_progress[job_id]["status"], "deduplicated": True})
     
     # Create custom output directory if folder_name is provided
     if folder_name:
@@ -396,34 +620,249 @@ def generate_video():
     # Create the output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Start video generation in background thread
-    thread = threading.Thread(
-        target=web_generator.generate_video, 
-        args=(job_id, audio_path, image_path, output_dir, title)
-    )
-    thread.daemon = True
-    thread.start()
+    # Inputs in use count as accessed, so retention keeps them
+    artifact_retention.touch(audio_path)
+    artifact_retention.touch(image_path)
+    
+    # Queue the render; it starts as soon as a render worker is free
+    try:
+        web_generator.generate_video(job_id, audio_path, image_path, output_dir, title, renditions, profile)
+    except QueueFullError as e:
+        return reject_job(job_id, e)
+    
+    return jsonify({"job_id": job_id, "status": job_progress[job_id]["status"]})
+
+@app.route('/api/generate-episode', methods=['POST'])
+def generate_episode():
+    """Generate script, audio and video for a passage in one job."""
+    data = request.json
+    version = data.get('version')
+    passage = data.get('passage')
+    commentary_text = data.get('commentary', '')
+    image_path = data.get('image_path')
+    title = data.get('title', '') or passage
+    folder_name = data.get('folder_name', '')
+    
+    if not version or not passage:
+        return jsonify({"error": "Version and passage are required"}), 400
+    
+    if not image_path or not os.path.exists(image_path):
+        return jsonify({"error": "Image file not found"}), 400
+    
+    if not HAS_AUDIO_GENERATION or not HAS_VIDEO_GENERATION:
+        return jsonify({"error": "Episode generation not available - missing dependencies"}), 400
+    
+    try:
+        profile = normalize_profile_mode(data.get('profile'))  # Optional: "cpu", "memory" or "all"
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Identical in-flight requests share one job
+    job_id, created = claim_job("episode", {"version": version, "passage": passage, "image_path": image_path,
+                                            "title": title, "folder_name": folder_name,
+                                            "has_commentary": bool(commentary_text), "profile": profile},
+                                {"version": version.upper(), "passage": passage.casefold(), "commentary": commentary_text,
+                                 "image": file_identity(image_path), "title": title, "folder_name": folder_name,
+                                 "profile": profile},
+                                passage=passage)
+    if not created:
+        return jsonify({"job_id": job_id, "deduplicated": True})
+    
+    if folder_name:
+        safe_folder_name = "".join(c for c in folder_name if c.isalnum() or c in (' ', '-', '_')).strip()
+        output_dir = os.path.join("output", safe_folder_name.replace(' ', '_'))
+    else:
+        output_dir = os.path.join("output", job_id)
+    
+    try:
+        web_generator.job_limiter.submit("episode", job_id, run_profiled, web_generator.generate_episode, profile,
+                                         output_dir, version, passage, commentary_text, image_path, output_dir, title)
+    except QueueFullError as e:
+        return reject_job(job_id, e)
     
     return jsonify({"job_id": job_id})
 
+def reject_job(job_id, error):
+    """Answer a submission turned away by admission control: 429 with the expected wait for a free slot."""
+    job_progress[job_id] = {"status": "error", "progress": 0, "message": f"Server busy: {error}"}
+    response = jsonify({"error": str(error), "job_type": error.job_type, "retry_after": error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def get_job_state(job_id):
+    """Job state for progress responses, with live queue details and the change cursor."""
+    progress, cursor = job_progress.get_with_cursor(job_id)
+    if progress is None:
+        return {"status": "not_found", "progress": 0, "message": "Job not found", "cursor": None}
+    if progress.get("status") == "queued":
+        # Queue position and estimated wait are computed live from the job queues
+        progress = (web_generator.job_limiter.get_queue_status(job_id)
+                    or web_generator.render_scheduler.get_queue_status(job_id) or progress)
+    progress["cursor"] = cursor
+    return progress
+
 @app.route('/api/progress/<job_id>')
 def get_progress(job_id):
-    """Get job progress."""
-    progress = job_progress.get(job_id, {"status": "not_found", "progress": 0, "message": "Job not found"})
-    print(f"📊 Progress check for {job_id}: {progress.get('status', 'unknown')} - {progress.get('progress', 0)}%")  # Debug log
+    """
+    Get job progress. With ?since=<cursor> this is a long poll: it answers as soon as the job
+    changes, or after ?wait= seconds (at most 30) with the unchanged state.
+    """
+    seen = job_progress.change_count
+    progress = get_job_state(job_id)
+    since = request.args.get('since')
+    if since:
+        try:
+            wait = min(30.0, max(0.0, float(request.args.get('wait', 20))))
+        except ValueError:
+            return jsonify({"error": "wait must be a number"}), 400
+        deadline = time.time() + wait
+        while progress["cursor"] == since and progress["status"] not in FINAL_STATUSES and time.time() < deadline:
+            seen = job_progress.wait_for_change(seen, min(PROGRESS_RECHECK_INTERVAL, deadline - time.time()))
+            progress = get_job_state(job_id)
     return jsonify(progress)
 
+@app.route('/api/progress/<job_id>/stream')
+def stream_progress(job_id):
+    """
+    Server-Sent Events stream of a job's progress: one event per change, closed once the job ends.
+    503 when this worker already has MAX_SSE_STREAMS open; the client then long-polls /api/progress.
+    """
+    with sse_lock:
+        if sse_streams["open"] >= MAX_SSE_STREAMS:
+            response = jsonify({"error": "Too many progress streams, use /api/progress long polling"})
+            response.status_code = 503
+            response.headers['Retry-After'] = "30"
+            return response
+        sse_streams["open"] += 1
+    
+    def release():
+        with sse_lock:
+            sse_streams["open"] -= 1
+    
+    def change_key(progress):
+        # The live wait estimate of a queued job changes every tick; only its position and the
+        # minute-rounded wait in the message count as a change
+        return progress["cursor"], progress["status"], progress.get("queue_position"), progress.get("message")
+    
+    def events():
+        last = None
+        last_sent = time.time()
+        seen = job_progress.change_count
+        while True:
+            progress = get_job_state(job_id)
+            if change_key(progress) != last:
+                yield f"id: {progress['cursor']}\ndata: {json.dumps(progress)}\n\n"
+                last, last_sent = change_key(progress), time.time()
+                if progress["status"] in FINAL_STATUSES:
+                    return
+            elif time.time() - last_sent > 15:
+                yield ": keep-alive\n\n"  # Keeps proxies from closing an idle stream
+                last_sent = time.time()
+            seen = job_progress.wait_for_change(seen, PROGRESS_RECHECK_INTERVAL)
+    
+    response = Response(events(), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(release)  # Runs when the stream ends or the client goes away
+    return response
+
+@app.route('/api/queue')
+def queue_status():
+    """Live load per job type: running and waiting jobs, limits, rejections and the expected wait."""
+    queues = web_generator.job_limiter.get_stats()
+    queues["video"] = web_generator.render_scheduler.get_stats()
+    return jsonify({"queues": queues})
+
+@app.route('/api/ready')
+def readiness():
+    """Readiness probe: 200 once this worker has its data loaded and can reach the job store, 503 before."""
+    checks = {
+        "corpora": server_state["preloaded_versions"] is not None,
+        "worker": server_state["worker_pid"] == os.getpid(),
+        "job_store": True
+    }
+    try:
+        job_progress.get("readiness-probe")
+    except Exception:
+        checks["job_store"] = False
+    
+    ready = all(checks.values())
+    return jsonify({
+        "ready": ready,
+        "checks": checks,
+        "pid": os.getpid(),
+        "versions": server_state["preloaded_versions"] or [],
+        "tts_ready": server_state["tts_ready"]
+    }), 200 if ready else 503
+
+@app.route('/api/storage')
+def storage_status():
+    """Disk use of generated files and uploads by type, retention limits and pins."""
+    return jsonify(artifact_retention.get_stats())
+
+@app.route('/api/storage/pin', methods=['POST'])
+def pin_artifact():
+    """Pin (or with "pinned": false, unpin) a file or episode folder so retention never deletes it."""
+    data = request.json or {}
+    path = resolve_download_path(data.get('path', ''))
+    if path is None or not os.path.exists(path):
+        return jsonify({"error": "Path not found under output/ or uploads/"}), 400
+    
+    pinned = bool(data.get('pinned', True))
+    count = artifact_retention.pin(path, pinned)
+    return jsonify({"path": os.path.relpath(path), "pinned": pinned, "artifacts": count})
+
+@app.route('/api/storage/sweep', methods=['POST'])
+def sweep_storage():
+    """Run a retention sweep now instead of waiting for the background sweeper."""
+    return jsonify(artifact_retention.sweep(force=True))
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Recent jobs, optionally filtered by passage or type (?passage=&type=&limit=)."""
+    try:
+        limit = min(500, max(1, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    passage = request.args.get('passage')
+    if passage:
+        jobs = job_progress.by_passage(passage, limit)
+    else:
+        jobs = job_progress.recent(limit, request.args.get('type'))
+    return jsonify({"jobs": jobs})
+
+def resolve_download_path(filename):
+    """Real path of a requested download, or None if it is outside the download directories."""
+    path = os.path.realpath(filename)
+    for root in DOWNLOAD_ROOTS:
+        root = os.path.realpath(root)
+        if os.path.commonpath([path, root]) == root:
+            return path
+    return None
+
 @app.route('/api/download/<path:filename>')
 def download_file(filename):
-    """Download generated file."""
-    # Security: only allow downloads from output and uploads directories
-    if not (filename.startswith('output/') or filename.startswith('uploads/')):
+    """
+    Download a generated file, or preview it in the browser with ?inline=1. Range requests let players
+    seek and resume, and the ETag turns repeat fetches into 304s: the content hash recorded when the file was
+    registered, or Werkzeug's size/mtime tag for files the index does not know. The file body goes out
+    through the server's file wrapper (sendfile) or X-Sendfile, never through a Python read loop.
+    """
+    # Security: only allow downloads from output and uploads directories (after resolving ../ and symlinks)
+    path = resolve_download_path(filename)
+    if path is None:
         return "Access denied", 403
     
-    if os.path.exists(filename):
-        return send_file(filename, as_attachment=True, download_name=os.path.basename(filename))
-    else:
+    if not os.path.isfile(path):
         return "File not found", 404
+    
+    artifact_retention.touch(path)
+    inline = request.args.get('inline', '').lower() in ('1', 'true', 'yes')
+    response = send_file(path, as_attachment=not inline, download_name=os.path.basename(path),
+                         conditional=True, etag=artifact_retention.get_etag(path) or True, max_age=0)
+    response.cache_control.must_revalidate = True  # Revalidate with the ETag; the same name may be regenerated
+    return response
 
 @app.route('/api/config/audio', methods=['GET', 'POST'])
 def audio_config():
@@ -462,7 +901,9 @@ if __name__ == '__main__':
     print(f"Audio generation available: {HAS_AUDIO_GENERATION}")
     print(f"Video generation available: {HAS_VIDEO_GENERATION}")
     print(f"Google Cloud credentials: {'✓' if os.environ.get('GOOGLE_APPLICATION_CREDENTIALS') else '✗'}")
-    print("\nStarting Flask server...")
+    preload_shared_data()
+    init_worker()
+    print("\nStarting Flask development server (use `gunicorn -c gunicorn.conf.py main:app` in production)...")
     print("Access the application at: http://localhost:5001")
     print("="*60)
     
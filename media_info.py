@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Media Header Parser for Bible Podcast
+Reads MP3 frame headers and MP4 boxes directly, without decoding audio or starting ffmpeg
+"""
+
+import json
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+# MPEG audio version ids (2 bits in the frame header)
+MPEG_25, MPEG_2, MPEG_1 = 0, 2, 3
+
+# Layer III bitrates in kbps, indexed by the 4-bit bitrate index
+LAYER3_BITRATES = {
+    MPEG_1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    MPEG_2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+LAYER3_BITRATES[MPEG_25] = LAYER3_BITRATES[MPEG_2]
+
+# Layer III decoders output this many samples before the encoder delay starts
+DECODER_DELAY = 529
+
+SAMPLE_RATES = {
+    MPEG_1: [44100, 48000, 32000],
+    MPEG_2: [22050, 24000, 16000],
+    MPEG_25: [11025, 12000, 8000]
+}
+
+def parse_mp3_frame_header(header: bytes) -> Optional[Dict]:
+    """Parse a 4-byte MPEG Layer III frame header. Returns None if it is not a valid header."""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = LAYER3_BITRATES[version][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    channels = 1 if (header[3] >> 6) == 3 else 2
+
+    if version == MPEG_1:
+        samples_per_frame = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+        side_info = 17 if channels == 1 else 32
+    else:
+        samples_per_frame = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+        side_info = 9 if channels == 1 else 17
+
+    return {
+        "version": version,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length,
+        "side_info": side_info
+    }
+
+def id3v2_size(data) -> int:
+    """Size of a leading ID3v2 tag (header included), or 0 if there is none."""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def parse_xing_header(frame: bytes, header: Dict) -> Optional[Dict]:
+    """Parse a Xing/Info tag (and the LAME extension) from the first frame, if present."""
+    offset = 4 + header["side_info"]
+    tag = frame[offset:offset + 4]
+    if tag not in (b'Xing', b'Info'):
+        return None
+
+    flags = int.from_bytes(frame[offset + 4:offset + 8], 'big')
+    position = offset + 8
+    info = {"vbr": tag == b'Xing', "frames": None, "bytes": None, "encoder_delay": 0, "padding": 0}
+
+    if flags & 0x1:
+        info["frames"] = int.from_bytes(frame[position:position + 4], 'big')
+        position += 4
+    if flags & 0x2:
+        info["bytes"] = int.from_bytes(frame[position:position + 4], 'big')
+        position += 4
+    if flags & 0x4:
+        position += 100  # Seek table
+    if flags & 0x8:
+        position += 4    # Quality indicator
+
+    # LAME extension: encoder delay and padding are two 12-bit values 21 bytes into the tag
+    if frame[position:position + 4] in (b'LAME', b'Lavc', b'Lavf'):
+        delay_bytes = frame[position + 21:position + 24]
+        if len(delay_bytes) == 3:
+            info["encoder_delay"] = (delay_bytes[0] << 4) | (delay_bytes[1] >> 4)
+            info["padding"] = ((delay_bytes[1] & 0x0F) << 8) | delay_bytes[2]
+
+    return info
+
+def parse_vbri_header(frame: bytes) -> Optional[Dict]:
+    """Parse a Fraunhofer VBRI header, which sits 32 bytes after the first frame header."""
+    if frame[36:40] != b'VBRI' or len(frame) < 54:
+        return None
+    delay, _, total_bytes, frames = struct.unpack('>HHII', frame[42:54])
+    return {"vbr": True, "frames": frames, "bytes": total_bytes, "encoder_delay": delay, "padding": 0}
+
+def scan_mp3_frames(path: str) -> Optional[Dict]:
+    """
+    Walk every frame header of an MP3 file and return frame byte offsets plus stream info.
+    The Xing/Info frame (if any) is not counted as audio.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+        position = id3v2_size(data[:10])
+
+        # Find the first frame sync after the tag
+        first = None
+        while position < size - 4:
+            first = parse_mp3_frame_header(data[position:position + 4])
+            if first:
+                break
+            position += 1
+        if not first:
+            return None
+
+        xing = parse_xing_header(data[position:position + first["frame_length"]], first)
+        if xing:
+            position += first["frame_length"]
+
+        frame_offsets = []
+        while position < size - 4:
+            header = parse_mp3_frame_header(data[position:position + 4])
+            if not header or header["frame_length"] <= 0:
+                break  # Trailing tags (ID3v1/APE) or garbage
+            frame_offsets.append(position)
+            position += header["frame_length"]
+
+    samples_per_frame = first["samples_per_frame"]
+    delay = xing["encoder_delay"] if xing else 0
+    padding = xing["padding"] if xing else 0
+    total_samples = max(0, len(frame_offsets) * samples_per_frame - delay - padding)
+
+    return {
+        "sample_rate": first["sample_rate"],
+        "channels": first["channels"],
+        "bitrate": first["bitrate"],
+        "samples_per_frame": samples_per_frame,
+        "encoder_delay": delay,
+        "padding": padding,
+        "frame_offsets": frame_offsets,
+        "audio_end": position,
+        "total_samples": total_samples,
+        "duration": total_samples / first["sample_rate"]
+    }
+
+def read_mp3_info(path: str) -> Optional[Dict]:
+    """
+    Duration and stream info of an MP3 from a few small reads: the ID3 tag size, the first frame
+    and its Xing/Info or VBRI header. Files without a frame count header fall back to a frame scan.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        position = id3v2_size(f.read(10))
+        f.seek(position)
+        data = f.read(4096)
+
+    # The first frame sync after the tag
+    header = None
+    offset = 0
+    while offset < len(data) - 4:
+        header = parse_mp3_frame_header(data[offset:offset + 4])
+        if header:
+            break
+        offset += 1
+    if not header:
+        return None
+
+    frame = data[offset:offset + max(header["frame_length"], 192)]
+    tag = parse_xing_header(frame, header) or parse_vbri_header(frame)
+    if tag and tag["frames"]:
+        total_samples = max(0, tag["frames"] * header["samples_per_frame"] - tag["encoder_delay"] - tag["padding"])
+        duration = total_samples / header["sample_rate"]
+        audio_bytes = tag["bytes"] or (size - position - offset)
+        bitrate = int(audio_bytes * 8 / duration) if duration else header["bitrate"]
+        vbr = tag["vbr"]
+    else:
+        frames = scan_mp3_frames(path)
+        if not frames:
+            return None
+        duration = frames["duration"]
+        bitrate = header["bitrate"]
+        vbr = False
+
+    return {
+        "format": "mp3",
+        "duration": duration,
+        "bitrate": bitrate,
+        "sample_rate": header["sample_rate"],
+        "channels": header["channels"],
+        "vbr": vbr,
+        "streams": [{"type": "audio", "codec": "mp3", "sample_rate": header["sample_rate"],
+                     "channels": header["channels"], "bitrate": bitrate}]
+    }
+
+def iter_mp4_boxes(f, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload offset, box end) for the boxes between start and end, seeking past payloads."""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        box_size, box_type = struct.unpack('>I4s', header)
+        payload = position + 8
+        if box_size == 1:  # 64-bit size follows the type
+            box_size = struct.unpack('>Q', f.read(8))[0]
+            payload += 8
+        elif box_size == 0:  # Box runs to the end of the file
+            box_size = end - position
+        if box_size < 8:
+            return
+        yield box_type, payload, min(position + box_size, end)
+        position += box_size
+
+def find_mp4_box(f, start: int, end: int, path: Tuple[bytes, ...]) -> Optional[Tuple[int, int]]:
+    """Payload range of the first box along a path of nested box types."""
+    for box_type, payload, box_end in iter_mp4_boxes(f, start, end):
+        if box_type == path[0]:
+            return (payload, box_end) if len(path) == 1 else find_mp4_box(f, payload, box_end, path[1:])
+    return None
+
+def read_mp4_time(f, payload: int) -> Tuple[int, int]:
+    """(timescale, duration) from an mvhd or mdhd box payload, version 0 or 1."""
+    f.seek(payload)
+    version = f.read(1)[0]
+    if version == 1:
+        f.seek(payload + 20)
+        return struct.unpack('>IQ', f.read(12))
+    f.seek(payload + 12)
+    return struct.unpack('>II', f.read(8))
+
+def read_mp4_info(path: str) -> Optional[Dict]:
+    """
+    Duration and stream info of an MP4/M4A from its moov box: mvhd for the movie duration, then per
+    track mdhd, hdlr and the first stsd entry. Only box headers and these small boxes are read, never
+    the sample tables or media data.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        moov = find_mp4_box(f, 0, size, (b'moov',))
+        if not moov:
+            return None
+        mvhd = find_mp4_box(f, moov[0], moov[1], (b'mvhd',))
+        if not mvhd:
+            return None
+        timescale, duration_units = read_mp4_time(f, mvhd[0])
+        duration = duration_units / timescale if timescale else None
+
+        streams = []
+        handlers = {b'vide': "video", b'soun': "audio", b'sbtl': "subtitle", b'text': "subtitle"}
+        for box_type, payload, box_end in iter_mp4_boxes(f, moov[0], moov[1]):
+            if box_type != b'trak':
+                continue
+            mdia = find_mp4_box(f, payload, box_end, (b'mdia',))
+            hdlr = mdia and find_mp4_box(f, mdia[0], mdia[1], (b'hdlr',))
+            if not hdlr:
+                continue
+            f.seek(hdlr[0] + 8)
+            stream = {"type": handlers.get(f.read(4), "data")}
+
+            mdhd = find_mp4_box(f, mdia[0], mdia[1], (b'mdhd',))
+            if mdhd:
+                track_timescale, track_units = read_mp4_time(f, mdhd[0])
+                stream["duration"] = track_units / track_timescale if track_timescale else None
+
+            stsd = find_mp4_box(f, mdia[0], mdia[1], (b'minf', b'stbl', b'stsd'))
+            if stsd:
+                f.seek(stsd[0] + 8)  # Version/flags and entry count
+                entry = f.read(36)
+                if len(entry) >= 8:
+                    stream["codec"] = entry[4:8].decode('latin-1').strip()
+                if stream["type"] == "video" and len(entry) >= 36:
+                    stream["width"], stream["height"] = struct.unpack('>HH', entry[32:36])
+                elif stream["type"] == "audio" and len(entry) >= 36:
+                    stream["channels"] = struct.unpack('>H', entry[24:26])[0]
+                    stream["sample_rate"] = struct.unpack('>H', entry[32:34])[0]
+            streams.append(stream)
+
+    return {
+        "format": "mp4",
+        "duration": duration,
+        "bitrate": int(size * 8 / duration) if duration else None,
+        "streams": streams
+    }
+
+def read_ffprobe_info(path: str) -> Optional[Dict]:
+    """Media info from ffprobe, for formats the header parsers do not understand."""
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        return None
+    try:
+        result = subprocess.run([ffprobe, '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path],
+                                capture_output=True, text=True, timeout=30)
+        probe = json.loads(result.stdout)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+    duration = probe.get("format", {}).get("duration")
+    bitrate = probe.get("format", {}).get("bit_rate")
+    streams = []
+    for stream in probe.get("streams", []):
+        info = {"type": stream.get("codec_type"), "codec": stream.get("codec_name")}
+        for key in ("width", "height", "channels"):
+            if key in stream:
+                info[key] = stream[key]
+        if "sample_rate" in stream:
+            info["sample_rate"] = int(stream["sample_rate"])
+        streams.append(info)
+    return {
+        "format": probe.get("format", {}).get("format_name"),
+        "duration": float(duration) if duration else None,
+        "bitrate": int(bitrate) if bitrate else None,
+        "streams": streams
+    }
+
+# Header parsers by file extension; anything else (or a parser failure) goes to ffprobe
+MEDIA_PARSERS = {
+    ".mp3": read_mp3_info,
+    ".mp4": read_mp4_info,
+    ".m4a": read_mp4_info,
+    ".m4v": read_mp4_info,
+    ".mov": read_mp4_info
+}
+
+# Content hashes of files, memoized by (path, size, mtime) so unchanged files are read once;
+# least recently used entries are dropped beyond FILE_HASH_MEMO_SIZE
+FILE_HASH_MEMO_SIZE = 1024
+_file_hashes = OrderedDict()
+_file_hashes_lock = threading.Lock()
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if memo_key in _file_hashes:
+            _file_hashes.move_to_end(memo_key)
+            return _file_hashes[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+
+    with _file_hashes_lock:
+        _file_hashes[memo_key] = digest.hexdigest()
+        while len(_file_hashes) > FILE_HASH_MEMO_SIZE:
+            _file_hashes.popitem(last=False)
+    return digest.hexdigest()
+
+def get_media_info(path: str) -> Optional[Dict]:
+    """Duration, bitrate and stream info of a media file, from headers when possible."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    parser = MEDIA_PARSERS.get(Path(path).suffix.lower())
+    info = None
+    if parser:
+        try:
+            info = parser(path)
+        except (OSError, ValueError, IndexError, struct.error) as e:
+            print(f"Warning: Could not parse headers of {path}: {e}")
+    return info or read_ffprobe_info(path)
+
+def mp3_sample_to_byte(frames: Dict, sample: int, end: bool = False) -> int:
+    """Byte offset of the frame holding a sample; with end=True, the offset just past that frame."""
+    offsets = frames["frame_offsets"]
+    if not offsets:
+        return 0
+
+    position = sample + frames["encoder_delay"] + (DECODER_DELAY if frames["encoder_delay"] else 0)
+    index = position // frames["samples_per_frame"]
+    if end:
+        index = -(-position // frames["samples_per_frame"])  # Round up to a frame boundary
+        return offsets[index] if index < len(offsets) else frames["audio_end"]
+    return offsets[min(index, len(offsets) - 1)]
+
+def get_manifest_path(audio_path: str) -> str:
+    """Path of the JSON timing manifest written next to a generated podcast."""
+    return str(Path(audio_path).with_suffix('.json'))
+
+def load_audio_manifest(audio_path: str) -> Optional[Dict]:
+    """Load the timing manifest for an audio file, if one exists and still matches the file."""
+    manifest_path = get_manifest_path(audio_path)
+    if not os.path.exists(manifest_path) or not os.path.exists(audio_path):
+        return None
+
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # A re-encoded or replaced file makes the manifest stale
+    if manifest.get("size") != os.path.getsize(audio_path):
+        return None
+    return manifest
+
+def get_audio_duration(audio_path: str) -> Optional[float]:
+    """Audio duration from the timing manifest or the file headers, without decoding."""
+    manifest = load_audio_manifest(audio_path)
+    if manifest:
+        return manifest["duration"]
+    info = get_media_info(audio_path)
+    return info["duration"] if info else None
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Audio Library Index for Bible Podcast
+Keeps a persistent metadata index of generated MP3s so listings never decode audio
+"""
+
+import os
+import json
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional
+
+from media_info import get_audio_duration
+
+class AudioLibraryIndex:
+    """
+    Metadata for every MP3 under the library directories, keyed by path and validated by
+    (size, mtime). A refresh walks the directories with os.scandir and only reads headers
+    of files that are new or changed since the last refresh.
+    """
+
+    SORT_KEYS = {
+        "created": lambda entry: entry["created"],
+        "name": lambda entry: entry["filename"].lower(),
+        "duration": lambda entry: entry["duration"] or 0,
+        "size": lambda entry: entry["size"]
+    }
+
+    def __init__(self, index_path: str = "cache/audio_index.json", directory: str = "output",
+                 include_cwd: bool = True, duration_reader: Callable[[str], Optional[float]] = None):
+        self.index_path = index_path
+        self.directory = directory
+        self.include_cwd = include_cwd
+        self.duration_reader = duration_reader or get_audio_duration
+        self.entries = {}
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Load the persisted index, starting empty if it is missing or unreadable."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _save(self):
+        """Persist the index atomically so concurrent readers never see a partial file."""
+        index_dir = os.path.dirname(self.index_path) or '.'
+        os.makedirs(index_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"entries": self.entries}, f)
+            os.replace(temp_path, self.index_path)
+        except Exception as e:
+            print(f"Warning: Could not save audio index: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _scan(self, directory: str, recursive: bool, found: Dict[str, os.DirEntry]):
+        """Collect MP3 directory entries, skipping hidden directories such as segment caches."""
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not entry.name.startswith('.'):
+                            self._scan(entry.path, recursive, found)
+                    elif entry.name.lower().endswith('.mp3'):
+                        found[entry.path] = entry
+        except OSError as e:
+            print(f"Error scanning {directory}: {e}")
+
+    def refresh(self) -> List[Dict]:
+        """Bring the index up to date with the filesystem and return all entries."""
+        found = {}
+        if os.path.isdir(self.directory):
+            self._scan(self.directory, True, found)
+        if self.include_cwd:
+            self._scan('.', False, found)
+
+        with self.lock:
+            changed = False
+            entries = {}
+            seen = set()
+            for path, dir_entry in found.items():
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+
+                # The same file reached twice (e.g. through the CWD scan) is listed once
+                real_path = os.path.realpath(path)
+                if real_path in seen:
+                    continue
+                seen.add(real_path)
+
+                cached = self.entries.get(path)
+                if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+                    entries[path] = cached
+                    continue
+
+                entries[path] = self._build_entry(path, stat)
+                changed = True
+
+            if changed or len(entries) != len(self.entries):
+                self.entries = entries
+                self._save()
+
+            return list(self.entries.values())
+
+    def _build_entry(self, path: str, stat: os.stat_result) -> Dict:
+        """Read the metadata of a new or changed file."""
+        try:
+            duration = self.duration_reader(path)
+        except Exception as e:
+            print(f"Error reading duration of {path}: {e}")
+            duration = None
+
+        in_library = os.path.commonpath([os.path.abspath(path), os.path.abspath(self.directory)]) == os.path.abspath(self.directory)
+        return {
+            "filename": os.path.basename(path),
+            "path": os.path.normpath(path) if in_library else os.path.abspath(path),
+            "relative_path": os.path.relpath(path, self.directory) if in_library else os.path.basename(path),
+            "size": stat.st_size,
+            "size_mb": round(stat.st_size / (1024 * 1024), 2),
+            "duration": duration,
+            "duration_str": f"{int(duration // 60)}:{int(duration % 60):02d}" if duration else "Unknown",
+            "created": stat.st_ctime,
+            "mtime_ns": stat.st_mtime_ns
+        }
+
+    def query(self, page: int = 1, per_page: Optional[int] = None, search: str = "",
+              sort: str = "created", order: str = "desc") -> Dict:
+        """Filter, sort and paginate the library. per_page=None returns every match."""
+        entries = self.refresh()
+
+        if search:
+            needle = search.lower()
+            entries = [entry for entry in entries if needle in entry["relative_path"].lower()]
+
+        sort_key = self.SORT_KEYS.get(sort, self.SORT_KEYS["created"])
+        entries.sort(key=sort_key, reverse=(order != "asc"))
+
+        total = len(entries)
+        if per_page:
+            page = max(1, page)
+            entries = entries[(page - 1) * per_page:page * per_page]
+
+        return {
+            "audio_files": entries,
+            "total": total,
+            "page": page if per_page else 1,
+            "per_page": per_page or total
+        }
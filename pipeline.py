@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Episode Pipeline for Bible Podcast
+Runs script, audio and video generation as one job with overlapping stages
+"""
+
+import os
+import time
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from media_info import load_audio_manifest, get_manifest_path
+from generate_video import find_ffmpeg
+from render_queue import encode_background_job, mux_episode_job
+
+class PodcastPipeline:
+    """
+    One episode as a small DAG of stages:
+
+        script ──► audio ──────► video
+           └─► TTS prefetch ─┘    ▲
+        background loop ──────────┘
+
+    Speech synthesis starts on the first script sections while later ones are still being built,
+    and keeps running next to the audio stage (the two never synthesize the same chunk), the
+    background loop is encoded while the audio is synthesized, and the audio encoder writes the AAC
+    track the video muxes as-is. Progress of all stages is reported as one number.
+
+    With a render scheduler, the background encode and the video mux run on its process pool,
+    so they count against the same bound on concurrent encodes as other renders.
+    """
+
+    # Share of the combined progress of each stage, roughly its share of the wall time
+    STAGE_WEIGHTS = {"script": 5, "audio": 70, "background": 10, "video": 15}
+
+    def __init__(self, script_generator, audio_generator, video_generator, progress_callback=None,
+                 render_scheduler=None):
+        self.script_generator = script_generator
+        self.audio_generator = audio_generator
+        self.video_generator = video_generator
+        self.progress_callback = progress_callback
+        self.render_scheduler = render_scheduler
+        self.stages = {name: {"status": "pending", "progress": 0, "message": ""} for name in self.STAGE_WEIGHTS}
+        self.lock = threading.Lock()
+
+    def report(self, stage: str, progress: int, message: str, status: str = "running"):
+        """Record a stage's progress and publish the combined progress of the job."""
+        with self.lock:
+            self.stages[stage] = {"status": status, "progress": progress, "message": message}
+            total = sum(self.STAGE_WEIGHTS[name] * info["progress"] for name, info in self.stages.items())
+            combined = int(total / sum(self.STAGE_WEIGHTS.values()))
+            stages = {name: dict(info) for name, info in self.stages.items()}
+        if self.progress_callback:
+            self.progress_callback(combined, f"{stage.capitalize()}: {message}", stages)
+
+    def stage_callback(self, stage: str):
+        """Progress callback for one stage, in the (progress, message) form the generators use."""
+        return lambda progress, message: self.report(stage, progress, message)
+
+    def run(self, version: str, passage: str, commentary_text: Optional[str], image_path: str,
+            output_dir: str, title: str = "") -> Dict:
+        """Generate the episode and return its files. Raises if any stage fails."""
+        start = time.time()
+        timings = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+        safe_passage = passage.replace(' ', '_').replace(':', '-')
+        base_name = f"{safe_passage}_{version}_{int(start)}"
+        script_path = os.path.join(output_dir, f"{base_name}_script.txt")
+        audio_path = os.path.join(output_dir, f"{base_name}_script_podcast.mp3")
+        encoded_audio_path = os.path.join(output_dir, f".{base_name}_podcast.m4a")
+        video_path = os.path.join(output_dir, f"{base_name}_video.mp4")
+
+        if not self.audio_generator.initialize_tts_client():
+            raise Exception("Failed to initialize TTS client")
+
+        # Background loop: depends only on the image, so it is encoded while the audio is made
+        background_errors = []
+        background = threading.Thread(target=self.build_background,
+                                      args=(image_path, background_errors, timings, f"{base_name}:background"),
+                                      daemon=True)
+        background.start()
+
+        # Script, with speech for finished sections synthesized as they appear
+        sections = queue.Queue()
+        stop_prefetch = threading.Event()
+        prefetch = threading.Thread(target=self.prefetch_audio, args=(sections, audio_path, stop_prefetch), daemon=True)
+        prefetch.start()
+
+        def finish_prefetch():
+            stop_prefetch.set()
+            prefetch.join()
+        try:
+            stage_start = time.time()
+            script_path = self.build_script(version, passage, commentary_text, script_path, sections.put)
+            timings["script"] = time.time() - stage_start
+        finally:
+            sections.put(None)
+
+        # Audio: remaining chunks (alongside the prefetch), post-processing, then one encode
+        # writing the MP3 and the video's AAC track. The prefetch is stopped before unused chunks are
+        # deleted, so it cannot write into the cache while it is cleaned up.
+        stage_start = time.time()
+        try:
+            output_file = self.audio_generator.generate_podcast_audio(
+                script_path, audio_path, self.stage_callback("audio"), encoded_audio_path, finish_prefetch
+            )
+        finally:
+            finish_prefetch()
+        if not output_file or not os.path.exists(output_file):
+            raise Exception("Failed to generate audio")
+        self.report("audio", 100, "Audio generated", "done")
+        timings["audio"] = time.time() - stage_start
+
+        background.join()
+        if background_errors:
+            raise background_errors[0]
+
+        # Video: stream-copies the cached background and the AAC track, so this is a mux
+        stage_start = time.time()
+        try:
+            if self.render_scheduler:
+                self.report("video", 0, "Waiting for a render worker...")
+                result = self.render_scheduler.run_task(
+                    f"{base_name}:video", mux_episode_job,
+                    (audio_path, image_path, video_path, title, script_path, encoded_audio_path),
+                    self.stage_callback("video")
+                )
+                success = result["success"]
+            else:
+                success = self.video_generator.generate_video(
+                    audio_path, image_path, video_path, title, self.stage_callback("video"), script_path, encoded_audio_path
+                )
+        finally:
+            if os.path.exists(encoded_audio_path):
+                os.remove(encoded_audio_path)
+        if not success or not os.path.exists(video_path):
+            raise Exception("Failed to generate video")
+        self.report("video", 100, "Video generated", "done")
+        timings["video"] = time.time() - stage_start
+
+        manifest = load_audio_manifest(audio_path)
+        return {
+            "script_file": script_path,
+            "audio_file": audio_path,
+            "manifest_file": get_manifest_path(audio_path) if manifest else None,
+            "duration": manifest["duration"] if manifest else None,
+            "output_file": video_path,
+            "filename": os.path.basename(video_path),
+            "video_info": self.video_generator.get_video_info(video_path),
+            "stage_seconds": {name: round(seconds, 2) for name, seconds in timings.items()},
+            "elapsed": round(time.time() - start, 2)
+        }
+
+    def build_script(self, version: str, passage: str, commentary_text: Optional[str], script_path: str,
+                     section_callback) -> str:
+        """Script stage; commentary-based when there is meaningful commentary, direct reading otherwise."""
+        self.report("script", 10, "Loading Bible version...")
+        if not self.script_generator.load_bible_version(version):
+            raise Exception(f"Failed to load Bible version: {version}")
+        if not self.script_generator.validate_passage(passage):
+            raise Exception(f"Invalid passage: {passage}")
+
+        def on_section(content):
+            section_callback(content)
+            self.report("script", 50, "Building script sections...")
+
+        output_file = None
+        if commentary_text and len(commentary_text.strip()) > 20:
+            self.report("script", 20, "Generating commentary-based script...")
+            try:
+                commentary_path = str(Path(script_path).with_name(Path(script_path).name.replace("_script", "_commentary")))
+                output_file = self.script_generator.generate_commentary_based_script(
+                    commentary_text, commentary_path, on_section
+                )
+            except Exception as e:
+                print(f"❌ Commentary generation failed: {e}")
+            if output_file:
+                # Keep the audio/script naming convention (<script>_podcast.mp3)
+                os.replace(output_file, script_path)
+                output_file = script_path
+
+        if not output_file:
+            self.report("script", 20, "Generating direct Bible reading script...")
+            output_file = self.script_generator.generate_podcast_script_from_passage(passage, script_path, on_section)
+
+        if not output_file or not os.path.exists(output_file):
+            raise Exception("Failed to generate script")
+        self.report("script", 100, "Script generated", "done")
+        return output_file
+
+    def prefetch_audio(self, sections: queue.Queue, audio_path: str, stop: threading.Event):
+        """Synthesize speech for finished script sections while the rest of the script is built."""
+        finished = False
+        while not finished:
+            content = sections.get()
+            if content is None or stop.is_set():
+                return
+            # Only the newest script text matters; skip versions that were superseded while synthesizing.
+            # The final version is still synthesized after the script is done, next to the audio stage.
+            while not sections.empty():
+                newer = sections.get()
+                if newer is None:
+                    finished = True
+                else:
+                    content = newer
+            try:
+                synthesized = self.audio_generator.prefetch_script_audio(content, audio_path, stop)
+                if synthesized:
+                    self.report("audio", 5, f"Synthesized {synthesized} chunks ahead of the script")
+            except Exception as e:
+                # The audio stage synthesizes anything missing, so prefetch failures are not fatal
+                print(f"Warning: Speech prefetch failed: {e}")
+
+    def build_background(self, image_path: str, errors: list, timings: Dict, task_id: str):
+        """Encode (or reuse) the background loop the video stage will stream-copy."""
+        stage_start = time.time()
+        try:
+            ffmpeg = find_ffmpeg() if self.video_generator.video_config["engine"] == "ffmpeg" else None
+            if ffmpeg and self.video_generator.video_config["loop_cache"]:
+                # The loop encode reports on the 20..30 slice of a render's progress; spread it over 0..100
+                progress_callback = lambda progress, message: self.report(
+                    "background", max(0, min(99, (progress - 20) * 10)), message)
+                if self.render_scheduler:
+                    self.report("background", 0, "Waiting for a render worker...")
+                    self.render_scheduler.run_task(task_id, encode_background_job, (image_path,), progress_callback)
+                else:
+                    self.video_generator.get_background_loop(ffmpeg, image_path, progress_callback)
+            self.report("background", 100, "Background ready", "done")
+        except Exception as e:
+            errors.append(e)
+        timings["background"] = time.time() - stage_start
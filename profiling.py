@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Job Profiling for Bible Podcast
+Opt-in cProfile / tracemalloc around a single job, with the reports saved next to its outputs
+"""
+
+import io
+import os
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Accepted values of the profile flag
+PROFILE_MODES = ("cpu", "memory", "all")
+
+PROFILE_CONFIG = {
+    "top_functions": 40,  # Rows of the CPU report
+    "top_allocations": 25,  # Allocation sites in the memory report
+    "traceback_frames": 10  # Frames kept per allocation (more frames cost more while tracing)
+}
+
+# tracemalloc is process-wide; jobs profiling memory at the same time share one trace
+_memory_lock = threading.Lock()
+_memory_users = 0
+
+def normalize_profile_mode(value) -> Optional[str]:
+    """Profile flag from an API field or CLI option: True/"1" mean "all", falsy means off. Raises ValueError."""
+    if value in (None, False, "", 0, "0", "false", "off"):
+        return None
+    if value in (True, 1, "1", "true", "on"):
+        return "all"
+    if value not in PROFILE_MODES:
+        raise ValueError(f"profile must be one of: {', '.join(PROFILE_MODES)}")
+    return value
+
+def _start_memory_trace():
+    global _memory_users
+    with _memory_lock:
+        if _memory_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_CONFIG["traceback_frames"])
+        _memory_users += 1
+
+def _stop_memory_trace():
+    global _memory_users
+    with _memory_lock:
+        _memory_users -= 1
+        if _memory_users == 0:
+            tracemalloc.stop()
+
+def write_cpu_report(profiler: cProfile.Profile, output_dir: str, name: str, elapsed: float) -> Dict[str, str]:
+    """Raw stats (for snakeviz / pstats) and a text summary sorted by cumulative time."""
+    stats_path = os.path.join(output_dir, f"{name}.prof")
+    report_path = os.path.join(output_dir, f"{name}_cpu.txt")
+    profiler.dump_stats(stats_path)
+
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer).strip_dirs()
+    buffer.write(f"Wall time: {elapsed:.2f} s (profiled thread only)\n\n")
+    stats.sort_stats("cumulative").print_stats(PROFILE_CONFIG["top_functions"])
+    buffer.write("\nBy own time:\n")
+    stats.sort_stats("tottime").print_stats(PROFILE_CONFIG["top_functions"] // 2)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(buffer.getvalue())
+    return {"cpu_stats": stats_path, "cpu_report": report_path}
+
+def write_memory_report(snapshot: tracemalloc.Snapshot, peak: int, output_dir: str, name: str) -> Dict[str, str]:
+    """Top allocation sites by line and by call stack, with the peak traced memory."""
+    report_path = os.path.join(output_dir, f"{name}_memory.txt")
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+    ])
+    top = PROFILE_CONFIG["top_allocations"]
+
+    lines = [f"Peak traced memory: {peak / (1024 * 1024):.1f} MB",
+             "Memory still allocated at the end of the job, by line:", ""]
+    for stat in snapshot.statistics("lineno")[:top]:
+        lines.append(str(stat))
+
+    lines += ["", "Largest allocation sites with call stacks:", ""]
+    for stat in snapshot.statistics("traceback")[:min(top, 10)]:
+        lines.append(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks")
+        lines += ["    " + line for line in stat.traceback.format()]
+        lines.append("")
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+    return {"memory_report": report_path}
+
+@contextmanager
+def profile_job(output_dir: str, name: str, mode: Optional[str]):
+    """
+    Profile the enclosed block. Yields a dict that is filled with the report paths once the
+    block ends. With mode None nothing is set up, so disabled profiling costs nothing.
+    cProfile covers the calling thread; tracemalloc sees every thread of the process.
+    Profiling never fails the block: if a profiler cannot start (on Python 3.12+ only one
+    cProfile can be active per process), the block runs without it.
+    """
+    reports = {}
+    if not mode:
+        yield reports
+        return
+
+    profiler = None
+    trace_memory = False
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        if mode in ("memory", "all"):
+            _start_memory_trace()
+            trace_memory = True
+            tracemalloc.reset_peak()
+        if mode in ("cpu", "all"):
+            profiler = cProfile.Profile()
+            profiler.enable()
+    except Exception as e:
+        print(f"Warning: Could not start {mode} profiling, running without it: {e}")
+        profiler = None
+    start = time.time()
+    try:
+        yield reports
+    finally:
+        if profiler:
+            profiler.disable()
+        elapsed = time.time() - start
+        try:
+            if trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                reports.update(write_memory_report(snapshot, peak, output_dir, name))
+            if profiler:
+                reports.update(write_cpu_report(profiler, output_dir, name, elapsed))
+        except Exception as e:
+            print(f"Warning: Could not write profile reports: {e}")
+        finally:
+            if trace_memory:
+                _stop_memory_trace()
+        if reports:
+            print(f"Profile reports: {', '.join(reports.values())}")
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Render Scheduler for Bible Podcast
+Runs video renders on a bounded process pool with a FIFO queue, so concurrent requests
+share the CPU cores instead of oversubscribing them
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+from admission import QueueFullError
+from media_info import get_audio_duration, hash_file
+from profiling import profile_job
+
+# Per-process state of pool workers
+_worker_generator = None
+_worker_progress_queue = None
+
+def available_cores() -> int:
+    """CPU cores this process may run on (respects affinity masks and container CPU sets)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+def _init_worker(progress_queue):
+    """Pool initializer: keep the progress queue for the lifetime of the worker process."""
+    global _worker_progress_queue
+    _worker_progress_queue = progress_queue
+
+def _get_worker_generator(threads: int):
+    """The worker's video generator, with the encoder thread limit of the pool."""
+    global _worker_generator
+    from generate_video import PodcastVideoGenerator
+
+    # One generator per worker, so its image and hash caches survive between jobs
+    if _worker_generator is None:
+        _worker_generator = PodcastVideoGenerator()
+    _worker_generator.video_config["threads"] = threads
+    return _worker_generator
+
+def _worker_progress(job_id: str):
+    """Progress callback of a pool worker; updates are sent back to the parent through the queue."""
+    return lambda progress, message: _worker_progress_queue.put((job_id, progress, message))
+
+def render_video_job(job_id: str, audio_path: str, image_path: str, output_path: str,
+                     title: str = "", renditions: Optional[List[str]] = None, profile: Optional[str] = None,
+                     threads: int = 1) -> Dict:
+    """
+    Render one video inside a pool worker. Progress is sent back to the parent through the queue.
+    With profile set, the render is profiled and the reports are written next to the output.
+    """
+    generator = _get_worker_generator(threads)
+    progress_callback = _worker_progress(job_id)
+
+    with profile_job(os.path.dirname(output_path) or '.', f"profile_{job_id[:8]}", profile) as profile_reports:
+        if renditions:
+            # Every format of the ladder from one pass; the first one is the primary output
+            outputs = generator.generate_renditions(audio_path, image_path, output_path, renditions,
+                                                    title, progress_callback)
+            output_path = next(iter(outputs.values()), output_path)
+            success = bool(outputs)
+        else:
+            outputs = {}
+            success = generator.generate_video(audio_path, image_path, output_path, title, progress_callback)
+
+    result = {"success": success and os.path.exists(output_path), "output_file": output_path, "renditions": outputs,
+              "profile_reports": profile_reports}
+    if result["success"]:
+        result["video_info"] = generator.get_video_info(output_path)
+        # Content hashes for download ETags, computed here rather than on a request or scheduler thread
+        result["etags"] = {path: hash_file(path) for path in [output_path, *outputs.values()] if os.path.exists(path)}
+    return result
+
+def encode_background_job(job_id: str, image_path: str, threads: int = 1) -> str:
+    """Encode (or reuse) the cached background loop of an image inside a pool worker. Returns its path."""
+    from generate_video import find_ffmpeg
+    generator = _get_worker_generator(threads)
+    return generator.get_background_loop(find_ffmpeg(), image_path, _worker_progress(job_id))
+
+def mux_episode_job(job_id: str, audio_path: str, image_path: str, output_path: str, title: str,
+                    script_path: str, encoded_audio_path: str, threads: int = 1) -> Dict:
+    """Video stage of an episode inside a pool worker: the background loop and AAC track muxed with captions."""
+    generator = _get_worker_generator(threads)
+    success = generator.generate_video(audio_path, image_path, output_path, title, _worker_progress(job_id),
+                                       script_path, encoded_audio_path)
+    return {"success": success and os.path.exists(output_path), "output_file": output_path}
+
+class RenderScheduler:
+    """
+    FIFO render queue in front of a process pool sized to the available cores. Jobs are only
+    handed to the pool when a worker is free, so the queue position of every waiting job is
+    known exactly, and each encode gets an equal share of the cores as its thread limit.
+    At most max_queue jobs wait; submitting beyond that raises QueueFullError.
+    Other encodes (the stages of an episode) go through run_task, so they count against the same bound.
+    If a worker process dies, the pool breaks and fails its running jobs; the next job gets a new pool.
+    """
+
+    def __init__(self, on_progress: Callable[[str, int, str], None], on_complete: Callable[[str, Dict], None],
+                 on_error: Callable[[str, Exception], None], workers: Optional[int] = None, mp_context=None,
+                 max_queue: int = 20):
+        cores = available_cores()
+        self.workers = max(1, workers or cores)
+        self.max_queue = max_queue
+        self.rejected = 0
+        self.threads_per_job = max(1, cores // self.workers)  # Keeps workers x threads within the cores
+        self.on_progress = on_progress
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.mp_context = mp_context or multiprocessing.get_context()
+
+        self.pending = deque()  # (job_id, task, args, estimate, waiter) waiting for a worker, oldest first
+        self.running = {}  # job_id -> {"started", "estimate"}
+        self.lock = threading.Lock()
+
+        # Render seconds per second of audio, learned from finished jobs
+        self.stats = {"render_rate": 0.1, "min_job_seconds": 5.0, "smoothing": 0.3}
+
+        self.executor = None
+        self.progress_queue = None
+        self.listener = None
+
+    def _start(self):
+        """Create the pool and the progress listener on first use."""
+        if self.executor:
+            return
+        self.progress_queue = self.mp_context.Queue()
+        self.executor = self._new_executor()
+        self.listener = threading.Thread(target=self._listen, daemon=True)
+        self.listener.start()
+        print(f"Render pool started: {self.workers} workers x {self.threads_per_job} encoder threads")
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self.mp_context,
+                                   initializer=_init_worker, initargs=(self.progress_queue,))
+
+    def _listen(self):
+        """Forward progress reported by workers; updates for jobs that already finished are dropped."""
+        while True:
+            item = self.progress_queue.get()
+            if item is None:
+                break
+            job_id, progress, message = item
+            with self.lock:
+                job = self.running.get(job_id)
+            if job and job["waiter"]:
+                if job["waiter"]["progress"]:
+                    job["waiter"]["progress"](progress, message)
+            elif job:
+                self.on_progress(job_id, progress, message)
+
+    def estimate_job_seconds(self, audio_path: str) -> float:
+        """Expected render time of a job, from its audio length and the learned render rate."""
+        try:
+            duration = get_audio_duration(audio_path) or 0
+        except Exception:
+            duration = 0
+        return max(self.stats["min_job_seconds"], duration * self.stats["render_rate"])
+
+    def submit(self, job_id: str, audio_path: str, image_path: str, output_path: str, title: str = "",
+               renditions: Optional[List[str]] = None, profile: Optional[str] = None) -> int:
+        """Queue a render and return its position (0 means it started right away)."""
+        estimate = self.estimate_job_seconds(audio_path)
+        with self.lock:
+            if len(self.running) >= self.workers and len(self.pending) >= self.max_queue:
+                self.rejected += 1
+                # The queue has room again once the first running render finishes
+                raise QueueFullError("video", max(1, round(self._worker_free_times(0)[0] - time.time())))
+            self._start()
+            self.pending.append((job_id, render_video_job, (audio_path, image_path, output_path, title, renditions, profile),
+                                 estimate, None))
+            started = self._dispatch()
+            position = self._position(job_id)
+        self._watch(started)
+        return position
+
+    def run_task(self, task_id: str, task: Callable, args: tuple, progress_callback=None,
+                 estimate: Optional[float] = None):
+        """
+        Run a pool task (called as task(task_id, *args, threads=...)) and wait for its result.
+        It queues behind the renders and gets the same thread limit; max_queue does not apply,
+        because the job it belongs to was already admitted. Progress goes to progress_callback.
+        """
+        waiter = {"future": Future(), "progress": progress_callback}
+        with self.lock:
+            self._start()
+            self.pending.append((task_id, task, args, estimate or self.stats["min_job_seconds"], waiter))
+            started = self._dispatch()
+        self._watch(started)
+        return waiter["future"].result()
+
+    def _dispatch(self) -> List:
+        """
+        Hand waiting jobs to the pool while workers are free. Called with the lock held; returns
+        [(job_id, waiter, future or the submit error)] for _watch, which the caller runs after releasing it.
+        """
+        started = []
+        while self.pending and len(self.running) < self.workers:
+            job_id, task, args, estimate, waiter = self.pending.popleft()
+            try:
+                future = self._submit_to_pool(task, job_id, args)
+            except Exception as e:
+                started.append((job_id, waiter, e))
+                continue
+            # Only a job the pool accepted counts as running
+            self.running[job_id] = {"started": time.time(), "estimate": estimate, "audio_path": args[0], "waiter": waiter}
+            started.append((job_id, waiter, future))
+        return started
+
+    def _submit_to_pool(self, task: Callable, job_id: str, args: tuple) -> Future:
+        """Submit a task, replacing the pool once if it broke (a worker process died). Called with the lock held."""
+        try:
+            return self.executor.submit(task, job_id, *args, threads=self.threads_per_job)
+        except BrokenProcessPool:
+            print("Warning: Render pool broken (a worker process died), starting a new one")
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._new_executor()
+            return self.executor.submit(task, job_id, *args, threads=self.threads_per_job)
+
+    def _watch(self, started: List):
+        """
+        Report newly started jobs and wait for their results. Runs without the lock: a future that is
+        already done runs its callback at once, and the callback and the on_* hooks may take it.
+        """
+        for job_id, waiter, outcome in started:
+            if isinstance(outcome, Exception):
+                self._report(job_id, waiter, error=outcome)
+                continue
+            if waiter is None:
+                self.on_progress(job_id, 5, "Starting render...")
+            outcome.add_done_callback(lambda f, job_id=job_id: self._finished(job_id, f))
+
+    def _finished(self, job_id: str, future):
+        """Record the outcome of a job and start the next waiting one."""
+        with self.lock:
+            job = self.running.pop(job_id, None)
+            started = self._dispatch()
+        waiter = job["waiter"] if job else None
+        try:
+            result = future.result()
+        except Exception as e:
+            self._report(job_id, waiter, error=e)
+        else:
+            if not waiter and job and result.get("success"):
+                self._learn(job, time.time() - job["started"])
+            self._report(job_id, waiter, result=result)
+        self._watch(started)
+
+    def _report(self, job_id: str, waiter: Optional[Dict], result: Optional[Dict] = None,
+                error: Optional[Exception] = None):
+        """Hand a job's outcome to the task waiting for it, or to the completion hooks."""
+        if waiter:
+            if error:
+                waiter["future"].set_exception(error)
+            else:
+                waiter["future"].set_result(result)
+        elif error:
+            self.on_error(job_id, error)
+        else:
+            self.on_complete(job_id, result)
+
+    def _learn(self, job: Dict, elapsed: float):
+        """Update the render rate estimate from a finished job."""
+        try:
+            duration = get_audio_duration(job["audio_path"])
+        except Exception:
+            duration = None
+        if duration:
+            smoothing = self.stats["smoothing"]
+            self.stats["render_rate"] = (1 - smoothing) * self.stats["render_rate"] + smoothing * (elapsed / duration)
+
+    def _position(self, job_id: str) -> int:
+        """1-based position of a waiting job, or 0 if it is not waiting. Called with the lock held."""
+        for position, (pending_id, _, _, _, _) in enumerate(self.pending, 1):
+            if pending_id == job_id:
+                return position
+        return 0
+
+    def _worker_free_times(self, ahead: int) -> List[float]:
+        """
+        When each worker is expected to be free after the first `ahead` waiting jobs have started,
+        soonest first. Each waiting job starts on whichever worker frees up first. Called with the lock held.
+        """
+        now = time.time()
+        free_at = sorted(max(now, job["started"] + job["estimate"]) for job in self.running.values())
+        free_at += [now] * (self.workers - len(free_at))
+        for _, _, _, estimate, _ in list(self.pending)[:ahead]:
+            free_at[0] += estimate
+            free_at.sort()
+        return free_at
+
+    def get_queue_status(self, job_id: str) -> Optional[Dict]:
+        """Queue position and estimated wait of a waiting job, or None once it has started."""
+        with self.lock:
+            position = self._position(job_id)
+            if not position:
+                return None
+
+            wait = round(self._worker_free_times(position - 1)[0] - time.time())
+
+        return {
+            "status": "queued",
+            "progress": 0,
+            "message": f"Waiting in render queue (position {position}, about {max(1, -(-wait // 60))} min)...",
+            "queue_position": position,
+            "estimated_wait": wait
+        }
+
+    def get_stats(self) -> Dict:
+        """Current load of the scheduler."""
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "threads_per_job": self.threads_per_job,
+                "max_queue": self.max_queue,
+                "running": len(self.running),
+                "queued": len(self.pending),
+                "rejected": self.rejected,
+                "estimated_wait": round(self._worker_free_times(len(self.pending))[0] - time.time()),
+                "render_rate": round(self.stats["render_rate"], 4)
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool and the progress listener."""
+        if not self.executor:
+            return
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        self.progress_queue.put(None)
+        self.executor = None
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Artifact Retention for Bible Podcast
+Indexes generated files and uploads, and deletes them by age, disk quota and last access
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from media_info import hash_file
+
+# Artifact type by file extension; segment caches are hidden directories named .<stem>.segments
+ARTIFACT_TYPES = {
+    ".txt": "script", ".md": "script",
+    ".mp3": "audio", ".wav": "audio", ".m4a": "audio",
+    ".json": "manifest",
+    ".mp4": "video",
+    ".srt": "subtitle", ".vtt": "subtitle",
+    ".png": "upload", ".jpg": "upload", ".jpeg": "upload", ".gif": "upload", ".bmp": "upload", ".webp": "upload",
+    ".prof": "profile"
+}
+
+RETENTION_CONFIG = {
+    # Days since last access after which an unpinned artifact is deleted
+    "ttl_days": {
+        "script": 180,
+        "audio": 60,
+        "manifest": 60,  # Follows its audio; captions are built from it
+        "video": 30,
+        "subtitle": 30,
+        "segments": 7,  # TTS chunk caches only speed up re-generating an episode
+        "upload": 14,
+        "profile": 7,  # profile_* reports from profiled jobs
+        "other": 30
+    },
+    "quota_bytes": int(float(os.environ.get("RETENTION_QUOTA_GB", 20)) * 1024 ** 3),  # Total for all artifacts
+    "min_free_bytes": int(float(os.environ.get("RETENTION_MIN_FREE_GB", 2)) * 1024 ** 3),  # Free disk to keep for renders
+    "min_age_seconds": 3600,  # Never delete files this new; they may belong to running jobs
+    "sweep_interval": 3600,
+    "delete_pause": 0.02  # Pause between deletions so a large sweep does not saturate the disk
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    job_id TEXT,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS artifacts_access ON artifacts (pinned, last_access);
+CREATE TABLE IF NOT EXISTS pins (prefix TEXT PRIMARY KEY, created_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL);
+"""
+
+def artifact_type(path: str) -> str:
+    """Retention class of a file or segment cache directory."""
+    if os.path.basename(path).endswith(".segments"):
+        return "segments"
+    if os.path.basename(path).startswith("profile_"):
+        return "profile"
+    return ARTIFACT_TYPES.get(os.path.splitext(path)[1].lower(), "other")
+
+def normalize_path(path: str) -> str:
+    """Index key of a path: relative to the working directory, like the paths the API hands out."""
+    return os.path.relpath(os.path.abspath(path))
+
+def path_size(path: str) -> int:
+    """Size of a file, or of all files in a directory."""
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in Path(path).rglob("*") if entry.is_file())
+    return os.path.getsize(path)
+
+class ArtifactRetention:
+    """
+    Index of everything under the artifact roots (output/ and uploads/), kept up to date as jobs and
+    the command line tools register their outputs, so a sweep is a database query instead of a tree
+    walk (files that predate the index are imported once). Sweeps delete
+    unpinned artifacts past their type's TTL, then the least recently accessed ones while the
+    quota is exceeded or the disk runs low. Pins cover a file or a whole directory (an episode).
+    """
+
+    def __init__(self, db_path: str = "cache/artifacts.db", roots: Iterable[str] = ("output", "uploads"),
+                 config: Optional[Dict] = None):
+        self.db_path = db_path
+        self.roots = [normalize_path(root) for root in roots]
+        self.config = config or RETENTION_CONFIG
+        self.local = threading.local()
+        self.sweeper = None
+        self.sweeper_pid = None
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(artifacts)")]
+            if "etag" not in columns:
+                conn.execute("ALTER TABLE artifacts ADD COLUMN etag TEXT")
+                conn.execute("ALTER TABLE artifacts ADD COLUMN mtime_ns INTEGER")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for the current thread (and process; connections must not cross a fork)."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def _is_pinned(self, conn: sqlite3.Connection, path: str) -> bool:
+        # A pin covers the path itself and everything below it
+        return conn.execute("SELECT 1 FROM pins WHERE prefix = ? OR prefix || '/' = substr(?, 1, length(prefix) + 1) "
+                            "LIMIT 1", (path, path)).fetchone() is not None
+
+    def _in_roots(self, key: str) -> bool:
+        return any(key == root or key.startswith(root + os.sep) for root in self.roots)
+
+    def register(self, path: str, job_id: Optional[str] = None, etag: Optional[str] = None):
+        """
+        Add or refresh an artifact in the index (counts as an access). Files are recorded with their
+        content hash (hashed here unless etag is given), which downloads use as the ETag.
+        Paths outside the roots are ignored; retention never deletes anything there.
+        """
+        if not path or not os.path.exists(path):
+            return
+        key = normalize_path(path)
+        if not self._in_roots(key):
+            return
+        now = time.time()
+        mtime_ns = None
+        if os.path.isfile(path):
+            mtime_ns = os.stat(path).st_mtime_ns
+            etag = etag or hash_file(path)
+        else:
+            etag = None
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO artifacts (path, type, size, job_id, created_at, last_access, pinned, etag, mtime_ns) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET size = excluded.size, last_access = excluded.last_access, "
+            "job_id = COALESCE(excluded.job_id, artifacts.job_id), etag = excluded.etag, mtime_ns = excluded.mtime_ns",
+            (key, artifact_type(key), path_size(path), job_id, now, now, int(self._is_pinned(conn, key)), etag, mtime_ns)
+        )
+
+    def get_etag(self, path: str) -> Optional[str]:
+        """Content hash recorded when a file was registered, or None if it is not indexed or changed since."""
+        row = self._connect().execute("SELECT etag, size, mtime_ns FROM artifacts WHERE path = ?",
+                                      (normalize_path(path),)).fetchone()
+        if not row or not row["etag"]:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (row["size"], row["mtime_ns"]):
+            return None
+        return row["etag"]
+
+    def register_outputs(self, paths: Iterable[str], job_id: Optional[str] = None, etags: Optional[Dict] = None):
+        """
+        Register a job's output files together with their sidecars (manifests, captions, segment caches).
+        etags maps output paths to content hashes already computed by the job.
+        """
+        for path in paths:
+            if not path:
+                continue
+            output = Path(path)
+            related = [output]
+            if output.suffix.lower() == ".mp3":
+                related += [output.with_suffix(".json"), output.parent / f".{output.stem}.segments"]
+            elif output.suffix.lower() == ".mp4":
+                related += [output.with_suffix(".srt"), output.with_suffix(".vtt")]
+            for item in related:
+                self.register(str(item), job_id, (etags or {}).get(str(item)))
+
+    def touch(self, path: str):
+        """Record an access (download, preview or use as a job input)."""
+        self._connect().execute("UPDATE artifacts SET last_access = ? WHERE path = ?", (time.time(), normalize_path(path)))
+
+    def pin(self, path: str, pinned: bool = True) -> int:
+        """Pin (or unpin) a file or directory; pinned artifacts are never deleted. Returns the artifacts affected."""
+        key = normalize_path(path)
+        with self._connect() as conn:
+            if pinned:
+                conn.execute("INSERT OR IGNORE INTO pins (prefix, created_at) VALUES (?, ?)", (key, time.time()))
+            else:
+                conn.execute("DELETE FROM pins WHERE prefix = ?", (key,))
+            rows = conn.execute("SELECT path FROM artifacts WHERE path = ? OR substr(path, 1, ?) = ?",
+                                (key, len(key) + 1, key + "/")).fetchall()
+            for row in rows:
+                conn.execute("UPDATE artifacts SET pinned = ? WHERE path = ?",
+                             (int(self._is_pinned(conn, row["path"])), row["path"]))
+        return len(rows)
+
+    def import_existing(self, force: bool = False) -> int:
+        """
+        Bring the index in line with the roots: index files nobody registered (files that predate the
+        index or were copied in by hand), refresh the size of files rewritten in place and drop entries
+        whose files are gone. A walk of the roots, done once per database unless forced
+        (python retention.py --import). Returns the number added.
+        """
+        conn = self._connect()
+        if not force and conn.execute("SELECT 1 FROM meta WHERE key = 'imported'").fetchone():
+            return 0
+
+        known = {row["path"]: row["size"] for row in conn.execute("SELECT path, size FROM artifacts")}
+        rows = []
+        resized = []
+        for root in self.roots:
+            for directory, subdirs, files in os.walk(root):
+                # Segment caches are one artifact each; other hidden directories (partial uploads) are skipped
+                for name in [name for name in subdirs if name.startswith(".")]:
+                    subdirs.remove(name)
+                    if name.endswith(".segments"):
+                        files.append(name)
+                for name in files:
+                    path = normalize_path(os.path.join(directory, name))
+                    if name.startswith(".") and not name.endswith(".segments"):
+                        continue
+                    try:
+                        if path in known:
+                            size = path_size(path)
+                            if size != known[path]:
+                                resized.append((size, path))
+                            continue
+                        stat = os.stat(path)
+                        rows.append((path, artifact_type(path), path_size(path), stat.st_mtime,
+                                     max(stat.st_mtime, stat.st_atime), int(self._is_pinned(conn, path))))
+                    except OSError:
+                        continue
+
+        missing = [(path,) for path in known if not os.path.exists(path)]
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO artifacts (path, type, size, created_at, last_access, pinned) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("UPDATE artifacts SET size = ? WHERE path = ?", resized)
+            conn.executemany("DELETE FROM artifacts WHERE path = ?", missing)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported', ?)", (time.time(),))
+        if rows or missing:
+            print(f"Retention index: {len(rows)} files added, {len(missing)} missing files dropped")
+        return len(rows)
+
+    def _claim_sweep(self, force: bool) -> bool:
+        """Only one process sweeps per interval (every web worker runs a sweeper thread)."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'last_sweep'").fetchone()
+            now = time.time()
+            if not force and row and now - row["value"] < self.config["sweep_interval"]:
+                conn.execute("COMMIT")
+                return False
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_sweep', ?)", (now,))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def refresh_segment_sizes(self) -> int:
+        """
+        Re-measure the indexed segment caches. Chunks are added and removed between registrations
+        (prefetch, edits of the script), so their recorded sizes drift. Returns the number updated.
+        """
+        conn = self._connect()
+        resized, missing = [], []
+        for row in conn.execute("SELECT path, size FROM artifacts WHERE type = 'segments'").fetchall():
+            try:
+                size = path_size(row["path"]) if os.path.isdir(row["path"]) else None
+            except OSError:
+                continue
+            if size is None:
+                missing.append((row["path"],))
+            elif size != row["size"]:
+                resized.append((size, row["path"]))
+        with conn:
+            conn.executemany("UPDATE artifacts SET size = ? WHERE path = ?", resized)
+            conn.executemany("DELETE FROM artifacts WHERE path = ?", missing)
+        return len(resized)
+
+    def _delete(self, path: str) -> int:
+        """Delete an artifact and its index entry. Returns the bytes freed."""
+        freed = 0
+        try:
+            freed = path_size(path)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        self._connect().execute("DELETE FROM artifacts WHERE path = ?", (path,))
+
+        # Remove job directories left empty, but never the roots themselves
+        parent = os.path.dirname(path)
+        if parent and parent not in self.roots and any(parent.startswith(root + os.sep) for root in self.roots):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                pass
+        time.sleep(self.config["delete_pause"])
+        return freed
+
+    def sweep(self, force: bool = False) -> Dict:
+        """Delete expired artifacts, then evict least recently accessed ones until within quota and free-space limits."""
+        report = {"expired": 0, "evicted": 0, "freed_bytes": 0, "skipped": not self._claim_sweep(force)}
+        if report["skipped"]:
+            return report
+        self.refresh_segment_sizes()
+
+        config = self.config
+        now = time.time()
+        conn = self._connect()
+        cutoff = now - config["min_age_seconds"]
+
+        for kind, days in config["ttl_days"].items():
+            rows = conn.execute("SELECT path FROM artifacts WHERE pinned = 0 AND type = ? AND last_access < ? "
+                                "AND created_at < ?", (kind, now - days * 86400, cutoff)).fetchall()
+            for row in rows:
+                report["freed_bytes"] += self._delete(row["path"])
+                report["expired"] += 1
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) AS total FROM artifacts").fetchone()["total"]
+        free = shutil.disk_usage(self.roots[0] if os.path.exists(self.roots[0]) else '.').free
+        if total > config["quota_bytes"] or free < config["min_free_bytes"]:
+            candidates = conn.execute("SELECT path, size FROM artifacts WHERE pinned = 0 AND created_at < ? "
+                                      "ORDER BY last_access", (cutoff,)).fetchall()
+            for row in candidates:
+                if total <= config["quota_bytes"] and free >= config["min_free_bytes"]:
+                    break
+                freed = self._delete(row["path"])
+                total -= row["size"]
+                free += freed
+                report["freed_bytes"] += freed
+                report["evicted"] += 1
+
+        if report["expired"] or report["evicted"]:
+            print(f"Retention sweep: {report['expired']} expired, {report['evicted']} evicted, "
+                  f"{report['freed_bytes'] / (1024 * 1024):.1f} MB freed")
+        return report
+
+    def _sweep_loop(self):
+        # Background housekeeping: lowest CPU priority for this thread (Linux schedules threads individually)
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        try:
+            self.import_existing()
+        except Exception as e:
+            print(f"Warning: Could not import existing artifacts: {e}")
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: Retention sweep failed: {e}")
+            time.sleep(self.config["sweep_interval"])
+
+    def start_sweeper(self):
+        """Start the background sweeper thread in this process if it is not running."""
+        if self.sweeper_pid == os.getpid() and self.sweeper.is_alive():
+            return
+        self.sweeper = threading.Thread(target=self._sweep_loop, daemon=True)
+        self.sweeper_pid = os.getpid()
+        self.sweeper.start()
+
+    def get_stats(self) -> Dict:
+        """Disk use by artifact type, pins, limits and the time of the last sweep."""
+        conn = self._connect()
+        by_type = {row["type"]: {"count": row["count"], "bytes": row["bytes"]} for row in conn.execute(
+            "SELECT type, COUNT(*) AS count, SUM(size) AS bytes FROM artifacts GROUP BY type")}
+        pinned = conn.execute("SELECT COUNT(*) AS count, COALESCE(SUM(size), 0) AS bytes FROM artifacts "
+                              "WHERE pinned = 1").fetchone()
+        last_sweep = conn.execute("SELECT value FROM meta WHERE key = 'last_sweep'").fetchone()
+        return {
+            "total_bytes": sum(item["bytes"] for item in by_type.values()),
+            "quota_bytes": self.config["quota_bytes"],
+            "min_free_bytes": self.config["min_free_bytes"],
+            "by_type": by_type,
+            "pinned": {"count": pinned["count"], "bytes": pinned["bytes"]},
+            "pins": [row["prefix"] for row in conn.execute("SELECT prefix FROM pins ORDER BY prefix")],
+            "last_sweep": last_sweep["value"] if last_sweep else None
+        }
+
+    def list_artifacts(self, job_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Indexed artifacts, most recently accessed first."""
+        query, params = "SELECT * FROM artifacts", []
+        if job_id:
+            query, params = query + " WHERE job_id = ?", [job_id]
+        rows = self._connect().execute(query + " ORDER BY last_access DESC LIMIT ?", params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+def register_cli_outputs(paths: Iterable[str], job_id: Optional[str] = None):
+    """Index files written by a command line tool, like a job's outputs. Files outside output/ and uploads/ are left alone."""
+    try:
+        ArtifactRetention().register_outputs(paths, job_id)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not index outputs for retention: {e}")
+
+def main():
+    """Command line interface for retention maintenance."""
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the index of generated files and uploads")
+    parser.add_argument("--import", dest="import_files", action="store_true",
+                        help="Walk output/ and uploads/ and index files that are not registered (e.g. copied in by hand)")
+    parser.add_argument("--sweep", action="store_true", help="Run a retention sweep now")
+    args = parser.parse_args()
+
+    retention = ArtifactRetention()
+    if args.import_files:
+        print(f"Indexed {retention.import_existing(force=True)} files")
+    if args.sweep:
+        print(json.dumps(retention.sweep(force=True), indent=2))
+    if not (args.import_files or args.sweep):
+        print(json.dumps(retention.get_stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
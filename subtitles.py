@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Subtitle Builder for Bible Podcast
+Turns script segments and their timings into SRT/WebVTT captions for soft subtitle tracks
+"""
+
+import os
+import re
+import textwrap
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from media_info import load_audio_manifest, get_audio_duration
+
+# Caption layout: at most max_lines lines of line_chars each
+CAPTION_CONFIG = {
+    "line_chars": 42,
+    "max_lines": 2
+}
+
+def find_script_for_audio(audio_path: str) -> Optional[str]:
+    """Script a podcast was generated from: <script>_podcast.mp3 comes from <script>.txt."""
+    audio = Path(audio_path)
+    stem = audio.stem[:-len("_podcast")] if audio.stem.endswith("_podcast") else audio.stem
+    for extension in (".txt", ".md"):
+        candidate = audio.with_name(stem + extension)
+        if candidate.exists():
+            return str(candidate)
+    return None
+
+def clean_caption_text(text: str) -> str:
+    """Strip markdown emphasis and normalize whitespace."""
+    text = text.replace('**', '').replace('__', '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+def load_timed_segments(audio_path: str, script_path: Optional[str] = None,
+                        duration: Optional[float] = None) -> List[Dict]:
+    """
+    Script segments with start/end times. Exact boundaries come from the audio's timing manifest;
+    without one, the script is parsed again and the audio length is shared out by text length.
+    """
+    manifest = load_audio_manifest(audio_path)
+    if manifest:
+        return [{"speaker": segment["speaker"], "text": clean_caption_text(segment["text"]),
+                 "start": segment["start"], "end": segment["end"]}
+                for segment in manifest["segments"] if segment["end"] > segment["start"]]
+
+    script_path = script_path or find_script_for_audio(audio_path)
+    duration = duration or get_audio_duration(audio_path)
+    if not script_path or not os.path.exists(script_path) or not duration:
+        return []
+
+    from generate_audio import PodcastAudioGenerator
+    parser = PodcastAudioGenerator()
+    segments = parser.parse_podcast_script(script_path)
+    if not segments:
+        return []
+
+    # The synthesized pauses are known; the remaining time is speech, roughly proportional to text length
+    pauses = [parser.get_segment_pause(segments, i) / 1000 for i in range(len(segments))]
+    speech_seconds = max(duration - sum(pauses), duration * 0.5)
+    total_chars = sum(len(segment["text"]) for segment in segments)
+
+    timed = []
+    position = 0.0
+    for segment, pause in zip(segments, pauses):
+        length = speech_seconds * len(segment["text"]) / total_chars
+        timed.append({"speaker": segment["speaker"], "text": clean_caption_text(segment["text"]),
+                      "start": round(position, 3), "end": round(min(duration, position + length), 3)})
+        position += length + pause
+    return timed
+
+def split_caption_text(text: str, line_chars: int, max_lines: int) -> List[str]:
+    """Wrap a segment into caption lines and group them into cues of at most max_lines lines."""
+    lines = textwrap.wrap(text, line_chars)
+    return ["\n".join(lines[i:i + max_lines]) for i in range(0, len(lines), max_lines)]
+
+def build_cues(segments: List[Dict]) -> List[Dict]:
+    """Caption cues for timed segments, with each segment's time shared out by text length."""
+    config = CAPTION_CONFIG
+    cues = []
+    previous_speaker = None
+    for segment in segments:
+        text = segment["text"]
+        if segment["speaker"] != previous_speaker:
+            text = f"{segment['speaker']}: {text}"  # Mark speaker changes
+        previous_speaker = segment["speaker"]
+
+        pieces = split_caption_text(text, config["line_chars"], config["max_lines"])
+        if not pieces:
+            continue
+
+        # Each piece is shown for a share of the segment proportional to its length
+        span = segment["end"] - segment["start"]
+        total_chars = sum(len(piece) for piece in pieces)
+        position = segment["start"]
+        for index, piece in enumerate(pieces):
+            end = segment["end"] if index == len(pieces) - 1 else position + span * len(piece) / total_chars
+            cues.append({"start": position, "end": end, "text": piece})
+            position = end
+    return cues
+
+def format_timestamp(seconds: float, separator: str) -> str:
+    """HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (WebVTT)."""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+def to_srt(cues: List[Dict]) -> str:
+    """SubRip captions."""
+    blocks = []
+    for number, cue in enumerate(cues, 1):
+        blocks.append(f"{number}\n{format_timestamp(cue['start'], ',')} --> "
+                      f"{format_timestamp(cue['end'], ',')}\n{cue['text']}\n")
+    return "\n".join(blocks)
+
+def to_vtt(cues: List[Dict]) -> str:
+    """WebVTT captions."""
+    blocks = ["WEBVTT\n"]
+    for cue in cues:
+        blocks.append(f"{format_timestamp(cue['start'], '.')} --> {format_timestamp(cue['end'], '.')}\n{cue['text']}\n")
+    return "\n".join(blocks)
+
+def write_subtitles(audio_path: str, output_path: str, script_path: Optional[str] = None,
+                    duration: Optional[float] = None) -> Dict[str, str]:
+    """
+    Write <output>.srt and <output>.vtt captions for an episode.
+    Returns {"srt": path, "vtt": path}, or an empty dict when there is no script to caption.
+    """
+    cues = build_cues(load_timed_segments(audio_path, script_path, duration))
+    if not cues:
+        return {}
+
+    output = Path(output_path)
+    paths = {"srt": str(output.with_suffix('.srt')), "vtt": str(output.with_suffix('.vtt'))}
+    with open(paths["srt"], 'w', encoding='utf-8') as f:
+        f.write(to_srt(cues))
+    with open(paths["vtt"], 'w', encoding='utf-8') as f:
+        f.write(to_vtt(cues))
+    return paths
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Upload Store for Bible Podcast
+Content-addressed storage for uploaded images: uploads are hashed while they stream to disk,
+validated in one pass and stored once per distinct content
+"""
+
+import os
+import time
+import hashlib
+import tempfile
+from typing import Dict, Optional
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+# Stored extension by detected image format (the uploaded file name is not trusted)
+IMAGE_FORMATS = {"PNG": ".png", "JPEG": ".jpg", "GIF": ".gif", "BMP": ".bmp", "WEBP": ".webp"}
+
+class IncomingUpload:
+    """
+    Temporary file an upload is streamed into. Every chunk is hashed and counted as it is
+    written, and the upload is aborted as soon as it passes max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'w+b')
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.max_bytes = max_bytes
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"Upload too large (max {self.max_bytes // (1024 * 1024)}MB)")
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # Everything else (seek, read, close, ...) is the underlying file's
+        return getattr(self.file, name)
+
+    def discard(self):
+        """Close and delete the temporary file."""
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class UploadStore:
+    """
+    Uploaded images stored under <root>/<hash[:2]>/<sha256><ext>. Re-uploading an image that is
+    already stored costs no disk and no validation, and the path is a stable cache key downstream.
+    """
+
+    def __init__(self, root: str = "uploads", max_bytes: int = 50 * 1024 * 1024, max_pixels: int = 100_000_000):
+        self.root = root
+        self.incoming_dir = os.path.join(root, ".incoming")
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+
+    def open_incoming(self) -> IncomingUpload:
+        """File object for the request parser to stream an uploaded file into."""
+        os.makedirs(self.incoming_dir, exist_ok=True)
+        return IncomingUpload(self.incoming_dir, self.max_bytes)
+
+    def get_path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + extension)
+
+    def find(self, digest: str) -> Optional[str]:
+        """Stored path of an image by content hash, if it is stored."""
+        directory = os.path.join(self.root, digest[:2])
+        for extension in IMAGE_FORMATS.values():
+            path = os.path.join(directory, digest + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def inspect_image(self, path: str, verify: bool = True) -> Dict:
+        """
+        Format and size of an image in one pass over the file: the header gives format and
+        dimensions, and verify() checks the rest of the data without decoding pixels.
+        """
+        if not HAS_PIL:
+            raise ValueError("PIL (Pillow) library not available for image processing")
+        try:
+            with Image.open(path) as img:
+                info = {"format": img.format, "width": img.width, "height": img.height}
+                if img.format not in IMAGE_FORMATS:
+                    raise ValueError(f"Unsupported image format: {img.format}")
+                if img.width * img.height > self.max_pixels:
+                    raise ValueError(f"Image too large: {img.width}x{img.height}")
+                if verify:
+                    img.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+            raise ValueError(f"Not a readable image ({type(e).__name__})")
+        return info
+
+    def commit(self, upload: IncomingUpload) -> Dict:
+        """
+        Store a fully received upload. Returns {"path", "sha256", "size", "format", "width", "height",
+        "deduplicated"}; raises ValueError if it is not a valid image. The temporary file is always consumed.
+        """
+        upload.file.close()
+        digest = upload.digest.hexdigest()
+        try:
+            existing = self.find(digest)
+            if existing:
+                # Same bytes as a stored, already validated image: keep the stored copy
+                info = self.inspect_image(existing, verify=False)
+                return {"path": existing, "sha256": digest, "size": upload.size, "deduplicated": True, **info}
+
+            info = self.inspect_image(upload.path)
+            path = self.get_path(digest, IMAGE_FORMATS[info["format"]])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(upload.path, path)
+            return {"path": path, "sha256": digest, "size": upload.size, "deduplicated": False, **info}
+        finally:
+            if os.path.exists(upload.path):
+                os.remove(upload.path)
+
+    def cleanup_incoming(self, max_age: float = 3600) -> int:
+        """Delete partial uploads left behind by interrupted requests. Returns the number removed."""
+        removed = 0
+        cutoff = time.time() - max_age
+        try:
+            with os.scandir(self.incoming_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+        except OSError:
+            pass
+        return removed